@@ -1,9 +1,27 @@
-from mcdreforged.api.types import PluginServerInterface
-from my_plugin.my_plugin import MyPlugin
+from typing import Optional, TYPE_CHECKING
 
+from mcdreforged.api.types import PluginServerInterface, Info
 
-__main = MyPlugin.get_instance()
+if TYPE_CHECKING:
+    from my_plugin.my_plugin import MyPlugin
+
+
+# Built in on_load rather than on import, constructing it loads the config and the storage index
+__main: Optional["MyPlugin"] = None
 
 
 def on_load(server: PluginServerInterface, prev_module):
+    global __main
+    from my_plugin.my_plugin import MyPlugin
+    __main = MyPlugin.get_instance()
     __main.on_load(server, prev_module)
+
+
+def on_unload(server: PluginServerInterface):
+    if __main is not None:
+        __main.on_unload(server)
+
+
+def on_info(server: PluginServerInterface, info: Info):
+    if __main is not None:
+        __main.on_info(server, info)
@@ -1,11 +1,14 @@
-from typing import Union, Iterable, List, TYPE_CHECKING, Optional
+from typing import Union, Iterable, List, TYPE_CHECKING, Optional, Tuple
 from mcdreforged.api.types import CommandSource
 from mcdreforged.api.command import *
 from mcdreforged.api.rtext import *
 
-import re
-
 from my_plugin.generic import MessageText
+from my_plugin.storage.container import ContainerPos, ItemCodes, VANILLA_DIMENSIONS, normalize_dimension
+from my_plugin.utils.help_message import HelpMessageRenderer
+from my_plugin.utils.misc import MiscTools
+from my_plugin.utils.pagination import PagedResult, PageCursors
+from my_plugin.utils.query_executor import QueryExecutor, QueryTicket
 
 
 if TYPE_CHECKING:
@@ -13,8 +16,18 @@ if TYPE_CHECKING:
 
 
 class CommandManager:
+    HELP_CACHE_SIZE = 32
+    # Config nodes the registered command tree is built from
+    COMMAND_TREE_CONFIG_NODES = ('command_prefix', 'debug')
+
     def __init__(self, plugin_inst: "MyPlugin"):
         self.plugin_inst = plugin_inst
+        self.__help_renderer = HelpMessageRenderer(plugin_inst.ntr, plugin_inst.rtr, self.HELP_CACHE_SIZE)
+        self.page_cursors = PageCursors(self.config.query.page_expiry)
+        self.plugin_inst.config_change_notifier.add_listener(lambda nodes: self.invalidate_help_cache())
+        self.plugin_inst.config_change_notifier.add_listener(
+            lambda nodes: self.page_cursors.set_expiry(self.config.query.page_expiry), 'query.page_expiry'
+        )
 
     @property
     def server(self):
@@ -24,32 +37,19 @@ class CommandManager:
     def config(self):
         return self.plugin_inst.config
 
+    def invalidate_help_cache(self):
+        self.__help_renderer.invalidate()
+
     def htr(self, translation_key: str, *args, _lb_htr_prefixes: Optional[List[str]] = None,
             **kwargs) -> RTextMCDRTranslation:
-        def __get_regex_result(line: str):
-            pattern = r'(?<=§7){}[\S ]*?(?=§)'
-            for prefix_tuple in _lb_htr_prefixes:
-                for prefix in prefix_tuple:
-                    result = re.search(pattern.format(prefix), line)
-                    if result is not None:
-                        return result
-            return None
-
-        def __htr(key: str, *inner_args, **inner_kwargs) -> MessageText:
-            original, processed = self.plugin_inst.ntr(key, *inner_args, **inner_kwargs), []
-            if not isinstance(original, str):
-                return key
-            for line in original.splitlines():
-                result = __get_regex_result(line)
-                if result is not None:
-                    command = result.group() + ' '
-                    processed.append(RText(line).c(RAction.suggest_command, command).h(
-                        self.plugin_inst.rtr(f'hover.suggest', command)))
-                else:
-                    processed.append(line)
-            return RTextBase.join('\n', processed)
-
-        return RTextMCDRTranslation(translation_key, *args, **kwargs).set_translator(__htr)
+        """
+        Translated help message with clickable command lines, rendered results are cached by
+        translation key, language, prefixes and translation args (which carry the plugin version)
+        until invalidate_help_cache() is called.
+        Cached texts are shared between replies, do not modify them
+        """
+        translator = self.__help_renderer.get_translator(tuple(_lb_htr_prefixes or ()))
+        return RTextMCDRTranslation(translation_key, *args, **kwargs).set_translator(translator)
 
     def show_help(self, source: CommandSource):
         meta = self.server.get_self_metadata()
@@ -63,6 +63,252 @@ class CommandManager:
             )
         )
 
+    def suggest_item(self, query: str) -> List[str]:
+        return self.plugin_inst.get_item_search().suggest(query, self.config.search.suggestion_limit)
+
+    def find_item(self, source: CommandSource, query: str):
+        self.plugin_inst.query_executor.submit(source, lambda ticket: self.__find_item(ticket, query))
+
+    def __resolve_item(self, query: str) -> str:
+        search = self.plugin_inst.get_item_search()
+        item_id = search.resolve(query)
+        if item_id is None:
+            matches = search.search(query, limit=1)
+            item_id = matches[0] if len(matches) > 0 else query
+        return item_id
+
+    def __find_item(self, ticket: QueryTicket, query: str):
+        item_id = self.__resolve_item(query)
+        locations = self.plugin_inst.storage_index.find_item(item_id)
+        if len(locations) == 0:
+            ticket.reply(self.plugin_inst.rtr('storage.find.none', item=item_id))
+            return
+        if ticket.is_cancelled:
+            return
+        locations.sort(key=lambda loc: loc.count, reverse=True)
+        result = PagedResult(
+            locations,
+            lambda loc: self.plugin_inst.rtr(
+                'storage.find.entry', dimension=loc.pos.dimension, x=loc.pos.x, y=loc.pos.y, z=loc.pos.z, count=loc.count
+            ),
+            page_size=self.config.query.page_size,
+            header=self.plugin_inst.rtr(
+                'storage.find.header', item=item_id, count=sum(loc.count for loc in locations), containers=len(locations)
+            ),
+            total=len(locations)
+        )
+        self.page_cursors.open(ticket.source_key, result)
+        ticket.reply(self.render_page(result, 0))
+
+    def __reply_containers(self, ticket: QueryTicket, header: MessageText, containers: List[Tuple[ContainerPos, Optional[float]]]):
+        if len(containers) == 0:
+            ticket.reply(self.plugin_inst.rtr('storage.spatial.none'))
+            return
+        storage_index = self.plugin_inst.storage_index
+
+        def render(pair: Tuple[ContainerPos, Optional[float]]) -> MessageText:
+            pos, distance = pair
+            # Contents are only read for the lines of the shown page
+            items = storage_index.get_container(pos) or {}
+            kwargs = dict(dimension=pos.dimension, x=pos.x, y=pos.y, z=pos.z, count=sum(items.values()), kinds=len(items))
+            if distance is None:
+                return self.plugin_inst.rtr('storage.spatial.entry', **kwargs)
+            return self.plugin_inst.rtr('storage.spatial.distance_entry', distance=round(distance, 1), **kwargs)
+
+        result = PagedResult(containers, render, page_size=self.config.query.page_size, header=header, total=len(containers))
+        self.page_cursors.open(ticket.source_key, result)
+        ticket.reply(self.render_page(result, 0))
+
+    def __check_area(self, source: CommandSource, x1: int, z1: int, x2: int, z2: int) -> bool:
+        chunks, limit = self.plugin_inst.storage_index.get_chunk_count(x1, z1, x2, z2), self.config.query.max_query_chunks
+        if chunks > limit:
+            source.reply(self.plugin_inst.rtr('storage.spatial.too_large', chunks=chunks, limit=limit))
+            return False
+        return True
+
+    def find_near(self, source: CommandSource, dimension: str, x: int, y: int, z: int, radius: float):
+        reach = int(radius)
+        if not self.__check_area(source, x - reach, z - reach, x + reach, z + reach):
+            return
+        dimension = normalize_dimension(dimension)
+
+        def query(ticket: QueryTicket):
+            containers = self.plugin_inst.storage_index.get_containers_in_range(dimension, x, y, z, radius)
+            if ticket.is_cancelled:
+                return
+            header = self.plugin_inst.rtr(
+                'storage.spatial.near_header', containers=len(containers), radius=radius, dimension=dimension, x=x, y=y, z=z
+            )
+            self.__reply_containers(ticket, header, containers)
+
+        self.plugin_inst.query_executor.submit(source, query)
+
+    def find_in_region(self, source: CommandSource, dimension: str, corner1: Tuple[int, int, int], corner2: Tuple[int, int, int]):
+        if not self.__check_area(source, corner1[0], corner1[2], corner2[0], corner2[2]):
+            return
+        dimension = normalize_dimension(dimension)
+
+        def query(ticket: QueryTicket):
+            containers = self.plugin_inst.storage_index.get_containers_in_box(dimension, corner1, corner2)
+            if ticket.is_cancelled:
+                return
+            header = self.plugin_inst.rtr('storage.spatial.region_header', containers=len(containers), dimension=dimension)
+            self.__reply_containers(ticket, header, [(pos, None) for pos in sorted(containers)])
+
+        self.plugin_inst.query_executor.submit(source, query)
+
+    def find_nearest(self, source: CommandSource, dimension: str, x: int, y: int, z: int, query: Optional[str] = None):
+        dimension = normalize_dimension(dimension)
+
+        def run(ticket: QueryTicket):
+            item_id = None if query is None else self.__resolve_item(query)
+            containers = self.plugin_inst.storage_index.find_nearest(
+                dimension, x, y, z, limit=self.config.query.page_size,
+                max_distance=self.config.query.max_nearest_distance, item_id=item_id
+            )
+            if ticket.is_cancelled:
+                return
+            header = self.plugin_inst.rtr(
+                'storage.spatial.nearest_header', dimension=dimension, x=x, y=y, z=z
+            ) if item_id is None else self.plugin_inst.rtr(
+                'storage.spatial.nearest_item_header', item=item_id, dimension=dimension, x=x, y=y, z=z
+            )
+            self.__reply_containers(ticket, header, containers)
+
+        self.plugin_inst.query_executor.submit(source, run)
+
+    def show_item_stats(self, source: CommandSource, dimension: Optional[str] = None):
+        dimension = None if dimension is None else normalize_dimension(dimension)
+
+        def query(ticket: QueryTicket):
+            totals = self.plugin_inst.storage_index.get_item_totals(dimension)
+            if ticket.is_cancelled:
+                return
+            if len(totals) == 0:
+                ticket.reply(self.plugin_inst.rtr('storage.stats.none'))
+                return
+            ranking = sorted(totals.items(), key=lambda pair: pair[1], reverse=True)
+            header = self.plugin_inst.rtr(
+                'storage.stats.header', kinds=len(ranking), count=sum(totals.values())
+            ) if dimension is None else self.plugin_inst.rtr(
+                'storage.stats.dimension_header', kinds=len(ranking), count=sum(totals.values()), dimension=dimension
+            )
+            result = PagedResult(
+                enumerate(ranking, start=1),
+                lambda pair: self.plugin_inst.rtr('storage.stats.entry', rank=pair[0], item=pair[1][0], count=pair[1][1]),
+                page_size=self.config.query.page_size, header=header, total=len(ranking)
+            )
+            self.page_cursors.open(ticket.source_key, result)
+            ticket.reply(self.render_page(result, 0))
+
+        self.plugin_inst.query_executor.submit(source, query)
+
+    def show_item_total(self, source: CommandSource, query: str):
+        def run(ticket: QueryTicket):
+            item_id = self.__resolve_item(query)
+            totals = self.plugin_inst.storage_index.get_dimension_totals(item_id)
+            if len(totals) == 0:
+                ticket.reply(self.plugin_inst.rtr('storage.find.none', item=item_id))
+                return
+            lines: List[MessageText] = [self.plugin_inst.rtr('storage.total.header', item=item_id, count=sum(totals.values()))]
+            for dimension, count in sorted(totals.items(), key=lambda pair: pair[1], reverse=True):
+                lines.append(self.plugin_inst.rtr('storage.total.entry', dimension=dimension, count=count))
+            ticket.reply(RTextBase.join('\n', lines))
+
+        self.plugin_inst.query_executor.submit(source, run)
+
+    # Scans
+    def scan_container(self, source: CommandSource, dimension: str, x: int, y: int, z: int):
+        queued = self.plugin_inst.container_scanner.request([ContainerPos(normalize_dimension(dimension), x, y, z)])
+        source.reply(self.plugin_inst.rtr('scan.queued', count=queued))
+
+    def rescan_region(self, source: CommandSource, dimension: str, corner1: Tuple[int, int, int], corner2: Tuple[int, int, int]):
+        if not self.__check_area(source, corner1[0], corner1[2], corner2[0], corner2[2]):
+            return
+        dimension = normalize_dimension(dimension)
+
+        def query(ticket: QueryTicket):
+            containers = self.plugin_inst.storage_index.get_containers_in_box(dimension, corner1, corner2)
+            if ticket.is_cancelled:
+                return
+            queued = self.plugin_inst.container_scanner.request(containers)
+            ticket.reply(self.plugin_inst.rtr('scan.queued', count=queued))
+
+        self.plugin_inst.query_executor.submit(source, query)
+
+    # Pages
+    def render_page(self, result: PagedResult, page: int) -> MessageText:
+        lines: List[MessageText] = [] if result.header is None else [result.header]
+        lines.extend(result.iter_page(page))
+        page_count = result.page_count
+        if page_count != 1:
+            lines.append(self.plugin_inst.rtr(
+                'query.page.footer', page=page + 1, pages='?' if page_count is None else page_count,
+                prefix=self.config.primary_prefix
+            ))
+        return RTextBase.join('\n', lines)
+
+    def turn_page(self, source: CommandSource, delta: int):
+        cursor = self.page_cursors.get(QueryExecutor.get_source_key(source))
+        if cursor is None:
+            source.reply(self.plugin_inst.rtr('query.page.no_result'))
+            return
+        page = cursor.page + delta
+        if page < 0:
+            source.reply(self.plugin_inst.rtr('query.page.first'))
+        elif not cursor.result.has_page(page):
+            source.reply(self.plugin_inst.rtr('query.page.last'))
+        else:
+            cursor.page = page
+            source.reply(self.render_page(cursor.result, page))
+
+    def cancel_query(self, source: CommandSource):
+        if self.plugin_inst.query_executor.cancel(source):
+            source.reply(self.plugin_inst.rtr('query.cancelled'))
+        else:
+            source.reply(self.plugin_inst.rtr('query.nothing_to_cancel'))
+
+    def show_memory_usage(self, source: CommandSource):
+        usage = self.plugin_inst.storage_index.get_memory_usage()
+        source.reply(RTextBase.join('\n', [
+            self.plugin_inst.rtr(
+                'debug.memory.snapshot', containers=usage.snapshot_containers,
+                size=MiscTools.format_size(usage.snapshot_bytes), per_record=round(usage.snapshot_bytes_per_record, 1)
+            ),
+            self.plugin_inst.rtr(
+                'debug.memory.overlay', containers=usage.overlay_containers,
+                size=MiscTools.format_size(usage.overlay_bytes), per_record=round(usage.overlay_bytes_per_record, 1)
+            ),
+            self.plugin_inst.rtr('debug.memory.item_codes', count=ItemCodes.size())
+        ]))
+
+    def show_scan_metrics(self, source: CommandSource):
+        metrics = self.plugin_inst.container_scanner.get_metrics()
+        source.reply(RTextBase.join('\n', [
+            self.plugin_inst.rtr(
+                'debug.scan.requests', requested=metrics.requested, coalesced=metrics.coalesced,
+                dropped=metrics.dropped, pending=metrics.pending
+            ),
+            self.plugin_inst.rtr(
+                'debug.scan.results', commands=metrics.commands, updated=metrics.updated,
+                removed=metrics.removed, failed=metrics.failed
+            ),
+            self.plugin_inst.rtr(
+                'debug.scan.throughput', commands=round(metrics.commands_per_second, 2),
+                containers=round(metrics.containers_per_second, 2)
+            ),
+            self.plugin_inst.rtr(
+                'debug.scan.timing', batches=metrics.batches, parse=round(metrics.parse_seconds * 1000, 1),
+                apply=round(metrics.apply_seconds_per_batch * 1000, 2)
+            )
+        ]))
+
+    def show_rescan_stats(self, source: CommandSource):
+        stats = self.plugin_inst.rescan_scheduler.get_stats()
+        source.reply(self.plugin_inst.rtr(
+            'debug.rescan.stats', tracked=stats.tracked, due=stats.due, chunks=stats.sweep_chunks, requested=stats.requested
+        ))
+
     def reload_self(self, source: CommandSource):
         # self.config.set_reloader(source)
         self.server.reload_plugin(self.server.get_self_metadata().id)
@@ -71,15 +317,78 @@ class CommandManager:
     def register_command(self):
         def permed_literal(literals: Union[str, Iterable[str]]) -> Literal:
             literals = {literals} if isinstance(literals, str) else set(literals)
-            return Literal(literals).requires(self.config.get_permission_checker(*literals))
+            cmd = tuple(sorted(literals))
+            # Looked up on the current config when checked, the tree outlives in-place config reloads
+            return Literal(literals).requires(lambda src: self.config.get_permission_checker(*cmd)(src))
+
+        def chain(*nodes: AbstractNode) -> AbstractNode:
+            for parent, child in zip(nodes[:-1], nodes[1:]):
+                parent.then(child)
+            return nodes[0]
+
+        def position(ctx: CommandContext, suffix: str = '') -> Tuple[int, int, int]:
+            return ctx['x' + suffix], ctx['y' + suffix], ctx['z' + suffix]
+
+        def position_nodes(suffix: str = '') -> List[AbstractNode]:
+            return [Integer('x' + suffix), Integer('y' + suffix), Integer('z' + suffix)]
+
+        def dimension_node() -> AbstractNode:
+            return Text('dimension').suggests(lambda: VANILLA_DIMENSIONS)
+
+        def item_node() -> AbstractNode:
+            return GreedyText('item').suggests(lambda src, ctx: self.suggest_item(ctx.get('item', '')))
+
+        nearest_position = position_nodes()
+        nearest_position[-1].runs(
+            lambda src, ctx: self.find_nearest(src, ctx['dimension'], *position(ctx))
+        ).then(
+            item_node().runs(lambda src, ctx: self.find_nearest(src, ctx['dimension'], *position(ctx), ctx['item']))
+        )
+        region_corner = position_nodes('2')
+        region_corner[-1].runs(
+            lambda src, ctx: self.find_in_region(src, ctx['dimension'], position(ctx, '1'), position(ctx, '2'))
+        )
+        scan_position = position_nodes('1')
+        scan_position[-1].runs(lambda src, ctx: self.scan_container(src, ctx['dimension'], *position(ctx, '1')))
+        scan_corner = position_nodes('2')
+        scan_corner[-1].runs(
+            lambda src, ctx: self.rescan_region(src, ctx['dimension'], position(ctx, '1'), position(ctx, '2'))
+        )
 
         root_node: Literal = Literal(self.config.prefix).runs(lambda src: self.show_help(src))
 
         children: List[AbstractNode] = [
-            permed_literal('reload').runs(lambda src: self.reload_self(src))
+            permed_literal('reload').runs(lambda src: self.reload_self(src)),
+            permed_literal('find').then(
+                item_node().runs(lambda src, ctx: self.find_item(src, ctx['item']))
+            ),
+            chain(
+                permed_literal('near'), dimension_node(), *position_nodes(),
+                Number('radius').runs(lambda src, ctx: self.find_near(src, ctx['dimension'], *position(ctx), ctx['radius']))
+            ),
+            chain(permed_literal('region'), dimension_node(), *position_nodes('1'), *region_corner),
+            chain(permed_literal('nearest'), dimension_node(), *nearest_position),
+            permed_literal('stats').runs(lambda src: self.show_item_stats(src)).then(
+                dimension_node().runs(lambda src, ctx: self.show_item_stats(src, ctx['dimension']))
+            ),
+            permed_literal('total').then(
+                item_node().runs(lambda src, ctx: self.show_item_total(src, ctx['item']))
+            ),
+            chain(permed_literal('scan'), dimension_node(), *scan_position, *scan_corner),
+            permed_literal('cancel').runs(lambda src: self.cancel_query(src)),
+            Literal('next').runs(lambda src: self.turn_page(src, 1)),
+            Literal('prev').runs(lambda src: self.turn_page(src, -1))
         ]
 
-        debug_nodes: List[AbstractNode] = []
+        debug_nodes: List[AbstractNode] = [
+            permed_literal('debug').then(
+                Literal('memory').runs(lambda src: self.show_memory_usage(src))
+            ).then(
+                Literal('scan').runs(lambda src: self.show_scan_metrics(src))
+            ).then(
+                Literal('rescan').runs(lambda src: self.show_rescan_stats(src))
+            )
+        ]
 
         if self.config.enable_debug_commands:
             children += debug_nodes
@@ -1,4 +1,5 @@
-from typing import Union, List, Optional, Any
+import types
+from typing import Union, List, Optional, Any, Dict, Mapping, Callable, Tuple
 
 from mcdreforged.api.utils import Serializable
 
@@ -14,9 +15,74 @@ class __Serializable(Serializable):
 
 class PermissionRequirements(__Serializable):
     reload: int = 3
+    find: int = 1
+    cancel: int = 1
+    near: int = 1
+    region: int = 1
+    nearest: int = 1
+    stats: int = 1
+    total: int = 1
+    scan: int = 2
+    debug: int = 4
+
+    def get_table(self) -> Mapping[str, int]:
+        """
+        Resolved once, requirements are not modified after the config is loaded
+        """
+        try:
+            return self.__table
+        except AttributeError:
+            self.__table = types.MappingProxyType(self.serialize())
+            return self.__table
 
     def get_permission(self, cmd: str, default_value: int):
-        return self.serialize().get(cmd, default_value)
+        return self.get_table().get(cmd, default_value)
+
+
+class ConfigWatcherOptions(__Serializable):
+    enabled: bool = False
+    poll_interval: float = 1.0
+    debounce_delay: float = 0.5
+
+
+class StorageOptions(__Serializable):
+    log_sync_interval: float = 1.0
+    compaction_interval: float = 300.0
+    compaction_min_log_size: int = 4 * 1024 * 1024
+
+
+class QueryOptions(__Serializable):
+    max_pending: int = 16
+    page_size: int = 10
+    page_expiry: float = 300.0
+    max_query_chunks: int = 4096
+    max_nearest_distance: float = 256.0
+
+
+class ScanOptions(__Serializable):
+    commands_per_second: float = 20.0
+    batch_size: int = 64
+    max_pending: int = 4096
+    reply_timeout: float = 5.0
+
+
+class RescanOptions(__Serializable):
+    enabled: bool = True
+    commands_per_second: float = 2.0
+    min_interval: float = 300.0
+    max_interval: float = 21600.0
+    max_scanner_backlog: int = 256
+
+
+class ExecutorOptions(__Serializable):
+    default_workers: int = 4
+    # Worker counts of specific executors, by name
+    workers: Dict[str, int] = {'QueryWorker': 2, 'ItemSearchBuild': 1}
+
+
+class SearchOptions(__Serializable):
+    languages: List[str] = ['en_us', 'zh_cn']
+    suggestion_limit: int = 20
 
 
 # class Configuration(ConfigurationBase):
@@ -24,6 +90,13 @@ class Configuration(__Serializable):
     command_prefix: Union[List[str], str] = '!!template'
     permission_requirements: PermissionRequirements = PermissionRequirements.get_default()
     enable_permission_check: bool = True
+    config_watcher: ConfigWatcherOptions = ConfigWatcherOptions.get_default()
+    storage: StorageOptions = StorageOptions.get_default()
+    query: QueryOptions = QueryOptions.get_default()
+    search: SearchOptions = SearchOptions.get_default()
+    scan: ScanOptions = ScanOptions.get_default()
+    rescan: RescanOptions = RescanOptions.get_default()
+    executors: ExecutorOptions = ExecutorOptions.get_default()
 
     debug: bool
     verbosity: bool
@@ -46,12 +119,24 @@ class Configuration(__Serializable):
 
     def after_load(self, plugin_inst):
         plugin_inst.set_verbose(self.is_verbose)
-
-    def get_permission_checker(self, *cmd: str, default_value: int = 0):
-        if not self.enable_permission_check:
-            return lambda: True
-        perm = default_value
-        for item in cmd:
-            current_item_perm = self.permission_requirements.get_permission(item, default_value)
-            perm = perm if perm >= current_item_perm else current_item_perm
-        return lambda src: src.has_permission(perm)
+        self.permission_requirements.get_table()
+
+    def get_permission_level(self, *cmd: str, default_value: int = 0) -> int:
+        table = self.permission_requirements.get_table()
+        return max((table.get(item, default_value) for item in cmd), default=default_value)
+
+    def get_permission_checker(self, *cmd: str, default_value: int = 0) -> Callable[[Any], bool]:
+        key = (cmd, default_value)
+        try:
+            checkers = self.__permission_checkers
+        except AttributeError:
+            checkers = self.__permission_checkers = {}
+        checker = checkers.get(key)
+        if checker is None:
+            if not self.enable_permission_check:
+                checker = lambda src: True
+            else:
+                perm = self.get_permission_level(*cmd, default_value=default_value)
+                checker = lambda src: src.has_permission(perm)
+            checkers[key] = checker
+        return checker
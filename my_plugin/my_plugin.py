@@ -1,12 +1,26 @@
 import os.path
+import threading
 
-from mcdreforged.api.types import ServerInterface, PluginServerInterface, MCDReforgedLogger
+from mcdreforged.api.types import ServerInterface, PluginServerInterface, MCDReforgedLogger, CommandSource, Info
 from mcdreforged.api.rtext import RTextMCDRTranslation
-from typing import Optional, Self, IO
+from mcdreforged.api.utils import deserialize
+from typing import Optional, Self, IO, List, Dict, Callable, Any, Tuple
 
 from my_plugin.config import Configuration
 from my_plugin.commands import CommandManager
+from my_plugin.storage.index import StorageIndex
+from my_plugin.storage.item_names import ItemNameTables
+from my_plugin.storage.rescan import RescanScheduler
+from my_plugin.storage.scanner import ContainerScanner
+from my_plugin.storage.search import ItemSearchIndex
+from my_plugin.utils.file_util import FileUtils
+from my_plugin.utils.file_watcher import FileWatcher
+from my_plugin.utils.misc import MiscTools
+from my_plugin.utils.query_executor import QueryExecutor
 from my_plugin.utils.logger import BlossomLogger
+from my_plugin.utils.serializer import ConfigChangeNotifier, ConfigFileState, ConfigurationBase, diff_sections, \
+    diff_serialized
+from my_plugin.utils.util_abc import AbstractUtil
 
 # from my_plugin.utils.standalone_tr import BlossomTranslator
 
@@ -16,6 +30,8 @@ from my_plugin.constants import TRANSLATION_KEY_PREFIX, CONFIG_FILE
 
 class MyPlugin:
     __instance: Optional[Self] = None
+    # The watcher may be busy in a config reload, do not hold the unload for longer than that
+    WATCHER_STOP_TIMEOUT = 5.0
 
     @classmethod
     def get_instance(cls) -> Self:
@@ -26,6 +42,7 @@ class MyPlugin:
     def __init__(self):
         self.server = ServerInterface.psi()
         # self.server = ServerInterface.psi_opt()  # psi_opt() if requires to be run standalone
+        AbstractUtil.set_plugin_instance(self)
         self.__verbosity = False
         # self.translator = BlossomTranslator(self)
         # self.translator.register_bundled_translations()
@@ -36,9 +53,82 @@ class MyPlugin:
             os.path.join(self.get_data_folder(), CONFIG_FILE),
             target_class=Configuration
         )
+        self.__config_lock = threading.Lock()
+        self.__config_file_state: Optional[ConfigFileState] = None
+        # Top-level sections of the config file as last read, reloads validate the sections that differ only
+        self.__config_raw_data: dict = {}
+        self.__read_config_file()
+        self.config_change_notifier = ConfigChangeNotifier()
+        self.config_watcher: Optional[FileWatcher] = None
 
-
+        self.storage_index = StorageIndex(self)
+        self.storage_index.load()
+        self.item_names = ItemNameTables(self.get_data_folder(), FileUtils.get_bundled_resources)
+        self.__item_search: Optional[ItemSearchIndex] = None
+        # Added and removed item listeners of the storage index feeding the item search
+        self.__item_search_listeners: Optional[Tuple[Callable[[str], Any], Callable[[str], Any]]] = None
+        self.__item_search_lock = threading.Lock()
+        self.query_executor = QueryExecutor(self, self.config.query.max_pending)
+        scan_options = self.config.scan
+        self.container_scanner = ContainerScanner(
+            self, scan_options.commands_per_second, scan_options.batch_size, scan_options.max_pending, scan_options.reply_timeout
+        )
+        rescan_options = self.config.rescan
+        self.rescan_scheduler = RescanScheduler(
+            self, self.container_scanner, rescan_options.commands_per_second,
+            rescan_options.min_interval, rescan_options.max_interval, rescan_options.max_scanner_backlog
+        )
         self.command_manager = CommandManager(self)
+        self.__add_config_listeners()
+
+    def __add_config_listeners(self):
+        """
+        Components copy their options when built, reapply them on in-place config reloads
+        """
+        notifier = self.config_change_notifier
+        notifier.add_listener(lambda nodes: self.__apply_storage_options(), 'storage')
+        notifier.add_listener(lambda nodes: self.query_executor.configure(self.config.query.max_pending), 'query.max_pending')
+        notifier.add_listener(lambda nodes: MiscTools.resize_executors(), 'executors')
+        notifier.add_listener(lambda nodes: self.__apply_scan_options(), 'scan')
+        notifier.add_listener(lambda nodes: self.__apply_rescan_options(), 'rescan')
+        notifier.add_listener(lambda nodes: self.__reset_item_search(), 'search.languages')
+        notifier.add_listener(lambda nodes: self.__apply_watcher_options(), 'config_watcher')
+
+    def __apply_storage_options(self):
+        options = self.config.storage
+        self.storage_index.start_background_jobs(
+            options.log_sync_interval, options.compaction_interval, options.compaction_min_log_size
+        )
+
+    def __apply_scan_options(self):
+        options = self.config.scan
+        self.container_scanner.configure(
+            options.commands_per_second, options.batch_size, options.max_pending, options.reply_timeout
+        )
+
+    def __apply_rescan_options(self):
+        options = self.config.rescan
+        self.rescan_scheduler.configure(
+            options.commands_per_second, options.min_interval, options.max_interval, options.max_scanner_backlog
+        )
+        if options.enabled:
+            self.rescan_scheduler.start()
+        else:
+            self.rescan_scheduler.stop()
+
+    def __apply_watcher_options(self):
+        # May be called on the watcher thread itself, the old watcher then exits once the callback returns
+        if self.config_watcher is not None:
+            self.config_watcher.stop(self.WATCHER_STOP_TIMEOUT)
+            self.config_watcher = None
+        options = self.config.config_watcher
+        if options.enabled:
+            self.config_watcher = FileWatcher(
+                self, self.get_config_file_path(), self.reload_config,
+                poll_interval=options.poll_interval,
+                debounce_delay=options.debounce_delay
+            )
+            self.config_watcher.start()
 
     @property
     def logger(self) -> MCDReforgedLogger:
@@ -63,6 +153,179 @@ class MyPlugin:
         server.register_help_message(self.config.primary_prefix, self.rtr('help.mcdr'))
         # self.logger.register_event_listeners()
         self.command_manager.register_command()
+        self.open_storage_index()
+        self.query_executor.start()
+        self.container_scanner.start()
+        if self.config.rescan.enabled:
+            self.rescan_scheduler.start()
+        self.__warm_up_item_search()
+        self.__apply_watcher_options()
+
+    def on_unload(self, server: PluginServerInterface):
+        if self.config_watcher is not None:
+            self.config_watcher.stop(self.WATCHER_STOP_TIMEOUT)
+        self.query_executor.stop()
+        self.rescan_scheduler.stop()
+        self.container_scanner.stop()
+        self.storage_index.stop_background_jobs()
+        self.storage_index.close()
+        MiscTools.shutdown_executors()
+        FileUtils.close_bundled_resources()
+
+    def on_info(self, server: PluginServerInterface, info: Info):
+        # Player chat is server output too, it must never be taken for a command reply
+        if info.is_from_server and not info.is_player:
+            self.container_scanner.feed_output(info.content)
+
+    def open_storage_index(self):
+        replayed = self.storage_index.open_log()
+        if replayed > 0:
+            self.logger.info('Recovered {} storage index changes from write-ahead log'.format(replayed))
+        self.__apply_storage_options()
+
+    def get_item_search(self) -> ItemSearchIndex:
+        """
+        Built on first use from the item name files and the indexed item ids, kept up to date by the storage index
+        """
+        if self.__item_search is None:
+            with self.__item_search_lock:
+                if self.__item_search is None:
+                    self.__item_search = self.__build_item_search()
+        return self.__item_search
+
+    def __reset_item_search(self):
+        with self.__item_search_lock:
+            if self.__item_search_listeners is not None:
+                on_added, on_removed = self.__item_search_listeners
+                self.storage_index.remove_item_listener(on_added)
+                self.storage_index.remove_item_removal_listener(on_removed)
+                self.__item_search_listeners = None
+            self.__item_search = None
+        self.__warm_up_item_search()
+
+    @MiscTools.pooled_thread('ItemSearchBuild')
+    def __warm_up_item_search(self):
+        # So that the first tab completion does not pay for the build
+        self.get_item_search()
+
+    def __build_item_search(self) -> ItemSearchIndex:
+        search = ItemSearchIndex()
+        items: Dict[str, List[str]] = {}
+        for language in self.config.search.languages:
+            try:
+                names = self.item_names.get_table(language)
+            except Exception as e:
+                self.logger.warning('Failed to load item names of language {}: {}'.format(language, e))
+                continue
+            for item_id, name in names.items():
+                items.setdefault(item_id, []).append(name)
+        # Registered before reading the ids so that no item added meanwhile is missed.
+        # Items with a display name stay suggested when no container holds them anymore, like all other named items
+        named = set(items.keys())
+        on_added = lambda item_id: item_id in search or search.add_item(item_id)
+        on_removed = lambda item_id: item_id in named or search.remove_item(item_id)
+        self.storage_index.add_item_listener(on_added)
+        self.storage_index.add_item_removal_listener(on_removed)
+        self.__item_search_listeners = (on_added, on_removed)
+        for item_id in self.storage_index.get_item_ids():
+            items.setdefault(item_id, [])
+        search.add_items(items)
+        self.debug('Built item search index with {} items'.format(len(search)))
+        return search
+
+    # Config
+    def get_config_file_path(self) -> str:
+        return os.path.join(self.get_data_folder(), CONFIG_FILE)
+
+    def __read_config_file(self) -> List[str]:
+        """
+        Read the config file if it changed since the last read
+        :return: Top-level sections that changed
+        """
+        self.__config_file_state, text = ConfigFileState.read_changed(self.get_config_file_path(), self.__config_file_state)
+        if text is None:
+            return []
+        try:
+            read_data = ConfigurationBase.get_yaml('safe').load(text)
+            if not isinstance(read_data, dict):
+                raise TypeError('Config file root is not a mapping')
+        except Exception as e:
+            # Do not wipe a running config for a half-written or broken edit
+            self.logger.warning('Failed to read modified config file, keeping current config: {}'.format(e))
+            return []
+        changed_keys = diff_sections(self.__config_raw_data, read_data, Configuration.get_field_annotations().keys())
+        self.__config_raw_data = read_data
+        return changed_keys
+
+    def schedule_reload(self):
+        """
+        Reload the plugin from the task executor without waiting for it,
+        the unload joins plugin threads and would deadlock a plugin thread waiting for the reload
+        """
+        plugin_id = self.server.get_self_metadata().id
+        self.server.schedule_task(lambda: self.server.reload_plugin(plugin_id))
+
+    def reload_config(self, source: Optional[CommandSource] = None) -> List[str]:
+        """
+        Apply config file changes without reloading the plugin.
+        The new config object replaces the current one with a single reference swap,
+        changes affecting the registered command tree fall back to a full plugin reload
+        :return: Changed node paths
+        """
+        reload_plugin = False
+        with self.__config_lock:
+            changed_keys = self.__read_config_file()
+            if len(changed_keys) == 0:
+                return []
+            old_data = self.config.serialize()
+            new_data, invalid_keys = self.__validate_config_sections(old_data, changed_keys)
+            if len(invalid_keys) > 0:
+                self.__reply(source, 'Invalid config sections kept unchanged: {}'.format(', '.join(invalid_keys)), warning=True)
+            new_config = Configuration.deserialize(new_data)
+            changed_nodes = diff_serialized(old_data, new_config.serialize())
+            if len(changed_nodes) == 0:
+                return []
+            if any(ConfigChangeNotifier.is_affected(node, changed_nodes) for node in CommandManager.COMMAND_TREE_CONFIG_NODES):
+                reload_plugin = True
+            else:
+                self.config = new_config
+                new_config.after_load(self)
+        if reload_plugin:
+            self.logger.info('Config of registered commands changed, reloading plugin')
+            self.schedule_reload()
+            return changed_nodes
+        self.__reply(source, 'Config reloaded, changed: {}'.format(', '.join(changed_nodes)))
+        self.config_change_notifier.notify(changed_nodes)
+        return changed_nodes
+
+    def __validate_config_sections(self, old_data: dict, changed_keys: List[str]) -> Tuple[dict, List[str]]:
+        """
+        Deserialize the changed sections of the config file only, the other sections keep their current values
+        :return: Serialized new config, and the changed sections that are invalid and were kept as is
+        """
+        annotations = Configuration.get_field_annotations()
+        new_data, invalid_keys = dict(old_data), []
+        for key in changed_keys:
+            if key not in self.__config_raw_data.keys():
+                # Removed from the file, back to the default value
+                new_data.pop(key, None)
+                continue
+            value = self.__config_raw_data[key]
+            try:
+                deserialize(value, annotations[key])
+            except (TypeError, ValueError):
+                invalid_keys.append(key)
+                continue
+            new_data[key] = value
+        return new_data, invalid_keys
+
+    def __reply(self, source: Optional[CommandSource], text: str, warning: bool = False):
+        if warning:
+            self.logger.warning(text)
+        else:
+            self.logger.info(text)
+        if source is not None:
+            source.reply(text)
 
     # Translations
     def rtr(
@@ -129,7 +392,7 @@ class MyPlugin:
         )
 
     def open_bundled_file(self, file_path: str) -> 'IO[bytes]':
-        return self.server.open_bundled_file(file_path)
+        return FileUtils.open_bundled_file(file_path)
 
     """
     # Only MCDR plugin, turn into ABC
@@ -0,0 +1,629 @@
+import heapq
+import os
+import sys
+import threading
+from threading import RLock
+from typing import Dict, List, Set, Tuple, Optional, Iterable, Iterator, Callable, Any, Union, NamedTuple, TYPE_CHECKING
+
+from my_plugin.storage.container import ContainerPos, ContainerRecord, ItemLocation, normalize_item_id, normalize_dimension
+from my_plugin.storage.snapshot import StorageSnapshot, SnapshotFormatError
+from my_plugin.storage.wal import WriteAheadLog, LogRecord, LogOperation
+from my_plugin.utils.file_util import FileUtils
+from my_plugin.utils.misc import MiscTools
+
+if TYPE_CHECKING:
+    from my_plugin.my_plugin import MyPlugin
+
+
+class MemoryUsage(NamedTuple):
+    snapshot_containers: int
+    snapshot_bytes: int
+    overlay_containers: int
+    overlay_bytes: int
+
+    @property
+    def snapshot_bytes_per_record(self) -> float:
+        return self.snapshot_bytes / self.snapshot_containers if self.snapshot_containers > 0 else 0
+
+    @property
+    def overlay_bytes_per_record(self) -> float:
+        return self.overlay_bytes / self.overlay_containers if self.overlay_containers > 0 else 0
+
+
+class StorageIndex:
+    """
+    Container contents indexed by item id and by dimension and chunk.
+    The persisted state is a memory-mapped snapshot queried lazily, changes made since then live in an in-memory overlay
+    which shadows the snapshot per container, so startup cost does not grow with the index size.
+    Mutations are appended to a write-ahead log once it is opened, compaction folds the overlay into a new snapshot
+    """
+    FILE_NAME = 'storage_index.bin'
+    LOG_FILE_NAME = 'storage_index.log'
+
+    def __init__(self, plugin_inst: "MyPlugin"):
+        self.__inst = plugin_inst
+        self.__lock = RLock()
+        self.__compaction_lock = threading.Lock()
+        self.__base: Optional[StorageSnapshot] = None
+        self.__base_hidden = False
+        self.__clear_generation = 0
+        # None marks a container removed from the snapshot
+        self.__containers: Dict[ContainerPos, Optional[ContainerRecord]] = {}
+        # Snapshot container indexes of the overlay entries, they are left out of snapshot aggregations
+        self.__shadowed: Dict[ContainerPos, int] = {}
+        # Counts are read from the records, holder sets do not keep int objects of their own
+        self.__item_index: Dict[str, Set[ContainerPos]] = {}
+        self.__chunks: Dict[str, Dict[Tuple[int, int], Set[ContainerPos]]] = {}
+        self.__size = 0
+        self.__wal: Optional[WriteAheadLog] = None
+        self.__stop_event = threading.Event()
+        self.__background_threads: List[threading.Thread] = []
+        self.__item_listeners: List[Callable[[str], Any]] = []
+        self.__item_removal_listeners: List[Callable[[str], Any]] = []
+
+    @property
+    def file_path(self) -> str:
+        return os.path.join(self.__inst.get_data_folder(), self.FILE_NAME)
+
+    @property
+    def log_file_path(self) -> str:
+        return os.path.join(self.__inst.get_data_folder(), self.LOG_FILE_NAME)
+
+    def __len__(self) -> int:
+        return self.__size
+
+    def add_item_listener(self, callback: Callable[[str], Any]):
+        """
+        Called with the lock held for item ids that might be new to the index
+        """
+        self.__item_listeners.append(callback)
+
+    def remove_item_listener(self, callback: Callable[[str], Any]):
+        with self.__lock:
+            if callback in self.__item_listeners:
+                self.__item_listeners.remove(callback)
+
+    def add_item_removal_listener(self, callback: Callable[[str], Any]):
+        """
+        Called with the lock held for item ids no container holds anymore
+        """
+        self.__item_removal_listeners.append(callback)
+
+    def remove_item_removal_listener(self, callback: Callable[[str], Any]):
+        with self.__lock:
+            if callback in self.__item_removal_listeners:
+                self.__item_removal_listeners.remove(callback)
+
+    def __get_held_items(self, pos: ContainerPos) -> Iterable[str]:
+        # Called with the lock held, before the content of the container is changed
+        if pos in self.__containers.keys():
+            items = self.__containers[pos]
+            return () if items is None else items.keys()
+        base = self.__visible_base
+        items = None if base is None else base.get_container(pos)
+        return () if items is None else items.keys()
+
+    def __is_item_held(self, item_id: str) -> bool:
+        if item_id in self.__item_index.keys():
+            return True
+        base = self.__visible_base
+        if base is None:
+            return False
+        shadowed = self.__containers.keys()
+        return any(pos not in shadowed for pos, _ in base.iter_item_holders(item_id))
+
+    def __notify_removed_items(self, item_ids: Iterable[str]):
+        for item_id in item_ids:
+            if not self.__is_item_held(item_id):
+                for listener in self.__item_removal_listeners:
+                    listener(item_id)
+
+    # Overlay
+    @property
+    def __visible_base(self) -> Optional[StorageSnapshot]:
+        return None if self.__base_hidden else self.__base
+
+    def __shadow(self, pos: ContainerPos) -> bool:
+        """
+        Record the snapshot container a new overlay entry shadows
+        :return: Whether the snapshot holds the container
+        """
+        base = self.__visible_base
+        index = None if base is None else base.find_container_index(pos)
+        if index is None:
+            return False
+        self.__shadowed[pos] = index
+        return True
+
+    def __unlink(self, pos: ContainerPos):
+        items = self.__containers.pop(pos, None)
+        if items is None:
+            return
+        for item in items.keys():
+            holders = self.__item_index.get(item)
+            if holders is not None:
+                holders.discard(pos)
+                if len(holders) == 0:
+                    del self.__item_index[item]
+        chunks = self.__chunks.get(pos.dimension)
+        if chunks is not None:
+            bucket = chunks.get(pos.chunk)
+            if bucket is not None:
+                bucket.discard(pos)
+                if len(bucket) == 0:
+                    del chunks[pos.chunk]
+
+    def __link(self, pos: ContainerPos, items: ContainerRecord):
+        self.__containers[pos] = items
+        for item in items.keys():
+            holders = self.__item_index.get(item)
+            if holders is None:
+                holders = self.__item_index[item] = set()
+                # Might be known by the snapshot already, listeners have to be idempotent
+                for listener in self.__item_listeners:
+                    listener(item)
+            holders.add(pos)
+        self.__chunks.setdefault(pos.dimension, {}).setdefault(pos.chunk, set()).add(pos)
+
+    def __reset_overlay(self):
+        self.__containers.clear()
+        self.__shadowed.clear()
+        self.__item_index.clear()
+        self.__chunks.clear()
+
+    # Mutations
+    @staticmethod
+    def __intern_pos(pos: ContainerPos) -> ContainerPos:
+        # Normalized, and sharing one dimension string with all other positions
+        dimension = pos.dimension if ':' in pos.dimension else normalize_dimension(pos.dimension)
+        dimension = sys.intern(dimension)
+        return pos if dimension is pos.dimension else pos._replace(dimension=dimension)
+
+    def __apply_update(self, pos: ContainerPos, items: ContainerRecord):
+        previous = [item for item in self.__get_held_items(pos) if item not in items.keys()] if self.__item_removal_listeners else ()
+        if pos in self.__containers.keys():
+            if self.__containers[pos] is None:
+                self.__size += 1
+        elif not self.__shadow(pos):
+            self.__size += 1
+        self.__unlink(pos)
+        self.__link(pos, items)
+        self.__notify_removed_items(previous)
+
+    def __apply_remove(self, pos: ContainerPos) -> bool:
+        if pos in self.__containers.keys():
+            if self.__containers[pos] is None:
+                return False
+        elif not self.__shadow(pos):
+            return False
+        previous = list(self.__get_held_items(pos)) if self.__item_removal_listeners else ()
+        self.__unlink(pos)
+        if pos in self.__shadowed.keys():
+            self.__containers[pos] = None
+        self.__size -= 1
+        self.__notify_removed_items(previous)
+        return True
+
+    def __apply_clear(self):
+        previous = self.get_item_ids() if self.__item_removal_listeners else ()
+        self.__reset_overlay()
+        self.__base_hidden = self.__base is not None
+        self.__clear_generation += 1
+        self.__size = 0
+        self.__notify_removed_items(previous)
+
+    def __apply_record(self, record: LogRecord):
+        if record.operation == LogOperation.UPDATE:
+            self.__apply_update(self.__intern_pos(record.pos), ContainerRecord(record.items))
+        elif record.operation == LogOperation.REMOVE:
+            self.__apply_remove(self.__intern_pos(record.pos))
+        else:
+            self.__apply_clear()
+
+    def update_container(self, pos: ContainerPos, items: Dict[str, int]):
+        """
+        Replace the indexed content of a container, empty containers stay indexed
+        """
+        items = ContainerRecord({normalize_item_id(item): count for item, count in items.items() if count > 0})
+        pos = self.__intern_pos(pos)
+        with self.__lock:
+            self.__apply_update(pos, items)
+            self.__log(LogRecord(LogOperation.UPDATE, pos, items))
+
+    def remove_container(self, pos: ContainerPos) -> bool:
+        pos = self.__intern_pos(pos)
+        with self.__lock:
+            if not self.__apply_remove(pos):
+                return False
+            self.__log(LogRecord(LogOperation.REMOVE, pos))
+            return True
+
+    def apply_changes(self, changes: Dict[ContainerPos, Optional[Dict[str, int]]]) -> int:
+        """
+        Apply container updates in one transaction, None removes a container.
+        The lock is taken and the log is written once for the whole batch
+        :return: Number of applied changes, removals of unknown containers are not counted
+        """
+        records = []
+        for pos, items in changes.items():
+            pos = self.__intern_pos(pos)
+            if items is None:
+                records.append(LogRecord(LogOperation.REMOVE, pos))
+            else:
+                items = ContainerRecord({normalize_item_id(item): count for item, count in items.items() if count > 0})
+                records.append(LogRecord(LogOperation.UPDATE, pos, items))
+        with self.__lock:
+            applied = []
+            for record in records:
+                if record.operation == LogOperation.UPDATE:
+                    self.__apply_update(record.pos, record.items)
+                elif not self.__apply_remove(record.pos):
+                    continue
+                applied.append(record)
+            if len(applied) > 0 and self.__wal is not None:
+                self.__wal.append_many(applied)
+            return len(applied)
+
+    def clear(self):
+        with self.__lock:
+            self.__apply_clear()
+            self.__log(LogRecord(LogOperation.CLEAR))
+
+    # Write-ahead log
+    def __log(self, record: LogRecord):
+        # Called with the lock held so that log order matches apply order
+        if self.__wal is not None:
+            self.__wal.append(record)
+
+    def open_log(self) -> int:
+        """
+        Replay records logged after the last compaction, then log further mutations
+        :return: Number of replayed records
+        """
+        with self.__lock:
+            if self.__wal is not None:
+                return 0
+            FileUtils.ensure_dir(os.path.dirname(self.log_file_path))
+            wal = WriteAheadLog(self.log_file_path)
+            replayed = wal.replay(self.__apply_record)
+            wal.open()
+            self.__wal = wal
+        return replayed
+
+    def sync_log(self):
+        wal = self.__wal
+        if wal is not None:
+            wal.sync()
+
+    def close_log(self):
+        with self.__lock:
+            if self.__wal is not None:
+                self.__wal.close()
+                self.__wal = None
+
+    @property
+    def log_size(self) -> int:
+        wal = self.__wal
+        return wal.size if wal is not None else 0
+
+    def start_background_jobs(self, sync_interval: float, compaction_interval: float, compaction_min_log_size: int):
+        self.stop_background_jobs()
+        self.__stop_event.clear()
+        self.__background_threads = [
+            self.__sync_loop(sync_interval),
+            self.__compaction_loop(compaction_interval, compaction_min_log_size)
+        ]
+
+    def stop_background_jobs(self, timeout: Optional[float] = None):
+        self.__stop_event.set()
+        for thread in self.__background_threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout)
+        self.__background_threads = []
+
+    @MiscTools.named_thread('StorageLogSync')
+    def __sync_loop(self, interval: float):
+        while not self.__stop_event.wait(interval):
+            self.sync_log()
+
+    @MiscTools.named_thread('StorageCompaction')
+    def __compaction_loop(self, interval: float, min_log_size: int):
+        while not self.__stop_event.wait(interval):
+            if self.log_size < min_log_size:
+                continue
+            try:
+                self.compact()
+            except Exception:
+                self.__inst.logger.exception('Failed to compact storage index')
+
+    # Queries
+    def get_container(self, pos: ContainerPos) -> Optional[Dict[str, int]]:
+        with self.__lock:
+            if pos in self.__containers.keys():
+                items = self.__containers[pos]
+                return None if items is None else items.to_dict()
+            base = self.__visible_base
+            return None if base is None else base.get_container(pos)
+
+    def find_item(self, item_id: str) -> List[ItemLocation]:
+        item_id = normalize_item_id(item_id)
+        with self.__lock:
+            result = [ItemLocation(pos, self.__containers[pos].get(item_id)) for pos in self.__item_index.get(item_id, ())]
+            base = self.__visible_base
+            if base is not None:
+                shadowed = self.__containers.keys()
+                result.extend(ItemLocation(pos, count) for pos, count in base.iter_item_holders(item_id) if pos not in shadowed)
+            return result
+
+    def get_item_ids(self) -> List[str]:
+        with self.__lock:
+            result = set(self.__item_index.keys())
+            base = self.__visible_base
+            if base is not None:
+                if len(self.__containers) == 0:
+                    result.update(base.iter_item_ids())
+                else:
+                    shadowed = self.__containers.keys()
+                    for item_id in base.iter_item_ids():
+                        if item_id not in result and any(pos not in shadowed for pos, _ in base.iter_item_holders(item_id)):
+                            result.add(item_id)
+            return list(result)
+
+    def __get_chunk(self, dimension: str, chunk_x: int, chunk_z: int) -> List[ContainerPos]:
+        result = list(self.__chunks.get(dimension, {}).get((chunk_x, chunk_z), ()))
+        base = self.__visible_base
+        if base is not None:
+            shadowed = self.__containers.keys()
+            result.extend(pos for pos in base.iter_chunk(dimension, chunk_x, chunk_z) if pos not in shadowed)
+        return result
+
+    def get_containers_in_chunk(self, dimension: str, chunk_x: int, chunk_z: int) -> List[ContainerPos]:
+        with self.__lock:
+            return self.__get_chunk(dimension, chunk_x, chunk_z)
+
+    def get_chunk_keys(self) -> List[Tuple[str, int, int]]:
+        """
+        (dimension, chunk x, chunk z) of chunks that might hold containers, sorted
+        """
+        with self.__lock:
+            result = {(dimension, *chunk) for dimension, chunks in self.__chunks.items() for chunk in chunks.keys()}
+            base = self.__visible_base
+            if base is not None:
+                result.update(base.iter_chunk_keys())
+            return sorted(result)
+
+    # Spatial queries, only chunk cells overlapping the queried area are visited
+    @staticmethod
+    def get_chunk_span(x1: int, z1: int, x2: int, z2: int) -> Tuple[int, int, int, int]:
+        return min(x1, x2) >> 4, min(z1, z2) >> 4, max(x1, x2) >> 4, max(z1, z2) >> 4
+
+    @classmethod
+    def get_chunk_count(cls, x1: int, z1: int, x2: int, z2: int) -> int:
+        chunk_x1, chunk_z1, chunk_x2, chunk_z2 = cls.get_chunk_span(x1, z1, x2, z2)
+        return (chunk_x2 - chunk_x1 + 1) * (chunk_z2 - chunk_z1 + 1)
+
+    def get_containers_in_box(
+            self, dimension: str, corner1: Tuple[int, int, int], corner2: Tuple[int, int, int]
+    ) -> List[ContainerPos]:
+        (x1, y1, z1), (x2, y2, z2) = corner1, corner2
+        x1, x2, y1, y2, z1, z2 = min(x1, x2), max(x1, x2), min(y1, y2), max(y1, y2), min(z1, z2), max(z1, z2)
+        chunk_x1, chunk_z1, chunk_x2, chunk_z2 = self.get_chunk_span(x1, z1, x2, z2)
+        result = []
+        with self.__lock:
+            for chunk_x in range(chunk_x1, chunk_x2 + 1):
+                for chunk_z in range(chunk_z1, chunk_z2 + 1):
+                    for pos in self.__get_chunk(dimension, chunk_x, chunk_z):
+                        if x1 <= pos.x <= x2 and y1 <= pos.y <= y2 and z1 <= pos.z <= z2:
+                            result.append(pos)
+        return result
+
+    def get_containers_in_range(self, dimension: str, x: int, y: int, z: int, radius: float) -> List[Tuple[ContainerPos, float]]:
+        """
+        :return: (position, distance) pairs within the sphere, nearest first
+        """
+        reach = int(radius)
+        result = []
+        for pos in self.get_containers_in_box(dimension, (x - reach, y - reach, z - reach), (x + reach, y + reach, z + reach)):
+            distance = pos.distance_to(x, y, z)
+            if distance <= radius:
+                result.append((pos, distance))
+        result.sort(key=lambda pair: pair[1])
+        return result
+
+    @staticmethod
+    def __iter_chunk_ring(chunk_x: int, chunk_z: int, ring: int) -> Iterator[Tuple[int, int]]:
+        if ring == 0:
+            yield chunk_x, chunk_z
+            return
+        for dx in range(-ring, ring + 1):
+            yield chunk_x + dx, chunk_z - ring
+            yield chunk_x + dx, chunk_z + ring
+        for dz in range(-ring + 1, ring):
+            yield chunk_x - ring, chunk_z + dz
+            yield chunk_x + ring, chunk_z + dz
+
+    def find_nearest(
+            self, dimension: str, x: int, y: int, z: int, limit: int = 1, max_distance: float = 256.0,
+            item_id: Optional[str] = None
+    ) -> List[Tuple[ContainerPos, float]]:
+        """
+        Nearest containers, optionally only those holding the given item.
+        Without an item, chunk rings around the position are visited outwards until no unvisited container
+        can be nearer than the found ones
+        """
+        if item_id is not None:
+            candidates = [
+                (location.pos, location.pos.distance_to(x, y, z))
+                for location in self.find_item(item_id) if location.pos.dimension == dimension
+            ]
+            return heapq.nsmallest(limit, [c for c in candidates if c[1] <= max_distance], key=lambda pair: pair[1])
+        chunk_x, chunk_z = x >> 4, z >> 4
+        candidates = []
+        with self.__lock:
+            for ring in range(int(max_distance) // 16 + 2):
+                for cell_x, cell_z in self.__iter_chunk_ring(chunk_x, chunk_z, ring):
+                    for pos in self.__get_chunk(dimension, cell_x, cell_z):
+                        distance = pos.distance_to(x, y, z)
+                        if distance <= max_distance:
+                            candidates.append((pos, distance))
+                # Horizontal distance from the position to the nearest cell outside the visited rings
+                bound = min(
+                    x - (chunk_x - ring) * 16, (chunk_x + ring + 1) * 16 - x,
+                    z - (chunk_z - ring) * 16, (chunk_z + ring + 1) * 16 - z
+                )
+                if len(candidates) >= limit and heapq.nsmallest(limit, candidates, key=lambda pair: pair[1])[-1][1] <= bound:
+                    break
+        return heapq.nsmallest(limit, candidates, key=lambda pair: pair[1])
+
+    # Aggregations, snapshot totals are reduced in bulk and corrected by the overlay
+    def get_item_totals(self, dimension: Optional[str] = None) -> Dict[str, int]:
+        with self.__lock:
+            base = self.__visible_base
+            totals = {} if base is None else base.sum_by_item(dimension, self.__shadowed.values())
+            for pos, items in self.__containers.items():
+                if items is None or (dimension is not None and pos.dimension != dimension):
+                    continue
+                for item, count in items.items():
+                    totals[item] = totals.get(item, 0) + count
+            return totals
+
+    def get_dimension_totals(self, item_id: str) -> Dict[str, int]:
+        item_id = normalize_item_id(item_id)
+        with self.__lock:
+            base = self.__visible_base
+            totals = {} if base is None else base.sum_by_dimension(item_id, self.__shadowed.values())
+            for pos in self.__item_index.get(item_id, ()):
+                totals[pos.dimension] = totals.get(pos.dimension, 0) + self.__containers[pos].get(item_id)
+            return totals
+
+    def get_memory_usage(self) -> MemoryUsage:
+        """
+        Snapshot bytes are mapped from the file and shared with the page cache,
+        overlay bytes are measured by walking its structures
+        """
+        with self.__lock:
+            base = self.__base
+            return MemoryUsage(
+                snapshot_containers=0 if base is None else len(base),
+                snapshot_bytes=0 if base is None else base.size,
+                overlay_containers=len(self.__containers),
+                overlay_bytes=MiscTools.get_deep_size(self.__containers, self.__item_index, self.__chunks, self.__shadowed)
+            )
+
+    # Persistence
+    @staticmethod
+    def __iter_records(
+            base: Optional[StorageSnapshot], overlay: Dict[ContainerPos, Optional[ContainerRecord]]
+    ) -> Iterator[Tuple[ContainerPos, Union[Dict[str, int], ContainerRecord]]]:
+        if base is not None:
+            for pos, items in base.iter_containers():
+                if pos not in overlay.keys():
+                    yield pos, items
+        for pos, items in overlay.items():
+            if items is not None:
+                yield pos, items
+
+    def load(self) -> bool:
+        """
+        Map the snapshot file, nothing but its header is read here
+        """
+        file_path = self.file_path
+        if not os.path.isfile(file_path):
+            return False
+        try:
+            base = StorageSnapshot(file_path)
+        except Exception as e:
+            self.__inst.logger.warning('Failed to load storage index, starting with an empty index: {}'.format(e))
+            return False
+        with self.__lock:
+            self.__close_base()
+            self.__reset_overlay()
+            self.__base, self.__base_hidden = base, False
+            self.__size = len(base)
+        self.__inst.debug('Mapped {} containers from storage index'.format(len(self)))
+        return True
+
+    def __close_base(self):
+        if self.__base is not None:
+            self.__base.close()
+            self.__base = None
+
+    def close(self):
+        self.close_log()
+        with self.__lock:
+            self.__close_base()
+
+    @staticmethod
+    def __validate_snapshot(file_path: str, container_count: int):
+        snapshot = StorageSnapshot(file_path)
+        try:
+            if len(snapshot) != container_count:
+                raise SnapshotFormatError('Snapshot holds {} containers, {} were written'.format(len(snapshot), container_count))
+        finally:
+            snapshot.close()
+
+    def __swap_snapshot(self, temp_file_path: str) -> StorageSnapshot:
+        """
+        Replace the snapshot file and map it. Called with the lock held, the current snapshot is left usable on failure
+        """
+        try:
+            os.replace(temp_file_path, self.file_path)
+        except PermissionError:
+            if self.__base is None:
+                raise
+            # Mapped files cannot be replaced on Windows, the current one is closed and mapped again if that still fails
+            self.__base.close()
+            try:
+                os.replace(temp_file_path, self.file_path)
+            except Exception:
+                self.__base = StorageSnapshot(self.file_path)
+                raise
+        return StorageSnapshot(self.file_path)
+
+    def compact(self):
+        """
+        Write a new snapshot of the index, then drop the overlay entries and log records it contains.
+        Mutations are only blocked while capturing the overlay and while swapping the snapshot
+        """
+        with self.__compaction_lock:
+            with self.__lock:
+                if self.__wal is not None:
+                    self.__wal.rotate()
+                # Only compaction closes the snapshot, so it can be read outside the lock.
+                # Content dicts are replaced rather than mutated, a shallow copy of the overlay stays consistent
+                base = self.__visible_base
+                overlay = self.__containers.copy()
+                generation = self.__clear_generation
+            temp_file_path = self.file_path + '.tmp'
+            try:
+                FileUtils.ensure_dir(os.path.dirname(self.file_path))
+                records = list(self.__iter_records(base, overlay))
+                StorageSnapshot.write(temp_file_path, records)
+                self.__validate_snapshot(temp_file_path, len(records))
+                del records
+                with self.__lock:
+                    # Nothing is changed before the new snapshot is in place and mapped
+                    new_base = self.__swap_snapshot(temp_file_path)
+                    if self.__base is not None:
+                        self.__base.close()
+                    self.__base = new_base
+                    self.__shadowed.clear()
+                    if generation == self.__clear_generation:
+                        self.__base_hidden = False
+                        for pos, items in overlay.items():
+                            current = self.__containers.get(pos, False)
+                            if current is items:
+                                self.__unlink(pos)
+                                self.__containers.pop(pos, None)
+                            elif current is False and items is not None:
+                                # Removed meanwhile without a tombstone, but written into the new snapshot
+                                self.__containers[pos] = None
+                        for pos in self.__containers.keys():
+                            self.__shadow(pos)
+            except Exception:
+                # The previous snapshot and overlay stay in use, the rotated log is kept and replayed on next load
+                FileUtils.delete(temp_file_path)
+                raise
+            if self.__wal is not None:
+                self.__wal.discard_rotated()
+            self.__inst.debug('Compacted storage index with {} containers'.format(len(self.__base)))
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import marshal
+import os
+import threading
+from typing import Callable, Dict, Optional
+
+from my_plugin.utils.bundled_resources import BundledResources
+
+
+ITEM_NAME_FOLDER = 'item_names'
+BUNDLED_ITEM_NAME_FOLDER = 'resources/item_names'
+# Compiled tables, <language>.marshal holding (format version, source digest, names)
+ITEM_NAME_CACHE_FOLDER = os.path.join(ITEM_NAME_FOLDER, 'cache')
+ITEM_NAME_CACHE_VERSION = 1
+# Translation keys of vanilla language files, e.g. item.minecraft.diamond, block.minecraft.oak_log
+ITEM_NAME_KEY_TYPES = ('item', 'block')
+
+
+def get_item_name_file_path(data_folder: str, language: str) -> str:
+    return os.path.join(data_folder, ITEM_NAME_FOLDER, language + '.json')
+
+
+def parse_item_names(lang_data: Dict[str, str]) -> Dict[str, str]:
+    """
+    Extract item id -> display name from a Minecraft language file,
+    keys of block and item variants (e.g. block.minecraft.banner.base.black) are skipped
+    """
+    names = {}
+    for key, name in lang_data.items():
+        parts = key.split('.')
+        if len(parts) != 3 or parts[0] not in ITEM_NAME_KEY_TYPES or not isinstance(name, str):
+            continue
+        item_id = '{}:{}'.format(parts[1], parts[2])
+        # Item names win over block names when both exist
+        if parts[0] == 'item' or item_id not in names:
+            names[item_id] = name
+    return names
+
+
+def get_item_name_cache_path(data_folder: str, language: str) -> str:
+    return os.path.join(data_folder, ITEM_NAME_CACHE_FOLDER, language + '.marshal')
+
+
+def read_item_name_source(data_folder: str, language: str, bundled: Optional[BundledResources] = None) -> Optional[bytes]:
+    """
+    A file in the item_names data folder overrides the one bundled in resources/item_names
+    """
+    file_path = get_item_name_file_path(data_folder, language)
+    if os.path.isfile(file_path):
+        with open(file_path, 'rb') as f:
+            return f.read()
+    bundled_path = '{}/{}.json'.format(BUNDLED_ITEM_NAME_FOLDER, language)
+    if bundled is not None and bundled.exists(bundled_path):
+        return bundled.read(bundled_path)
+    return None
+
+
+def read_item_name_cache(cache_path: str, digest: str) -> Optional[Dict[str, str]]:
+    try:
+        with open(cache_path, 'rb') as f:
+            version, cached_digest, names = marshal.loads(f.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if version != ITEM_NAME_CACHE_VERSION or cached_digest != digest or not isinstance(names, dict):
+        return None
+    return names
+
+
+def write_item_name_cache(cache_path: str, digest: str, names: Dict[str, str]):
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    temp_file_path = cache_path + '.tmp'
+    with open(temp_file_path, 'wb') as f:
+        marshal.dump((ITEM_NAME_CACHE_VERSION, digest, names), f)
+    os.replace(temp_file_path, cache_path)
+
+
+def load_item_names(data_folder: str, language: str, bundled: Optional[BundledResources] = None) -> Dict[str, str]:
+    """
+    Item display names of a language, read from a vanilla language file (assets/minecraft/lang/<language>.json)
+    placed in the item_names folder or bundled with the plugin.
+    The extracted table is compiled into the cache folder, keyed on the source digest, and read from there
+    until the source changes
+    """
+    source = read_item_name_source(data_folder, language, bundled)
+    if source is None:
+        return {}
+    digest = hashlib.sha256(source).hexdigest()
+    cache_path = get_item_name_cache_path(data_folder, language)
+    names = read_item_name_cache(cache_path, digest)
+    if names is None:
+        names = parse_item_names(json.loads(source))
+        try:
+            write_item_name_cache(cache_path, digest, names)
+        except OSError:
+            # Still usable, compiled again on next load
+            pass
+    return names
+
+
+class ItemNameTables:
+    """
+    Item names per language, each language is loaded on its first lookup and kept
+    """
+
+    def __init__(self, data_folder: str, bundled_getter: Callable[[], Optional[BundledResources]] = lambda: None):
+        self.data_folder = data_folder
+        self.__bundled_getter = bundled_getter
+        self.__lock = threading.Lock()
+        self.__tables: Dict[str, Dict[str, str]] = {}
+
+    def get_table(self, language: str) -> Dict[str, str]:
+        table = self.__tables.get(language)
+        if table is None:
+            with self.__lock:
+                table = self.__tables.get(language)
+                if table is None:
+                    table = load_item_names(self.data_folder, language, self.__bundled_getter())
+                    self.__tables[language] = table
+        return table
@@ -0,0 +1,168 @@
+import heapq
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple, TYPE_CHECKING
+
+from my_plugin.storage.container import ContainerPos
+from my_plugin.storage.scanner import ContainerScanner, ScanOutcome
+from my_plugin.utils.misc import MiscTools
+
+if TYPE_CHECKING:
+    from my_plugin.my_plugin import MyPlugin
+
+
+class RescanState(NamedTuple):
+    last_scan: float
+    # Moving average of scans that found the content changed, 0 to 1
+    change_rate: float
+    due: float
+
+
+class RescanStats(NamedTuple):
+    tracked: int
+    due: int
+    sweep_chunks: int
+    requested: int
+
+
+class RescanScheduler:
+    """
+    Rescans indexed containers within a command budget, the most overdue first.
+    Containers scanned this session are kept in a heap by due time, the rescan interval shrinks from max_interval
+    towards min_interval the more often a container was seen changed.
+    Containers never scanned this session are the stalest, they are swept chunk by chunk whenever nothing is due
+    """
+    # Weight of the latest scan in the change rate
+    CHANGE_RATE_WEIGHT = 0.3
+    INITIAL_CHANGE_RATE = 0.5
+
+    def __init__(
+            self,
+            plugin_inst: "MyPlugin",
+            scanner: ContainerScanner,
+            commands_per_second: float = 2.0,
+            min_interval: float = 300.0,
+            max_interval: float = 21600.0,
+            max_scanner_backlog: int = 256
+    ):
+        self.__inst = plugin_inst
+        self.__scanner = scanner
+        self.__lock = threading.Lock()
+        self.__states: Dict[ContainerPos, RescanState] = {}
+        # (due, position), entries outdated by a later scan are skipped when popped
+        self.__heap: List[Tuple[float, ContainerPos]] = []
+        self.__sweep_chunks: List[Tuple[str, int, int]] = []
+        self.__sweep_positions: List[ContainerPos] = []
+        self.__sweep_restart_at = 0.0
+        self.__requested = 0
+        self.__stop_event = threading.Event()
+        self.__thread: Optional[threading.Thread] = None
+        self.configure(commands_per_second, min_interval, max_interval, max_scanner_backlog)
+        scanner.add_result_listener(self.on_scanned)
+
+    @property
+    def is_running(self) -> bool:
+        return self.__thread is not None
+
+    def configure(self, commands_per_second: float, min_interval: float, max_interval: float, max_scanner_backlog: int):
+        """
+        Containers already tracked keep their due time until scanned again
+        """
+        with self.__lock:
+            self.__interval = 1 / max(0.01, commands_per_second)
+            self.__min_interval = min_interval
+            self.__max_interval = max(min_interval, max_interval)
+            self.__max_scanner_backlog = max_scanner_backlog
+
+    def get_interval(self, change_rate: float) -> float:
+        return self.__max_interval - (self.__max_interval - self.__min_interval) * change_rate
+
+    def on_scanned(self, pos: ContainerPos, outcome: ScanOutcome):
+        now = time.monotonic()
+        with self.__lock:
+            if outcome == ScanOutcome.REMOVED:
+                self.__states.pop(pos, None)
+                return
+            state = self.__states.get(pos)
+            change_rate = self.INITIAL_CHANGE_RATE if state is None else state.change_rate
+            if outcome == ScanOutcome.FAILED:
+                # Likely unloaded, try again after the shortest interval
+                due = now + self.__min_interval
+            else:
+                observed = 1 if outcome == ScanOutcome.CHANGED else 0
+                change_rate += (observed - change_rate) * self.CHANGE_RATE_WEIGHT
+                due = now + self.get_interval(change_rate)
+            self.__states[pos] = RescanState(now, change_rate, due)
+            heapq.heappush(self.__heap, (due, pos))
+
+    def get_stats(self) -> RescanStats:
+        now = time.monotonic()
+        with self.__lock:
+            return RescanStats(
+                tracked=len(self.__states),
+                due=sum(1 for state in self.__states.values() if state.due <= now),
+                sweep_chunks=len(self.__sweep_chunks),
+                requested=self.__requested
+            )
+
+    def start(self):
+        if self.is_running:
+            return
+        self.__stop_event.clear()
+        self.__thread = self.__schedule_loop()
+
+    def stop(self, timeout: Optional[float] = None):
+        self.__stop_event.set()
+        thread, self.__thread = self.__thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def __pop_due(self, now: float) -> Optional[ContainerPos]:
+        # Called with the lock held
+        heap = self.__heap
+        while len(heap) > 0 and heap[0][0] <= now:
+            due, pos = heapq.heappop(heap)
+            state = self.__states.get(pos)
+            if state is not None and state.due == due:
+                return pos
+        return None
+
+    def __pop_sweep(self, now: float) -> Optional[ContainerPos]:
+        # Called with the lock held
+        while len(self.__sweep_positions) == 0:
+            if len(self.__sweep_chunks) == 0:
+                if now < self.__sweep_restart_at:
+                    return None
+                # Picks up containers indexed by other means since the last sweep
+                self.__sweep_restart_at = now + self.__max_interval
+                self.__sweep_chunks = self.__inst.storage_index.get_chunk_keys()
+                self.__sweep_chunks.reverse()
+                if len(self.__sweep_chunks) == 0:
+                    return None
+            positions = self.__inst.storage_index.get_containers_in_chunk(*self.__sweep_chunks.pop())
+            self.__sweep_positions = [pos for pos in positions if pos not in self.__states.keys()]
+        return self.__sweep_positions.pop()
+
+    def __next(self) -> Optional[ContainerPos]:
+        now = time.monotonic()
+        with self.__lock:
+            pos = self.__pop_due(now)
+            if pos is None:
+                pos = self.__pop_sweep(now)
+            if pos is not None:
+                self.__requested += 1
+            return pos
+
+    @MiscTools.named_thread('RescanScheduler')
+    def __schedule_loop(self):
+        while not self.__stop_event.is_set():
+            # Commands requested by players go first, leave the scanner alone while it is busy
+            if self.__scanner.pending >= self.__max_scanner_backlog:
+                self.__stop_event.wait(self.__interval)
+                continue
+            pos = self.__next()
+            if pos is None:
+                self.__stop_event.wait(max(self.__interval, 1.0))
+                continue
+            self.__scanner.request([pos])
+            self.__stop_event.wait(self.__interval)
@@ -0,0 +1,385 @@
+import enum
+import functools
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, TYPE_CHECKING
+
+from my_plugin.storage.container import ContainerPos, normalize_dimension
+from my_plugin.utils.misc import MiscTools
+
+if TYPE_CHECKING:
+    from my_plugin.my_plugin import MyPlugin
+
+
+class ScanOutcome(enum.IntEnum):
+    UNCHANGED = 1
+    CHANGED = 2
+    REMOVED = 3
+    FAILED = 4
+
+
+class ScanResult(NamedTuple):
+    """
+    Parsed reply of a scan command, items is None if the block is no longer a container
+    """
+    coordinates: Optional[Tuple[int, int, int]]
+    items: Optional[Dict[str, int]]
+
+
+class ScanMetrics(NamedTuple):
+    requested: int
+    coalesced: int
+    dropped: int
+    pending: int
+    commands: int
+    updated: int
+    removed: int
+    failed: int
+    batches: int
+    parse_seconds: float
+    apply_seconds: float
+    elapsed: float
+
+    @property
+    def commands_per_second(self) -> float:
+        return self.commands / self.elapsed if self.elapsed > 0 else 0
+
+    @property
+    def containers_per_second(self) -> float:
+        return (self.updated + self.removed) / self.elapsed if self.elapsed > 0 else 0
+
+    @property
+    def apply_seconds_per_batch(self) -> float:
+        return self.apply_seconds / self.batches if self.batches > 0 else 0
+
+
+class ScanReplyParser:
+    """
+    Streaming parser of `data get block <x> <y> <z> Items` replies.
+    The SNBT list is tokenized with one pattern instead of being parsed into a tree,
+    only id and count of top-level item compounds are picked up, so contents of nested shulker boxes are ignored
+    """
+    # Item compounds of the Items list are at depth 2, inside the list and the compound
+    ITEM_DEPTH = 2
+
+    class Patterns(NamedTuple):
+        data: re.Pattern
+        token: re.Pattern
+        not_container: re.Pattern
+        empty: re.Pattern
+        failure: re.Pattern
+
+    @classmethod
+    @functools.lru_cache(maxsize=None)
+    def get_patterns(cls) -> "ScanReplyParser.Patterns":
+        # Compiled on first use instead of on plugin load.
+        # Replies are matched as a whole, text merely containing a reply, e.g. a chat message, must not pass
+        return cls.Patterns(
+            data=re.compile(r'(-?\d+), (-?\d+), (-?\d+) has the following block data: (\[.*\])'),
+            token=re.compile(
+                r'\bid: "([^"]+)"'
+                r'|"(?:[^"\\]|\\.)*"'
+                r"|'(?:[^'\\]|\\.)*'"
+                r'|([{\[])'
+                r'|([}\]])'
+                r'|\b[Cc]ount: (\d+)'
+            ),
+            not_container=re.compile(r'The target block is not a block entity'),
+            empty=re.compile(r'Found no elements matching \S+'),
+            failure=re.compile(r'That position is (?:not loaded|out of (?:this|the) world!?)')
+        )
+
+    @classmethod
+    def iter_items(cls, snbt: str, start: int = 0) -> Iterator[Tuple[str, int]]:
+        depth = 0
+        item_id: Optional[str] = None
+        count: Optional[int] = None
+        for match in cls.get_patterns().token.finditer(snbt, start):
+            token_id, opening, closing, token_count = match.groups()
+            if opening is not None:
+                depth += 1
+                if depth == cls.ITEM_DEPTH:
+                    item_id, count = None, None
+            elif closing is not None:
+                if depth == cls.ITEM_DEPTH and item_id is not None:
+                    # Newer versions leave out a count of 1
+                    yield item_id, 1 if count is None else count
+                    item_id = None
+                depth -= 1
+                if depth <= 0:
+                    return
+            elif depth == cls.ITEM_DEPTH:
+                if token_id is not None:
+                    item_id = token_id
+                elif token_count is not None:
+                    count = int(token_count)
+
+    @classmethod
+    def parse(cls, reply: str) -> Optional[ScanResult]:
+        """
+        :return: None if the reply is not a scan reply, e.g. when the position is not loaded
+        """
+        patterns = cls.get_patterns()
+        reply = reply.strip()
+        match = patterns.data.fullmatch(reply)
+        if match is not None:
+            items: Dict[str, int] = {}
+            for item_id, count in cls.iter_items(reply, match.start(4)):
+                items[item_id] = items.get(item_id, 0) + count
+            return ScanResult((int(match.group(1)), int(match.group(2)), int(match.group(3))), items)
+        if patterns.not_container.fullmatch(reply) is not None:
+            return ScanResult(None, None)
+        if patterns.empty.fullmatch(reply) is not None:
+            return ScanResult(None, {})
+        return None
+
+    @classmethod
+    def is_failure(cls, reply: str) -> bool:
+        """
+        Whether the reply tells that the position could not be read
+        """
+        return cls.get_patterns().failure.fullmatch(reply.strip()) is not None
+
+
+class ContainerScanner:
+    """
+    Fills the storage index by querying container contents from the server.
+    Scan requests are coalesced per position in a bounded queue, commands are sent at a limited rate
+    through RCON if it is running, or the console otherwise, whose replies are fed back from server output.
+    Results of a batch are applied to the index in one transaction
+    """
+    COMMAND_FORMAT = 'execute in {dimension} run data get block {x} {y} {z} Items'
+
+    def __init__(
+            self,
+            plugin_inst: "MyPlugin",
+            commands_per_second: float = 20.0,
+            batch_size: int = 64,
+            max_pending: int = 4096,
+            reply_timeout: float = 5.0
+    ):
+        self.__inst = plugin_inst
+        self.__lock = threading.Lock()
+        self.__condition = threading.Condition(self.__lock)
+        self.configure(commands_per_second, batch_size, max_pending, reply_timeout)
+        # Insertion ordered, a position requested again keeps its place
+        self.__pending: Dict[ContainerPos, None] = {}
+        # Console replies awaited by the running batch, they carry no dimension
+        self.__awaiting: Dict[Tuple[int, int, int], ContainerPos] = {}
+        self.__replies: Dict[ContainerPos, ScanResult] = {}
+        self.__stopped = True
+        self.__thread: Optional[threading.Thread] = None
+        self.__next_command_at = 0.0
+        self.__counters: Dict[str, float] = dict.fromkeys(
+            ('requested', 'coalesced', 'dropped', 'commands', 'updated', 'removed', 'failed', 'batches', 'parse_seconds', 'apply_seconds'), 0
+        )
+        self.__started_at: Optional[float] = None
+        self.__result_listeners: List[Callable[[ContainerPos, ScanOutcome], Any]] = []
+
+    @property
+    def is_running(self) -> bool:
+        return self.__thread is not None
+
+    @property
+    def pending(self) -> int:
+        return len(self.__pending)
+
+    def configure(self, commands_per_second: float, batch_size: int, max_pending: int, reply_timeout: float):
+        """
+        Takes effect from the next batch, positions already queued beyond a lowered max_pending are kept
+        """
+        with self.__lock:
+            self.__interval = 1 / max(0.1, commands_per_second)
+            self.__batch_size = max(1, batch_size)
+            self.__max_pending = max(1, max_pending)
+            self.__reply_timeout = reply_timeout
+            self.__condition.notify_all()
+
+    def add_result_listener(self, callback: Callable[[ContainerPos, ScanOutcome], Any]):
+        """
+        Called on the scan thread for every position of an applied batch
+        """
+        self.__result_listeners.append(callback)
+
+    def __count(self, key: str, value: float = 1):
+        # Called with the lock held
+        self.__counters[key] += value
+
+    def request(self, positions: Iterable[ContainerPos]) -> int:
+        """
+        :return: Number of newly queued positions, already queued ones are coalesced and a full queue drops the rest
+        """
+        queued = 0
+        with self.__lock:
+            for pos in positions:
+                pos = pos._replace(dimension=normalize_dimension(pos.dimension))
+                self.__count('requested')
+                if pos in self.__pending.keys():
+                    self.__count('coalesced')
+                elif len(self.__pending) >= self.__max_pending:
+                    self.__count('dropped')
+                else:
+                    self.__pending[pos] = None
+                    queued += 1
+            if queued > 0:
+                self.__condition.notify_all()
+        return queued
+
+    def get_metrics(self) -> ScanMetrics:
+        with self.__lock:
+            counters = self.__counters
+            return ScanMetrics(
+                requested=int(counters['requested']),
+                coalesced=int(counters['coalesced']),
+                dropped=int(counters['dropped']),
+                pending=len(self.__pending),
+                commands=int(counters['commands']),
+                updated=int(counters['updated']),
+                removed=int(counters['removed']),
+                failed=int(counters['failed']),
+                batches=int(counters['batches']),
+                parse_seconds=counters['parse_seconds'],
+                apply_seconds=counters['apply_seconds'],
+                elapsed=0 if self.__started_at is None else time.monotonic() - self.__started_at
+            )
+
+    def start(self):
+        if self.is_running:
+            return
+        with self.__lock:
+            self.__stopped = False
+            self.__started_at = time.monotonic()
+        self.__thread = self.__scan_loop()
+
+    def stop(self, timeout: Optional[float] = None):
+        with self.__lock:
+            self.__stopped = True
+            self.__condition.notify_all()
+        thread, self.__thread = self.__thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def feed_output(self, line: str):
+        """
+        Pick up console replies of the running batch from a server output line
+        """
+        if len(self.__awaiting) == 0:
+            return
+        started_at = time.perf_counter()
+        result = ScanReplyParser.parse(line)
+        if result is None and not ScanReplyParser.is_failure(line):
+            return
+        with self.__lock:
+            self.__count('parse_seconds', time.perf_counter() - started_at)
+            if result is None or result.coordinates is None:
+                # Error replies carry no coordinates, console commands are answered in the order they are sent
+                coordinates = next(iter(self.__awaiting.keys()), None)
+            else:
+                coordinates = result.coordinates
+            pos = self.__awaiting.pop(coordinates, None)
+            if pos is not None and result is not None:
+                self.__replies[pos] = result
+            self.__condition.notify_all()
+
+    def __take_batch(self) -> List[ContainerPos]:
+        # Called with the lock held
+        batch, coordinates = [], set()
+        for pos in self.__pending.keys():
+            # Console replies of the same coordinates in different dimensions could not be told apart
+            if (pos.x, pos.y, pos.z) in coordinates:
+                continue
+            coordinates.add((pos.x, pos.y, pos.z))
+            batch.append(pos)
+            if len(batch) >= self.__batch_size:
+                break
+        for pos in batch:
+            del self.__pending[pos]
+        return batch
+
+    def __wait_rate_limit(self) -> bool:
+        # Called with the lock held
+        while not self.__stopped:
+            delay = self.__next_command_at - time.monotonic()
+            if delay <= 0:
+                self.__next_command_at = max(self.__next_command_at + self.__interval, time.monotonic())
+                return True
+            self.__condition.wait(delay)
+        return False
+
+    def __query(self, pos: ContainerPos) -> Optional[ScanResult]:
+        command = self.COMMAND_FORMAT.format(dimension=pos.dimension, x=pos.x, y=pos.y, z=pos.z)
+        reply = self.__inst.server.rcon_query(command)
+        if reply is None:
+            return None
+        started_at = time.perf_counter()
+        result = ScanReplyParser.parse(reply)
+        with self.__lock:
+            self.__count('parse_seconds', time.perf_counter() - started_at)
+        return result
+
+    def __scan(self, batch: List[ContainerPos]) -> Dict[ContainerPos, ScanResult]:
+        server = self.__inst.server
+        results: Dict[ContainerPos, ScanResult] = {}
+        use_rcon = server.is_rcon_running()
+        for pos in batch:
+            with self.__lock:
+                if not self.__wait_rate_limit():
+                    break
+                self.__count('commands')
+                if not use_rcon:
+                    self.__awaiting[(pos.x, pos.y, pos.z)] = pos
+            if use_rcon:
+                result = self.__query(pos)
+                if result is not None:
+                    results[pos] = result
+            else:
+                server.execute(self.COMMAND_FORMAT.format(dimension=pos.dimension, x=pos.x, y=pos.y, z=pos.z))
+        if not use_rcon:
+            deadline = time.monotonic() + self.__reply_timeout
+            with self.__lock:
+                while len(self.__awaiting) > 0 and not self.__stopped and time.monotonic() < deadline:
+                    self.__condition.wait(deadline - time.monotonic())
+                # Positions left unanswered are counted as failed
+                self.__awaiting.clear()
+                results, self.__replies = self.__replies, {}
+        return results
+
+    def __apply(self, batch: List[ContainerPos], results: Dict[ContainerPos, ScanResult]):
+        changes = {pos: result.items for pos, result in results.items()}
+        storage_index = self.__inst.storage_index
+        listeners = self.__result_listeners
+        previous = {pos: storage_index.get_container(pos) for pos in changes.keys()} if len(listeners) > 0 else {}
+        started_at = time.perf_counter()
+        storage_index.apply_changes(changes)
+        elapsed = time.perf_counter() - started_at
+        for pos in batch if len(listeners) > 0 else ():
+            if pos not in changes.keys():
+                outcome = ScanOutcome.FAILED
+            elif changes[pos] is None:
+                outcome = ScanOutcome.REMOVED
+            else:
+                outcome = ScanOutcome.UNCHANGED if previous[pos] == changes[pos] else ScanOutcome.CHANGED
+            for listener in listeners:
+                listener(pos, outcome)
+        with self.__lock:
+            self.__count('batches')
+            self.__count('apply_seconds', elapsed)
+            self.__count('updated', sum(1 for items in changes.values() if items is not None))
+            self.__count('removed', sum(1 for items in changes.values() if items is None))
+            self.__count('failed', len(batch) - len(changes))
+
+    @MiscTools.named_thread('ContainerScan')
+    def __scan_loop(self):
+        while True:
+            with self.__lock:
+                while len(self.__pending) == 0 and not self.__stopped:
+                    self.__condition.wait()
+                if self.__stopped:
+                    return
+                if not self.__inst.server.is_server_startup():
+                    # Nothing would answer, keep the requests for later
+                    self.__condition.wait(self.__reply_timeout)
+                    continue
+                batch = self.__take_batch()
+            self.__apply(batch, self.__scan(batch))
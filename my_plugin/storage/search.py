@@ -0,0 +1,180 @@
+import bisect
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from my_plugin.storage.container import DEFAULT_NAMESPACE, normalize_item_id
+
+
+class ItemSearchIndex:
+    """
+    Prefix and fuzzy search over item ids and their localized display names.
+    Search terms are kept in one sorted list, the flattened form of a trie: the terms starting with a prefix
+    form a contiguous range found by bisection.
+    Fuzzy matches are ranked by trigram overlap, the namespace of ids is left out of trigrams
+    since every vanilla id shares it
+    """
+    NGRAM_SIZE = 3
+    FUZZY_THRESHOLD = 0.3
+    __DEFAULT_PREFIX = DEFAULT_NAMESPACE + ':'
+
+    def __init__(self):
+        self.__lock = threading.RLock()
+        self.__terms: List[str] = []
+        self.__term_items: Dict[str, Set[str]] = {}
+        self.__item_terms: Dict[str, Set[str]] = {}
+        self.__ngrams: Dict[str, Set[str]] = {}
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return ' '.join(text.lower().split())
+
+    @classmethod
+    def get_ngrams(cls, term: str) -> Set[str]:
+        if term.startswith(cls.__DEFAULT_PREFIX):
+            term = term[len(cls.__DEFAULT_PREFIX):]
+        padded = '^' + term + '$'
+        return {padded[i:i + cls.NGRAM_SIZE] for i in range(len(padded) - cls.NGRAM_SIZE + 1)}
+
+    @staticmethod
+    def get_id_terms(item_id: str) -> Tuple[str, ...]:
+        namespace, _, path = item_id.partition(':')
+        return (item_id, path) if path else (item_id,)
+
+    def __len__(self) -> int:
+        return len(self.__item_terms)
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self.__item_terms
+
+    def __add_term(self, term: str, item_id: str, insort: bool):
+        items = self.__term_items.get(term)
+        if items is None:
+            items = self.__term_items[term] = set()
+            if insort:
+                bisect.insort(self.__terms, term)
+            else:
+                self.__terms.append(term)
+            for gram in self.get_ngrams(term):
+                self.__ngrams.setdefault(gram, set()).add(term)
+        items.add(item_id)
+        self.__item_terms.setdefault(item_id, set()).add(term)
+
+    def add_item(self, item_id: str, names: Iterable[str] = ()):
+        """
+        Add an item and its display names, known items only get the new names
+        """
+        item_id = normalize_item_id(item_id)
+        with self.__lock:
+            for term in self.get_id_terms(item_id):
+                self.__add_term(term, item_id, True)
+            for name in names:
+                name = self.normalize(name)
+                if len(name) > 0:
+                    self.__add_term(name, item_id, True)
+
+    def add_items(self, items: Dict[str, Iterable[str]]):
+        """
+        Bulk variant of add_item, sorts the term list once
+        """
+        with self.__lock:
+            for item_id, names in items.items():
+                item_id = normalize_item_id(item_id)
+                for term in self.get_id_terms(item_id):
+                    self.__add_term(term, item_id, False)
+                for name in names:
+                    name = self.normalize(name)
+                    if len(name) > 0:
+                        self.__add_term(name, item_id, False)
+            self.__terms.sort()
+
+    def remove_item(self, item_id: str):
+        item_id = normalize_item_id(item_id)
+        with self.__lock:
+            for term in self.__item_terms.pop(item_id, ()):
+                items = self.__term_items[term]
+                items.discard(item_id)
+                if len(items) > 0:
+                    continue
+                del self.__term_items[term]
+                del self.__terms[bisect.bisect_left(self.__terms, term)]
+                for gram in self.get_ngrams(term):
+                    grams = self.__ngrams[gram]
+                    grams.discard(term)
+                    if len(grams) == 0:
+                        del self.__ngrams[gram]
+
+    def prefix_search(self, query: str, limit: int = 20) -> List[Tuple[str, str]]:
+        """
+        :return: (matched term, item id) pairs in term order
+        """
+        query = self.normalize(query)
+        result = []
+        with self.__lock:
+            terms = self.__terms
+            index = bisect.bisect_left(terms, query)
+            while index < len(terms) and len(result) < limit and terms[index].startswith(query):
+                term = terms[index]
+                for item_id in sorted(self.__term_items[term]):
+                    result.append((term, item_id))
+                index += 1
+        return result[:limit]
+
+    def fuzzy_search(self, query: str, limit: int = 20) -> List[Tuple[str, float]]:
+        """
+        :return: (item id, score) pairs, best first
+        """
+        query_grams = self.get_ngrams(self.normalize(query))
+        if len(query_grams) == 0:
+            return []
+        with self.__lock:
+            overlaps: Dict[str, int] = {}
+            for gram in query_grams:
+                for term in self.__ngrams.get(gram, ()):
+                    overlaps[term] = overlaps.get(term, 0) + 1
+            best: Dict[str, float] = {}
+            for term, overlap in overlaps.items():
+                # Distinct trigram count of a term is at most its padded length - 2
+                term_size = len(term) - (len(self.__DEFAULT_PREFIX) if term.startswith(self.__DEFAULT_PREFIX) else 0)
+                score = overlap / (len(query_grams) + term_size - overlap)
+                if score < self.FUZZY_THRESHOLD:
+                    continue
+                for item_id in self.__term_items[term]:
+                    if score > best.get(item_id, 0):
+                        best[item_id] = score
+        return sorted(best.items(), key=lambda pair: (-pair[1], pair[0]))[:limit]
+
+    def search(self, query: str, limit: int = 20) -> List[str]:
+        """
+        Item ids matching the query, prefix matches first
+        """
+        result = list(dict.fromkeys(item_id for _, item_id in self.prefix_search(query, limit)))
+        if len(result) < limit:
+            seen = set(result)
+            for item_id, _ in self.fuzzy_search(query, limit):
+                if item_id not in seen:
+                    result.append(item_id)
+        return result[:limit]
+
+    def suggest(self, query: str, limit: int = 20) -> List[str]:
+        """
+        Command suggestions: matched terms of prefix matches so they still start with the input,
+        then ids of fuzzy matches
+        """
+        result = list(dict.fromkeys(term for term, _ in self.prefix_search(query, limit)))
+        if len(result) < limit:
+            for item_id, _ in self.fuzzy_search(query, limit - len(result)):
+                if item_id not in result:
+                    result.append(item_id)
+        return result
+
+    def resolve(self, query: str) -> Optional[str]:
+        """
+        Item id a query exactly names, by id, id path or display name
+        """
+        term = self.normalize(query)
+        with self.__lock:
+            items = self.__term_items.get(term)
+            if not items:
+                return None
+            item_id = normalize_item_id(term)
+            return item_id if item_id in items else min(items)
@@ -0,0 +1,382 @@
+import mmap
+import os
+import struct
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from my_plugin.storage.container import ContainerPos
+
+try:
+    import numpy as np
+except ImportError:
+    # Optional, aggregations fall back to plain loops over the mapped tables
+    np = None
+
+
+class SnapshotFormatError(ValueError):
+    pass
+
+
+class StorageSnapshot:
+    """
+    Read-only, memory-mapped binary snapshot of the storage index.
+    Every table has a fixed record layout and is sorted by its key, lookups are binary searches over the mapping,
+    so opening costs O(1) and only the queried records are materialized as Python objects
+
+    Layout, all little-endian, sections in this order right after the header:
+    - string offsets: (strings + 1) * u32, offsets into the string blob, strings sorted by their utf-8 bytes
+    - containers: dimension u32, x i32, y i32, z i32, entry start u32, entry count u32,
+      sorted by (dimension, chunk x, chunk z, x, y, z) so that every chunk is a contiguous range
+    - entries: item u32, count i64
+    - items: item u32, holder start u32, holder count u32, sorted by item
+    - holders: container index u32, count i64
+    - chunks: dimension u32, chunk x i32, chunk z i32, container start u32, container count u32, sorted by key
+    - string blob
+    """
+    MAGIC = b'SISN'
+    FORMAT_VERSION = 1
+    __HEADER = struct.Struct('<4sIIIIIII')
+    __OFFSET = struct.Struct('<I')
+    __CONTAINER = struct.Struct('<IiiiII')
+    __ENTRY = struct.Struct('<Iq')
+    __ITEM = struct.Struct('<III')
+    __HOLDER = struct.Struct('<Iq')
+    __CHUNK = struct.Struct('<IiiII')
+    # Unaligned numpy views of the container, entry and holder tables
+    __CONTAINER_DTYPE = [('dimension', '<u4'), ('x', '<i4'), ('y', '<i4'), ('z', '<i4'), ('start', '<u4'), ('count', '<u4')]
+    __ENTRY_DTYPE = [('item', '<u4'), ('count', '<i8')]
+    __HOLDER_DTYPE = [('container', '<u4'), ('count', '<i8')]
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.__file = open(file_path, 'rb')
+        try:
+            self.__buffer = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self.__file.close()
+            raise
+        try:
+            self.__read_header()
+        except Exception:
+            self.close()
+            raise
+        self.__dimension_ids: Dict[str, Optional[int]] = {}
+        self.__dimension_names: Dict[int, str] = {}
+        self.__columns: Optional[tuple] = None
+
+    def __read_header(self):
+        if len(self.__buffer) < self.__HEADER.size:
+            raise SnapshotFormatError('Truncated snapshot header')
+        magic, version, strings, containers, entries, items, holders, chunks = self.__HEADER.unpack_from(self.__buffer, 0)
+        if magic != self.MAGIC:
+            raise SnapshotFormatError('Not a storage index snapshot')
+        if version != self.FORMAT_VERSION:
+            raise SnapshotFormatError('Unsupported snapshot version {}'.format(version))
+        self.__string_count, self.__container_count, self.__item_count, self.__chunk_count = strings, containers, items, chunks
+        self.__entry_count, self.__holder_count = entries, holders
+        self.__offsets_at = self.__HEADER.size
+        self.__containers_at = self.__offsets_at + (strings + 1) * self.__OFFSET.size
+        self.__entries_at = self.__containers_at + containers * self.__CONTAINER.size
+        self.__items_at = self.__entries_at + entries * self.__ENTRY.size
+        self.__holders_at = self.__items_at + items * self.__ITEM.size
+        self.__chunks_at = self.__holders_at + holders * self.__HOLDER.size
+        self.__blob_at = self.__chunks_at + chunks * self.__CHUNK.size
+        if len(self.__buffer) < self.__blob_at or len(self.__buffer) < self.__blob_at + self.__get_offset(strings):
+            raise SnapshotFormatError('Truncated snapshot')
+
+    def close(self):
+        # Views exported to numpy have to be gone before the mapping can be closed
+        self.__columns = None
+        self.__buffer.close()
+        self.__file.close()
+
+    def __len__(self) -> int:
+        return self.__container_count
+
+    @property
+    def size(self) -> int:
+        return len(self.__buffer)
+
+    @property
+    def item_count(self) -> int:
+        return self.__item_count
+
+    # Strings
+    def __get_offset(self, index: int) -> int:
+        return self.__OFFSET.unpack_from(self.__buffer, self.__offsets_at + index * self.__OFFSET.size)[0]
+
+    def __get_string_bytes(self, string_id: int) -> bytes:
+        return self.__buffer[self.__blob_at + self.__get_offset(string_id):self.__blob_at + self.__get_offset(string_id + 1)]
+
+    def __get_string(self, string_id: int) -> str:
+        return self.__get_string_bytes(string_id).decode('utf8')
+
+    def __find_string(self, text: str) -> Optional[int]:
+        target = text.encode('utf8')
+        low, high = 0, self.__string_count
+        while low < high:
+            mid = (low + high) // 2
+            if self.__get_string_bytes(mid) < target:
+                low = mid + 1
+            else:
+                high = mid
+        if low < self.__string_count and self.__get_string_bytes(low) == target:
+            return low
+        return None
+
+    def __find_dimension(self, dimension: str) -> Optional[int]:
+        if dimension not in self.__dimension_ids:
+            self.__dimension_ids[dimension] = self.__find_string(dimension)
+        return self.__dimension_ids[dimension]
+
+    # Containers
+    def __get_container(self, index: int) -> Tuple[int, int, int, int, int, int]:
+        return self.__CONTAINER.unpack_from(self.__buffer, self.__containers_at + index * self.__CONTAINER.size)
+
+    def __get_dimension(self, dimension_id: int) -> str:
+        # Only a handful of dimensions exist, keep their names decoded
+        dimension = self.__dimension_names.get(dimension_id)
+        if dimension is None:
+            dimension = self.__dimension_names[dimension_id] = self.__get_string(dimension_id)
+        return dimension
+
+    def __to_pos(self, record: Tuple[int, ...]) -> ContainerPos:
+        return ContainerPos(self.__get_dimension(record[0]), record[1], record[2], record[3])
+
+    def find_container_index(self, pos: ContainerPos) -> Optional[int]:
+        dimension_id = self.__find_dimension(pos.dimension)
+        if dimension_id is None:
+            return None
+        target = (dimension_id, pos.x >> 4, pos.z >> 4, pos.x, pos.y, pos.z)
+        low, high = 0, self.__container_count
+        while low < high:
+            mid = (low + high) // 2
+            record = self.__get_container(mid)
+            key = (record[0], record[1] >> 4, record[3] >> 4, record[1], record[2], record[3])
+            if key == target:
+                return mid
+            if key < target:
+                low = mid + 1
+            else:
+                high = mid
+        return None
+
+    def __find_container(self, pos: ContainerPos) -> Optional[Tuple[int, ...]]:
+        index = self.find_container_index(pos)
+        return None if index is None else self.__get_container(index)
+
+    def __read_entries(self, start: int, count: int) -> Dict[str, int]:
+        at = self.__entries_at + start * self.__ENTRY.size
+        view = memoryview(self.__buffer)[at:at + count * self.__ENTRY.size]
+        try:
+            return {self.__get_string(item_id): amount for item_id, amount in self.__ENTRY.iter_unpack(view)}
+        finally:
+            view.release()
+
+    def get_container(self, pos: ContainerPos) -> Optional[Dict[str, int]]:
+        record = self.__find_container(pos)
+        return None if record is None else self.__read_entries(record[4], record[5])
+
+    def iter_containers(self) -> Iterator[Tuple[ContainerPos, Dict[str, int]]]:
+        for index in range(self.__container_count):
+            record = self.__get_container(index)
+            yield self.__to_pos(record), self.__read_entries(record[4], record[5])
+
+    # Items
+    def __find_item(self, item_id: str) -> Optional[Tuple[int, int, int]]:
+        string_id = self.__find_string(item_id)
+        if string_id is None:
+            return None
+        low, high = 0, self.__item_count
+        while low < high:
+            mid = (low + high) // 2
+            record = self.__ITEM.unpack_from(self.__buffer, self.__items_at + mid * self.__ITEM.size)
+            if record[0] == string_id:
+                return record
+            if record[0] < string_id:
+                low = mid + 1
+            else:
+                high = mid
+        return None
+
+    def iter_item_holders(self, item_id: str) -> Iterator[Tuple[ContainerPos, int]]:
+        record = self.__find_item(item_id)
+        if record is None:
+            return
+        at = self.__holders_at + record[1] * self.__HOLDER.size
+        get_container, to_pos = self.__get_container, self.__to_pos
+        for container_index, count in self.__HOLDER.iter_unpack(self.__buffer[at:at + record[2] * self.__HOLDER.size]):
+            yield to_pos(get_container(container_index)), count
+
+    def iter_item_ids(self) -> Iterator[str]:
+        for index in range(self.__item_count):
+            yield self.__get_string(self.__ITEM.unpack_from(self.__buffer, self.__items_at + index * self.__ITEM.size)[0])
+
+    # Chunks
+    def iter_chunk(self, dimension: str, chunk_x: int, chunk_z: int) -> Iterator[ContainerPos]:
+        dimension_id = self.__find_dimension(dimension)
+        if dimension_id is None:
+            return
+        target = (dimension_id, chunk_x, chunk_z)
+        low, high = 0, self.__chunk_count
+        while low < high:
+            mid = (low + high) // 2
+            record = self.__CHUNK.unpack_from(self.__buffer, self.__chunks_at + mid * self.__CHUNK.size)
+            key = record[:3]
+            if key == target:
+                for index in range(record[3], record[3] + record[4]):
+                    yield self.__to_pos(self.__get_container(index))
+                return
+            if key < target:
+                low = mid + 1
+            else:
+                high = mid
+
+    def iter_chunk_keys(self) -> Iterator[Tuple[str, int, int]]:
+        """
+        (dimension, chunk x, chunk z) of every chunk holding containers, in key order
+        """
+        for index in range(self.__chunk_count):
+            dimension_id, chunk_x, chunk_z, _, _ = self.__CHUNK.unpack_from(self.__buffer, self.__chunks_at + index * self.__CHUNK.size)
+            yield self.__get_dimension(dimension_id), chunk_x, chunk_z
+
+    # Aggregations
+    def __get_columns(self) -> tuple:
+        """
+        Container table, entry table and the container index of every entry as numpy arrays,
+        the tables are views of the mapping so only the last one is allocated
+        """
+        if self.__columns is None:
+            containers = np.frombuffer(
+                self.__buffer, dtype=self.__CONTAINER_DTYPE, count=self.__container_count, offset=self.__containers_at
+            )
+            entries = np.frombuffer(self.__buffer, dtype=self.__ENTRY_DTYPE, count=self.__entry_count, offset=self.__entries_at)
+            entry_containers = np.repeat(np.arange(self.__container_count, dtype=np.int64), containers['count'])
+            self.__columns = containers, entries, entry_containers
+        return self.__columns
+
+    def __to_totals(self, totals: Dict[int, int]) -> Dict[str, int]:
+        return {self.__get_string(string_id): count for string_id, count in totals.items() if count != 0}
+
+    def sum_by_item(self, dimension: Optional[str] = None, excluded: Iterable[int] = ()) -> Dict[str, int]:
+        """
+        Total count of each item, optionally within a dimension
+        :param excluded: Indexes of containers to leave out
+        """
+        dimension_id = None
+        if dimension is not None:
+            dimension_id = self.__find_dimension(dimension)
+            if dimension_id is None:
+                return {}
+        if self.__entry_count == 0:
+            return {}
+        excluded = list(excluded)
+        if np is not None:
+            containers, entries, entry_containers = self.__get_columns()
+            items, counts = entries['item'], entries['count']
+            if dimension_id is not None or len(excluded) > 0:
+                if dimension_id is not None:
+                    container_mask = containers['dimension'] == dimension_id
+                else:
+                    container_mask = np.ones(self.__container_count, dtype=bool)
+                container_mask[excluded] = False
+                entry_mask = container_mask[entry_containers]
+                items, counts = items[entry_mask], counts[entry_mask]
+            # Weights are summed as float64, exact for totals below 2 ** 53
+            totals = np.bincount(items, weights=counts, minlength=self.__string_count)
+            return {self.__get_string(int(string_id)): int(totals[string_id]) for string_id in np.flatnonzero(totals)}
+
+        totals: Dict[int, int] = {}
+        excluded = set(excluded)
+        view = memoryview(self.__buffer)
+        try:
+            containers = view[self.__containers_at:self.__containers_at + self.__container_count * self.__CONTAINER.size]
+            for index, (container_dimension, _, _, _, start, count) in enumerate(self.__CONTAINER.iter_unpack(containers)):
+                if index in excluded or (dimension_id is not None and container_dimension != dimension_id):
+                    continue
+                at = self.__entries_at + start * self.__ENTRY.size
+                for item_id, amount in self.__ENTRY.iter_unpack(view[at:at + count * self.__ENTRY.size]):
+                    totals[item_id] = totals.get(item_id, 0) + amount
+        finally:
+            view.release()
+        return self.__to_totals(totals)
+
+    def sum_by_dimension(self, item_id: str, excluded: Iterable[int] = ()) -> Dict[str, int]:
+        """
+        Total count of an item in each dimension
+        :param excluded: Indexes of containers to leave out
+        """
+        record = self.__find_item(item_id)
+        if record is None:
+            return {}
+        at = self.__holders_at + record[1] * self.__HOLDER.size
+        excluded = set(excluded)
+        if np is not None:
+            containers = self.__get_columns()[0]
+            holders = np.frombuffer(self.__buffer, dtype=self.__HOLDER_DTYPE, count=record[2], offset=at)
+            indexes, counts = holders['container'], holders['count']
+            if len(excluded) > 0:
+                keep = ~np.isin(indexes, np.fromiter(excluded, dtype=np.int64, count=len(excluded)))
+                indexes, counts = indexes[keep], counts[keep]
+            totals = np.bincount(containers['dimension'][indexes], weights=counts, minlength=self.__string_count)
+            return {self.__get_string(int(string_id)): int(totals[string_id]) for string_id in np.flatnonzero(totals)}
+
+        totals: Dict[int, int] = {}
+        for container_index, count in self.__HOLDER.iter_unpack(self.__buffer[at:at + record[2] * self.__HOLDER.size]):
+            if container_index not in excluded:
+                dimension_id = self.__get_container(container_index)[0]
+                totals[dimension_id] = totals.get(dimension_id, 0) + count
+        return self.__to_totals(totals)
+
+    # Writing
+    @classmethod
+    def write(cls, file_path: str, records: Iterable[Tuple[ContainerPos, Dict[str, int]]]):
+        """
+        Write records as a snapshot and fsync it. Positions must be unique,
+        callers write to a temporary path and replace the snapshot once no mapping of it is open
+        """
+        records = sorted(records, key=lambda r: (r[0].dimension, r[0].x >> 4, r[0].z >> 4, r[0].x, r[0].y, r[0].z))
+        strings = set()
+        for pos, items in records:
+            strings.add(pos.dimension)
+            strings.update(items.keys())
+        encoded_strings = sorted(s.encode('utf8') for s in strings)
+        string_ids = {s.decode('utf8'): i for i, s in enumerate(encoded_strings)}
+
+        offsets: List[int] = [0]
+        for data in encoded_strings:
+            offsets.append(offsets[-1] + len(data))
+
+        containers, entries, chunks = [], [], []
+        holders: Dict[int, List[Tuple[int, int]]] = {}
+        last_chunk = None
+        for index, (pos, items) in enumerate(records):
+            dimension_id = string_ids[pos.dimension]
+            containers.append(cls.__CONTAINER.pack(dimension_id, pos.x, pos.y, pos.z, len(entries), len(items)))
+            for item, count in items.items():
+                item_id = string_ids[item]
+                entries.append(cls.__ENTRY.pack(item_id, count))
+                holders.setdefault(item_id, []).append((index, count))
+            chunk = (dimension_id, pos.x >> 4, pos.z >> 4)
+            if chunk != last_chunk:
+                chunks.append([*chunk, index, 0])
+                last_chunk = chunk
+            chunks[-1][4] += 1
+
+        item_records, holder_records = [], []
+        for item_id in sorted(holders.keys()):
+            item_holders = holders[item_id]
+            item_records.append(cls.__ITEM.pack(item_id, len(holder_records), len(item_holders)))
+            holder_records.extend(cls.__HOLDER.pack(index, count) for index, count in item_holders)
+
+        with open(file_path, 'wb') as f:
+            f.write(cls.__HEADER.pack(
+                cls.MAGIC, cls.FORMAT_VERSION, len(encoded_strings), len(containers), len(entries),
+                len(item_records), len(holder_records), len(chunks)
+            ))
+            f.write(struct.pack('<{}I'.format(len(offsets)), *offsets))
+            for section in (containers, entries, item_records, holder_records):
+                f.write(b''.join(section))
+            f.write(b''.join(cls.__CHUNK.pack(*chunk) for chunk in chunks))
+            f.write(b''.join(encoded_strings))
+            f.flush()
+            os.fsync(f.fileno())
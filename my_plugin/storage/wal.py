@@ -0,0 +1,208 @@
+import enum
+import os
+import struct
+import zlib
+from threading import RLock
+from typing import Dict, Iterable, Iterator, NamedTuple, Optional, BinaryIO, Tuple, Callable, Union
+
+from my_plugin.storage.container import ContainerPos, ContainerRecord
+
+
+class LogOperation(enum.IntEnum):
+    UPDATE = 1
+    REMOVE = 2
+    CLEAR = 3
+
+
+class LogRecord(NamedTuple):
+    operation: LogOperation
+    pos: Optional[ContainerPos] = None
+    items: Optional[Union[Dict[str, int], ContainerRecord]] = None
+
+
+class WriteAheadLog:
+    """
+    Append-only binary log of storage index mutations.
+    Each frame is <payload length u32><crc32 u32><payload>, a torn or corrupted frame ends the log on replay.
+    Appends are buffered, sync() flushes and fsyncs them, callers batch it on a timer
+    """
+    MAGIC = b'SILG\x01'
+    __FRAME_HEADER = struct.Struct('<II')
+    __POS = struct.Struct('<qqq')
+    __COUNT = struct.Struct('<q')
+    __LENGTH = struct.Struct('<H')
+    __SIZE = struct.Struct('<I')
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.__lock = RLock()
+        self.__file: Optional[BinaryIO] = None
+        self.__pending = False
+
+    @property
+    def rotated_file_path(self) -> str:
+        return self.file_path + '.old'
+
+    @property
+    def size(self) -> int:
+        with self.__lock:
+            if self.__file is not None:
+                return self.__file.tell()
+        return os.path.getsize(self.file_path) if os.path.isfile(self.file_path) else 0
+
+    # Encoding
+    @classmethod
+    def __pack_str(cls, text: str) -> bytes:
+        data = text.encode('utf8')
+        return cls.__LENGTH.pack(len(data)) + data
+
+    @classmethod
+    def __unpack_str(cls, payload: bytes, offset: int) -> Tuple[str, int]:
+        length, = cls.__LENGTH.unpack_from(payload, offset)
+        offset += cls.__LENGTH.size
+        return payload[offset:offset + length].decode('utf8'), offset + length
+
+    @classmethod
+    def encode(cls, record: LogRecord) -> bytes:
+        parts = [bytes([record.operation])]
+        if record.pos is not None:
+            parts.append(cls.__pack_str(record.pos.dimension))
+            parts.append(cls.__POS.pack(record.pos.x, record.pos.y, record.pos.z))
+        if record.items is not None:
+            parts.append(cls.__SIZE.pack(len(record.items)))
+            for item, count in record.items.items():
+                parts.append(cls.__pack_str(item))
+                parts.append(cls.__COUNT.pack(count))
+        payload = b''.join(parts)
+        return cls.__FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+    @classmethod
+    def decode(cls, payload: bytes) -> LogRecord:
+        operation = LogOperation(payload[0])
+        if operation == LogOperation.CLEAR:
+            return LogRecord(operation)
+        dimension, offset = cls.__unpack_str(payload, 1)
+        pos = ContainerPos(dimension, *cls.__POS.unpack_from(payload, offset))
+        offset += cls.__POS.size
+        if operation == LogOperation.REMOVE:
+            return LogRecord(operation, pos)
+        size, = cls.__SIZE.unpack_from(payload, offset)
+        offset += cls.__SIZE.size
+        items = {}
+        for _ in range(size):
+            item, offset = cls.__unpack_str(payload, offset)
+            items[item], = cls.__COUNT.unpack_from(payload, offset)
+            offset += cls.__COUNT.size
+        return LogRecord(operation, pos, items)
+
+    @classmethod
+    def read(cls, file_path: str) -> Iterator[Tuple[LogRecord, int]]:
+        """
+        Yield the intact records of a log file with the file offset after each of them,
+        stopping at the first torn or corrupted frame
+        """
+        if not os.path.isfile(file_path):
+            return
+        with open(file_path, 'rb') as f:
+            if f.read(len(cls.MAGIC)) != cls.MAGIC:
+                return
+            while True:
+                header = f.read(cls.__FRAME_HEADER.size)
+                if len(header) < cls.__FRAME_HEADER.size:
+                    return
+                length, checksum = cls.__FRAME_HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != checksum:
+                    return
+                yield cls.decode(payload), f.tell()
+
+    def replay(self, callback: Callable[[LogRecord], None]) -> int:
+        """
+        Apply the records of the rotated and the current log in order, then cut torn tails off
+        so that new appends stay readable
+        :return: Number of replayed records
+        """
+        replayed = 0
+        with self.__lock:
+            for file_path in (self.rotated_file_path, self.file_path):
+                if not os.path.isfile(file_path):
+                    continue
+                valid_length = len(self.MAGIC)
+                for record, offset in self.read(file_path):
+                    callback(record)
+                    replayed += 1
+                    valid_length = offset
+                if os.path.getsize(file_path) > valid_length:
+                    with open(file_path, 'r+b') as f:
+                        if f.read(len(self.MAGIC)) != self.MAGIC:
+                            f.seek(0)
+                            f.write(self.MAGIC)
+                        f.truncate(valid_length)
+        return replayed
+
+    # Writing
+    def open(self):
+        with self.__lock:
+            if self.__file is not None:
+                return
+            self.__file = open(self.file_path, 'ab')
+            if self.__file.tell() == 0:
+                self.__file.write(self.MAGIC)
+                self.__pending = True
+
+    def append(self, record: LogRecord):
+        with self.__lock:
+            if self.__file is None:
+                raise RuntimeError('Write-ahead log is not opened')
+            self.__file.write(self.encode(record))
+            self.__pending = True
+
+    def append_many(self, records: Iterable[LogRecord]):
+        with self.__lock:
+            if self.__file is None:
+                raise RuntimeError('Write-ahead log is not opened')
+            self.__file.write(b''.join(map(self.encode, records)))
+            self.__pending = True
+
+    def sync(self):
+        with self.__lock:
+            if self.__file is None or not self.__pending:
+                return
+            self.__file.flush()
+            os.fsync(self.__file.fileno())
+            self.__pending = False
+
+    def close(self):
+        with self.__lock:
+            if self.__file is None:
+                return
+            self.sync()
+            self.__file.close()
+            self.__file = None
+
+    def rotate(self):
+        """
+        Move current records to the rotated log and start an empty one.
+        The rotated log is kept until the caller has persisted a snapshot containing its records,
+        if a previous rotated log is still there its records are kept in front of the current ones
+        """
+        with self.__lock:
+            reopen = self.__file is not None
+            self.close()
+            rotated_path = self.rotated_file_path
+            if os.path.isfile(rotated_path) and os.path.isfile(self.file_path):
+                with open(self.file_path, 'rb') as src, open(rotated_path, 'ab') as dst:
+                    src.seek(len(self.MAGIC))
+                    dst.write(src.read())
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                os.remove(self.file_path)
+            elif os.path.isfile(self.file_path):
+                os.replace(self.file_path, rotated_path)
+            if reopen:
+                self.open()
+
+    def discard_rotated(self):
+        with self.__lock:
+            if os.path.isfile(self.rotated_file_path):
+                os.remove(self.rotated_file_path)
@@ -0,0 +1,96 @@
+import io
+import os
+import posixpath
+import threading
+from typing import Dict, IO, List, Optional
+from zipfile import ZipFile, ZipInfo
+
+
+class BundledResources:
+    """
+    Files bundled in the plugin package, either a packed .mcdr / .pyz file or a plugin folder.
+    For a packed plugin the archive is opened once and its entries indexed, listings and reads are served
+    from that index and the single open handle until closed
+    """
+
+    def __init__(self, package_path: str):
+        self.package_path = package_path
+        self.__lock = threading.Lock()
+        self.__packed = not os.path.isdir(package_path)
+        self.__zip_file: Optional[ZipFile] = None
+        self.__entries: Dict[str, ZipInfo] = {}
+        # Directory path -> names directly inside, "" is the archive root
+        self.__listings: Dict[str, List[str]] = {}
+        if self.__packed:
+            self.__build_index(ZipFile(package_path, 'r'))
+
+    @property
+    def is_packed(self) -> bool:
+        return self.__packed
+
+    @staticmethod
+    def normalize_path(path: str) -> str:
+        path = posixpath.normpath(path.replace('\\', '/')).lstrip('/')
+        return '' if path == '.' else path
+
+    def __build_index(self, zip_file: ZipFile):
+        listings: Dict[str, Dict[str, None]] = {'': {}}
+        for file_info in zip_file.infolist():
+            path = self.normalize_path(file_info.filename)
+            if len(path) == 0:
+                continue
+            if file_info.is_dir():
+                listings.setdefault(path, {})
+            else:
+                self.__entries[path] = file_info
+            # Archives may omit directory entries, register the missing parents
+            while len(path) > 0:
+                parent, _, name = path.rpartition('/')
+                children = listings.setdefault(parent, {})
+                if name in children.keys():
+                    break
+                children[name] = None
+                path = parent
+        self.__listings = {directory: list(names.keys()) for directory, names in listings.items()}
+        self.__zip_file = zip_file
+
+    def exists(self, file_path: str) -> bool:
+        if not self.is_packed:
+            return os.path.isfile(os.path.join(self.package_path, file_path))
+        return self.normalize_path(file_path) in self.__entries.keys()
+
+    def list_dir(self, directory_name: str) -> List[str]:
+        if not self.is_packed:
+            return os.listdir(os.path.join(self.package_path, directory_name))
+        listing = self.__listings.get(self.normalize_path(directory_name))
+        if listing is None:
+            raise FileNotFoundError('Bundled directory not found: {}'.format(directory_name))
+        return listing.copy()
+
+    def read(self, file_path: str) -> bytes:
+        if not self.is_packed:
+            with open(os.path.join(self.package_path, file_path), 'rb') as f:
+                return f.read()
+        with self.__lock:
+            if self.__zip_file is None:
+                raise ValueError('Bundled resources of {} are closed'.format(self.package_path))
+            return self.__zip_file.read(self.__get_entry(file_path))
+
+    def open(self, file_path: str) -> IO[bytes]:
+        if not self.is_packed:
+            return open(os.path.join(self.package_path, file_path), 'rb')
+        # Read in full, a member stream left open would hold the shared handle
+        return io.BytesIO(self.read(file_path))
+
+    def close(self):
+        with self.__lock:
+            zip_file, self.__zip_file = self.__zip_file, None
+            self.__entries, self.__listings = {}, {}
+        if zip_file is not None:
+            zip_file.close()
+
+    def __get_entry(self, file_path: str) -> ZipInfo:
+        file_info = self.__entries.get(self.normalize_path(file_path))
+        if file_info is None:
+            raise FileNotFoundError('Bundled file not found: {}'.format(file_path))
+        return file_info
@@ -2,11 +2,12 @@ import enum
 import os
 import contextlib
 import shutil
+import threading
 
-from zipfile import ZipFile
-from typing import ContextManager, TextIO, Optional, List
+from typing import ContextManager, TextIO, Optional, List, IO
 from mcdreforged.api.types import ServerInterface, PluginServerInterface
 
+from my_plugin.utils.bundled_resources import BundledResources
 from my_plugin.utils.util_abc import AbstractUtil
 from my_plugin.constants import PACKAGE_PATH
 
@@ -16,6 +17,8 @@ class FileUtils(AbstractUtil):
         CRLF = '\r\n'
         CR = '\r'
 
+    __bundled_resources: Optional[BundledResources] = None
+    __bundled_resources_lock = threading.Lock()
 
     @staticmethod
     def delete(target_file_path: str):
@@ -37,8 +40,7 @@ class FileUtils(AbstractUtil):
     @classmethod
     def lf_read(cls, target_file_path: str, *, is_bundled: bool = False, encoding: str = 'utf8') -> str:
         if is_bundled:
-            with cls._plugin_inst.server.open_bundled_file(target_file_path) as f:
-                file_string = f.read()
+            file_string = cls.get_bundled_resources().read(target_file_path).decode(encoding)
         else:
             with open(target_file_path, 'r', encoding=encoding) as f:
                 file_string = f.read()
@@ -53,20 +55,33 @@ class FileUtils(AbstractUtil):
             os.makedirs(folder)
 
     @classmethod
-    def list_bundled_file(cls, directory_name: str):
-        server = cls._plugin_inst.server
-        package = PACKAGE_PATH
+    def get_package_path(cls) -> str:
+        server = None if cls._plugin_inst is None else cls._plugin_inst.server
         if server is not None:
             return server.get_plugin_file_path(server.get_self_metadata().id)
-        if os.path.isdir(package):
-            return os.listdir(os.path.join(package, directory_name))
-        with ZipFile(package, 'r') as zip_file:
-            result = []
-            directory_name = directory_name.replace('\\', '/').rstrip('/\\') + '/'
-            for file_info in zip_file.infolist():
-                # is inside the dir and is directly inside
-                if file_info.filename.startswith(directory_name):
-                    file_name = file_info.filename.replace(directory_name, '', 1)
-                    if len(file_name) > 0 and '/' not in file_name.rstrip('/'):
-                        result.append(file_name)
-        return result
+        return PACKAGE_PATH
+
+    @classmethod
+    def get_bundled_resources(cls) -> BundledResources:
+        """
+        Indexed on first use, kept until closed on unload
+        """
+        with cls.__bundled_resources_lock:
+            if cls.__bundled_resources is None:
+                cls.__bundled_resources = BundledResources(cls.get_package_path())
+            return cls.__bundled_resources
+
+    @classmethod
+    def close_bundled_resources(cls):
+        with cls.__bundled_resources_lock:
+            resources, cls.__bundled_resources = cls.__bundled_resources, None
+        if resources is not None:
+            resources.close()
+
+    @classmethod
+    def open_bundled_file(cls, file_path: str) -> IO[bytes]:
+        return cls.get_bundled_resources().open(file_path)
+
+    @classmethod
+    def list_bundled_file(cls, directory_name: str) -> List[str]:
+        return cls.get_bundled_resources().list_dir(directory_name)
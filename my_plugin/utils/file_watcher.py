@@ -0,0 +1,65 @@
+import threading
+import time
+from typing import Callable, Optional, Any, TYPE_CHECKING
+
+from my_plugin.utils.misc import MiscTools
+from my_plugin.utils.serializer import ConfigFileState
+
+if TYPE_CHECKING:
+    from my_plugin.my_plugin import MyPlugin
+
+
+class FileWatcher:
+    """
+    Polls mtime and size of a file and invokes the callback once the file stays unchanged for debounce_delay,
+    so a burst of writes from an editor results in a single callback
+    """
+    def __init__(
+            self,
+            plugin_inst: "MyPlugin",
+            file_path: str,
+            callback: Callable[[], Any],
+            poll_interval: float = 1.0,
+            debounce_delay: float = 0.5
+    ):
+        self.__inst = plugin_inst
+        self.__file_path = file_path
+        self.__callback = callback
+        self.__poll_interval = poll_interval
+        self.__debounce_delay = debounce_delay
+        self.__stop_event = threading.Event()
+        self.__thread: Optional[threading.Thread] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self.__thread is not None and self.__thread.is_alive()
+
+    def start(self):
+        if self.is_running:
+            return
+        self.__stop_event.clear()
+        self.__thread = self.__watch()
+
+    def stop(self, timeout: Optional[float] = None):
+        self.__stop_event.set()
+        thread, self.__thread = self.__thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    @MiscTools.named_thread('FileWatcher')
+    def __watch(self):
+        last_state = ConfigFileState.of(self.__file_path)
+        changed_at: Optional[float] = None
+        while not self.__stop_event.wait(self.__poll_interval):
+            state = ConfigFileState.of(self.__file_path)
+            if state != last_state:
+                # Still being written, wait until it settles
+                last_state, changed_at = state, time.monotonic()
+                continue
+            if changed_at is None or time.monotonic() - changed_at < self.__debounce_delay:
+                continue
+            changed_at = None
+            try:
+                self.__callback()
+            except Exception:
+                self.__inst.logger.exception('Error handling change of file {}'.format(self.__file_path))
@@ -0,0 +1,62 @@
+import functools
+import re
+from typing import Callable, Tuple
+
+from mcdreforged.api.rtext import *
+
+from my_plugin.generic import MessageText
+
+
+@functools.lru_cache(maxsize=16)
+def get_help_command_pattern(prefixes: Tuple[str, ...]) -> re.Pattern:
+    # Longest first so that a prefix is never shadowed by a shorter one it starts with
+    alternation = '|'.join(re.escape(prefix) for prefix in sorted(prefixes, key=len, reverse=True))
+    return re.compile(r'(?<=§7)(?:{})[\S ]*?(?=§)'.format(alternation))
+
+
+class HelpMessageRenderer:
+    """
+    Renders translated help messages with clickable command lines, the lines starting with one of the prefixes.
+    Rendered results are cached by prefixes, translation key and translation args until invalidate() is called.
+    Cached texts are shared between replies, do not modify them
+    """
+    def __init__(
+            self,
+            ntr: Callable[..., MessageText],
+            rtr: Callable[..., MessageText],
+            cache_size: int = 32
+    ):
+        self.__ntr = ntr
+        self.__rtr = rtr
+        self.__render_cached = functools.lru_cache(maxsize=cache_size)(self.__render)
+
+    def invalidate(self):
+        self.__render_cached.cache_clear()
+
+    def __render(self, prefixes: Tuple[str, ...], key: str, args: tuple, kwargs: tuple) -> MessageText:
+        original, processed = self.__ntr(key, *args, **dict(kwargs)), []
+        if not isinstance(original, str):
+            return key
+        pattern = get_help_command_pattern(prefixes) if len(prefixes) > 0 else None
+        for line in original.splitlines():
+            result = pattern.search(line) if pattern is not None else None
+            if result is not None:
+                command = result.group() + ' '
+                processed.append(RText(line).c(RAction.suggest_command, command).h(self.__rtr('hover.suggest', command)))
+            else:
+                processed.append(line)
+        return RTextBase.join('\n', processed)
+
+    def render(self, prefixes: Tuple[str, ...], key: str, *args, **kwargs) -> MessageText:
+        cache_args = (prefixes, key, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(cache_args)
+        except TypeError:
+            return self.__render(*cache_args)
+        return self.__render_cached(*cache_args)
+
+    def get_translator(self, prefixes: Tuple[str, ...]) -> Callable[..., MessageText]:
+        """
+        :return: Translator of RTextMCDRTranslation rendering with the prefixes
+        """
+        return functools.partial(self.render, prefixes)
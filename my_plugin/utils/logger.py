@@ -1,7 +1,7 @@
 import logging
 import os
 import re
-from typing import Optional, TYPE_CHECKING
+from typing import Optional, Tuple, TYPE_CHECKING
 
 from mcdreforged.api.event import MCDRPluginEvents
 from mcdreforged.api.types import MCDReforgedLogger
@@ -12,18 +12,50 @@ if TYPE_CHECKING:
     from my_plugin.my_plugin import MyPlugin
 
 
+CONSOLE_COLOR_CODE_PATTERN = re.compile(r'\033\[(\d+(;\d+)?)?m')
+MINECRAFT_COLOR_CODE_PATTERN = re.compile(r'§[a-z0-9]')
+COLOR_CODE_PATTERN = re.compile(r'\033\[(?:\d+(?:;\d+)?)?m|§[a-z0-9]')
+
+
 class BlossomLogger(MCDReforgedLogger):
     class NoColorFormatter(logging.Formatter):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            # (second, date format, formatted time), records of the same second share the string
+            self.__time_cache: Optional[Tuple[int, Optional[str], str]] = None
+
+        def formatTime(self, record, datefmt=None) -> str:
+            second = int(record.created)
+            cached = self.__time_cache
+            if cached is not None and cached[0] == second and cached[1] == datefmt:
+                return cached[2]
+            text = super().formatTime(record, datefmt)
+            # Without a date format milliseconds are appended, which differ within a second
+            if datefmt is not None:
+                self.__time_cache = (second, datefmt, text)
+            return text
+
         def formatMessage(self, record) -> str:
-            return self.clean_console_color_code(self.clean_minecraft_color_code(super().formatMessage(record)))
+            return self.clean_color_code(super().formatMessage(record))
+
+        @staticmethod
+        def clean_color_code(text: str) -> str:
+            """
+            Strip console and Minecraft color codes in a single pass
+            """
+            text = str(text)
+            if '\033' not in text and '§' not in text:
+                return text
+            return COLOR_CODE_PATTERN.sub('', text)
 
         @staticmethod
         def clean_console_color_code(text: str) -> str:
-            return re.compile(r'\033\[(\d+(;\d+)?)?m').sub('', text)
+            return CONSOLE_COLOR_CODE_PATTERN.sub('', text) if '\033' in text else text
 
         @staticmethod
         def clean_minecraft_color_code(text: str):
-            return re.compile(r'§[a-z0-9]').sub('', str(text))
+            text = str(text)
+            return MINECRAFT_COLOR_CODE_PATTERN.sub('', text) if '§' in text else text
 
     __SINGLE_FILE_LOG_PATH: Optional[str] = "alocasia.log"
     FILE_FMT: NoColorFormatter = NoColorFormatter(
@@ -46,18 +78,27 @@ class BlossomLogger(MCDReforgedLogger):
     def _blossom_unbind_file(self, *args, **kwargs) -> None:
         if self._blossom_file_handler is not None:
             self.removeHandler(self._blossom_file_handler)
+            # A queued handler writes out the records still queued before closing the file
             self._blossom_file_handler.close()
             self._blossom_file_handler = None
 
-    def blossom_bind_single_file(self, file_name: Optional[str] = None) -> "BlossomLogger":
+    def blossom_bind_single_file(self, file_name: Optional[str] = None, queued: bool = False, **queue_kwargs) -> "BlossomLogger":
+        """
+        :param queued: Write through a QueuedFileHandler, queue_kwargs are passed to it
+        """
         if file_name is None:
             if self.__SINGLE_FILE_LOG_PATH is None:
                 return self
             file_name = os.path.join(self.__inst.get_data_folder(), self.__SINGLE_FILE_LOG_PATH)
         self._blossom_unbind_file()
         FileUtils.ensure_dir(os.path.dirname(file_name))
-        self._blossom_file_handler = logging.FileHandler(file_name, encoding='UTF-8')
-        self._blossom_file_handler.setFormatter(self.FILE_FMT)
+        if queued:
+            # Imported on demand, logging.handlers is not otherwise loaded by MCDR
+            from my_plugin.utils.queued_file_handler import QueuedFileHandler
+            self._blossom_file_handler = QueuedFileHandler(file_name, self.FILE_FMT, **queue_kwargs)
+        else:
+            self._blossom_file_handler = logging.FileHandler(file_name, encoding='UTF-8')
+            self._blossom_file_handler.setFormatter(self.FILE_FMT)
         self.addHandler(self._blossom_file_handler)
         return self
 
@@ -2,9 +2,10 @@ import functools
 import inspect
 import sys
 import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from ruamel import yaml
 from io import StringIO
-from typing import Optional, Callable, Union, TYPE_CHECKING
+from typing import Optional, Callable, Union, Dict, Tuple, TYPE_CHECKING
 
 from mcdreforged.api.decorator import FunctionThread
 from mcdreforged.api.types import PluginServerInterface, ServerInterface
@@ -16,9 +17,111 @@ if TYPE_CHECKING:
 
 
 class MiscTools(AbstractUtil):
+    __thread_prefix: Optional[Tuple["MyPlugin", str]] = None
+    __executors: Dict[str, ThreadPoolExecutor] = {}
+    __executor_workers: Dict[str, int] = {}
+    __executors_shutdown = False
+    __executor_lock = threading.Lock()
+
     @classmethod
     def get_thread_prefix(cls) -> str:
-        return cls.to_camel_case(cls._plugin_inst.server.get_self_metadata().name, divider='_') + '_'
+        # Computed once per plugin instance, metadata lookup and case conversion are not free
+        cached = cls.__thread_prefix
+        if cached is None or cached[0] is not cls._plugin_inst:
+            prefix = cls.to_camel_case(cls._plugin_inst.server.get_self_metadata().name, divider='_') + '_'
+            cached = cls.__thread_prefix = (cls._plugin_inst, prefix)
+        return cached[1]
+
+    @classmethod
+    def get_executor_workers(cls, name: str) -> int:
+        options = cls._plugin_inst.config.executors
+        return max(1, options.workers.get(name, options.default_workers))
+
+    @classmethod
+    def get_executor(cls, name: str) -> ThreadPoolExecutor:
+        """
+        Bounded executor shared by everything named alike, created on first use and sized by the executor options
+        """
+        with cls.__executor_lock:
+            if cls.__executors_shutdown:
+                raise RuntimeError('Executors are already shut down')
+            executor = cls.__executors.get(name)
+            if executor is None:
+                max_workers = cls.get_executor_workers(name)
+                executor = cls.__executors[name] = ThreadPoolExecutor(
+                    max_workers=max_workers, thread_name_prefix=cls.get_thread_prefix() + name
+                )
+                cls.__executor_workers[name] = max_workers
+            return executor
+
+    @classmethod
+    def resize_executors(cls):
+        """
+        Swap in new executors for those whose worker count changed in the config,
+        tasks queued on the old ones still run before their threads exit
+        """
+        replaced = []
+        with cls.__executor_lock:
+            for name, executor in list(cls.__executors.items()):
+                max_workers = cls.get_executor_workers(name)
+                if max_workers != cls.__executor_workers.get(name):
+                    replaced.append(executor)
+                    cls.__executors[name] = ThreadPoolExecutor(
+                        max_workers=max_workers, thread_name_prefix=cls.get_thread_prefix() + name
+                    )
+                    cls.__executor_workers[name] = max_workers
+        for executor in replaced:
+            executor.shutdown(wait=False)
+
+    @classmethod
+    def shutdown_executor(cls, name: str, wait: bool = True):
+        with cls.__executor_lock:
+            executor = cls.__executors.pop(name, None)
+            cls.__executor_workers.pop(name, None)
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    @classmethod
+    def shutdown_executors(cls, wait: bool = True):
+        """
+        Drop queued tasks, let running ones finish and refuse further submissions
+        """
+        with cls.__executor_lock:
+            cls.__executors_shutdown = True
+            executors = list(cls.__executors.values())
+            cls.__executors.clear()
+            cls.__executor_workers.clear()
+        for executor in executors:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    @classmethod
+    def pooled_thread(cls, arg: Optional[Union[str, Callable]] = None) -> Callable:
+        """
+        Variant of named_thread running calls on the bounded executor of that name, decorated functions return a Future.
+        Long-running loops should stay on named_thread, they would hold a worker for good
+        """
+        def wrapper(func):
+            @functools.wraps(func)
+            def wrap(*args, **kwargs) -> Future:
+                def try_func():
+                    try:
+                        return func(*args, **kwargs)
+                    except Exception:
+                        cls._plugin_inst.server.logger.exception('Error running task {} on executor {}'.format(func.__name__, executor_name))
+                        raise
+
+                return cls.get_executor(executor_name).submit(try_func)
+
+            wrap.__signature__ = inspect.signature(func)
+            wrap.original = func
+            return wrap
+
+        if isinstance(arg, Callable):
+            executor_name = cls.to_camel_case(arg.__name__, divider="_")
+            return wrapper(arg)
+        else:
+            executor_name = arg
+            return wrapper
 
     @classmethod
     def named_thread(cls, arg: Optional[Union[str, Callable]] = None) -> Callable:
@@ -67,6 +170,37 @@ class MiscTools(AbstractUtil):
         char_list[0] = char_list[0].upper()
         return ''.join(char_list)
 
+    @staticmethod
+    def get_deep_size(*objects) -> int:
+        """
+        Bytes held by objects and everything reachable through their containers and slots, shared objects count once
+        """
+        seen, size, pending = set(), 0, list(objects)
+        while len(pending) > 0:
+            obj = pending.pop()
+            if id(obj) in seen:
+                continue
+            seen.add(id(obj))
+            size += sys.getsizeof(obj)
+            if isinstance(obj, dict):
+                pending.extend(obj.keys())
+                pending.extend(obj.values())
+            elif isinstance(obj, (list, tuple, set, frozenset)):
+                pending.extend(obj)
+            else:
+                for slot in getattr(type(obj), '__slots__', ()):
+                    if hasattr(obj, slot):
+                        pending.append(getattr(obj, slot))
+        return size
+
+    @staticmethod
+    def format_size(size: Union[int, float]) -> str:
+        for unit in ('B', 'KiB', 'MiB'):
+            if abs(size) < 1024:
+                return '{:.1f} {}'.format(size, unit) if unit != 'B' else '{} B'.format(size)
+            size /= 1024
+        return '{:.1f} GiB'.format(size)
+
     @staticmethod
     def yaml_dump_to_string(data: Union[dict, list], yaml_inst: Optional[yaml.YAML] = None):
         if yaml_inst is None:
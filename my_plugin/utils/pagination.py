@@ -0,0 +1,111 @@
+import math
+import threading
+import time
+from typing import Callable, Dict, Generic, Iterable, Iterator, List, Optional, TypeVar
+
+from my_plugin.generic import MessageText
+
+
+T = TypeVar('T')
+
+
+class PagedResult(Generic[T]):
+    """
+    Lazily paged query result. Items are pulled from the source iterable only as far as the requested page needs,
+    and only the lines of that page are rendered.
+    Pulled items are kept unrendered so that earlier pages can be shown again
+    """
+    def __init__(
+            self,
+            items: Iterable[T],
+            render: Callable[[T], MessageText],
+            page_size: int = 10,
+            header: Optional[MessageText] = None,
+            total: Optional[int] = None
+    ):
+        self.header = header
+        self.page_size = max(1, page_size)
+        self.__iterator: Iterator[T] = iter(items)
+        self.__render = render
+        self.__total = total
+        self.__fetched: List[T] = []
+        self.__exhausted = False
+        self.__lock = threading.Lock()
+
+    def __fetch_until(self, count: int):
+        while not self.__exhausted and len(self.__fetched) < count:
+            try:
+                self.__fetched.append(next(self.__iterator))
+            except StopIteration:
+                self.__exhausted = True
+
+    @property
+    def page_count(self) -> Optional[int]:
+        """
+        None if the item count is not known until the source is exhausted
+        """
+        if self.__total is not None:
+            return max(1, math.ceil(self.__total / self.page_size))
+        if self.__exhausted:
+            return max(1, math.ceil(len(self.__fetched) / self.page_size))
+        return None
+
+    def has_page(self, page: int) -> bool:
+        if page < 0:
+            return False
+        if page == 0:
+            return True
+        with self.__lock:
+            self.__fetch_until(page * self.page_size + 1)
+            return len(self.__fetched) > page * self.page_size
+
+    def iter_page(self, page: int) -> Iterator[MessageText]:
+        start = page * self.page_size
+        with self.__lock:
+            self.__fetch_until(start + self.page_size)
+            page_items = self.__fetched[start:start + self.page_size]
+        for item in page_items:
+            yield self.__render(item)
+
+
+class PageCursors:
+    """
+    Current result page of each source, forgotten after expiry seconds without access
+    """
+    class Cursor:
+        def __init__(self, result: PagedResult, page: int = 0):
+            self.result = result
+            self.page = page
+            self.accessed_at = time.monotonic()
+
+    def __init__(self, expiry: float = 300.0):
+        self.__expiry = expiry
+        self.__cursors: Dict[str, "PageCursors.Cursor"] = {}
+        self.__lock = threading.Lock()
+
+    def set_expiry(self, expiry: float):
+        with self.__lock:
+            self.__expiry = expiry
+
+    def __purge(self):
+        deadline = time.monotonic() - self.__expiry
+        for key in [key for key, cursor in self.__cursors.items() if cursor.accessed_at < deadline]:
+            del self.__cursors[key]
+
+    def open(self, key: str, result: PagedResult) -> "PageCursors.Cursor":
+        with self.__lock:
+            self.__purge()
+            cursor = self.__cursors[key] = self.Cursor(result)
+            return cursor
+
+    def get(self, key: str) -> Optional["PageCursors.Cursor"]:
+        with self.__lock:
+            self.__purge()
+            cursor = self.__cursors.get(key)
+            if cursor is not None:
+                cursor.accessed_at = time.monotonic()
+            return cursor
+
+    def close(self, key: str):
+        with self.__lock:
+            self.__cursors.pop(key, None)
@@ -0,0 +1,140 @@
+import threading
+from typing import Callable, Any, Dict, Optional, TYPE_CHECKING
+
+from mcdreforged.api.types import CommandSource
+
+from my_plugin.generic import MessageText
+from my_plugin.utils.misc import MiscTools
+
+if TYPE_CHECKING:
+    from my_plugin.my_plugin import MyPlugin
+
+
+class QueryTicket:
+    """
+    Handle of a submitted query. Replies of a cancelled ticket are dropped,
+    long-running tasks should check is_cancelled between steps
+    """
+    def __init__(self, source: CommandSource, source_key: str, task: Callable[["QueryTicket"], Any]):
+        self.source = source
+        self.source_key = source_key
+        self.task = task
+        self.__cancelled = threading.Event()
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self.__cancelled.is_set()
+
+    def cancel(self):
+        self.__cancelled.set()
+
+    def reply(self, message: MessageText) -> bool:
+        if self.is_cancelled:
+            return False
+        self.source.reply(message)
+        return True
+
+
+class QueryExecutor:
+    """
+    Runs storage queries off the MCDR task executor thread on the bounded QueryWorker executor,
+    sized by executors.workers of the config.
+    Each source has at most one query in flight, a new one supersedes it
+    """
+    EXECUTOR_NAME = 'QueryWorker'
+
+    def __init__(self, plugin_inst: "MyPlugin", max_pending: int = 16):
+        self.__inst = plugin_inst
+        self.__max_pending = max(1, max_pending)
+        self.__lock = threading.Lock()
+        self.__tickets: Dict[str, QueryTicket] = {}
+        self.__pending = 0
+        self.__running = False
+
+    @staticmethod
+    def get_source_key(source: CommandSource) -> str:
+        return getattr(source, 'player', None) or type(source).__name__
+
+    @property
+    def is_running(self) -> bool:
+        return self.__running
+
+    @property
+    def pending(self) -> int:
+        return self.__pending
+
+    def start(self):
+        if self.is_running:
+            return
+        MiscTools.get_executor(self.EXECUTOR_NAME)
+        self.__running = True
+
+    def configure(self, max_pending: int):
+        with self.__lock:
+            self.__max_pending = max(1, max_pending)
+
+    def stop(self, wait: bool = True):
+        """
+        Cancel all tickets, queued queries are dropped and running ones are waited for
+        """
+        with self.__lock:
+            for ticket in self.__tickets.values():
+                ticket.cancel()
+            self.__tickets.clear()
+            self.__pending = 0
+        if self.__running:
+            self.__running = False
+            MiscTools.shutdown_executor(self.EXECUTOR_NAME, wait)
+
+    def submit(self, source: CommandSource, task: Callable[[QueryTicket], Any]) -> Optional[QueryTicket]:
+        """
+        Queue a query, sources are replied with a rejection instead when too many queries are in flight
+        :return: The ticket, or None if rejected
+        """
+        key = self.get_source_key(source)
+        with self.__lock:
+            previous = self.__tickets.get(key)
+            if previous is not None:
+                previous.cancel()
+            elif self.__pending >= self.__max_pending:
+                source.reply(self.__inst.rtr('query.rejected'))
+                return None
+            else:
+                self.__pending += 1
+            ticket = self.__tickets[key] = QueryTicket(source, key, task)
+        if not self.__running:
+            # Not loaded yet or already unloaded, run inline rather than dropping it
+            self.__run(ticket)
+        else:
+            try:
+                # Looked up per query, the executor is replaced when its worker count is changed
+                MiscTools.get_executor(self.EXECUTOR_NAME).submit(self.__run, ticket)
+            except RuntimeError:
+                # Shut down meanwhile
+                self.__run(ticket)
+        return ticket
+
+    def cancel(self, source: CommandSource) -> bool:
+        with self.__lock:
+            ticket = self.__tickets.pop(self.get_source_key(source), None)
+            if ticket is None:
+                return False
+            ticket.cancel()
+            self.__pending -= 1
+            return True
+
+    def __finish(self, ticket: QueryTicket):
+        with self.__lock:
+            if self.__tickets.get(ticket.source_key) is ticket:
+                del self.__tickets[ticket.source_key]
+                self.__pending -= 1
+
+    def __run(self, ticket: QueryTicket):
+        try:
+            if not ticket.is_cancelled:
+                ticket.task(ticket)
+        except Exception:
+            self.__inst.logger.exception('Error running query for {}'.format(ticket.source))
+            ticket.reply(self.__inst.rtr('query.failed'))
+        finally:
+            self.__finish(ticket)
@@ -0,0 +1,142 @@
+import copy
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from typing import List, Optional, TextIO, Tuple
+
+from my_plugin.utils.misc import MiscTools
+
+
+class QueuedFileHandler(logging.handlers.QueueHandler):
+    """
+    Logging threads only enqueue records, a writer thread formats and writes them in batches
+    and flushes once the queue runs dry or every flush_interval seconds.
+    The file is rotated to <file>.1 ... <file>.<backup_count> when it exceeds max_bytes or gets older than rotate_interval,
+    a non-positive limit disables that trigger. Closing drains the queue before the file is closed
+    """
+    BATCH_SIZE = 256
+    __STOP = object()
+
+    def __init__(
+            self,
+            file_name: str,
+            formatter: logging.Formatter,
+            max_bytes: int = 8 * 1024 * 1024,
+            backup_count: int = 3,
+            rotate_interval: float = 86400.0,
+            flush_interval: float = 1.0
+    ):
+        super().__init__(queue.SimpleQueue())
+        self.file_name = file_name
+        self.file_formatter = formatter
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.rotate_interval = rotate_interval
+        self.flush_interval = flush_interval
+        self.__stream: Optional[TextIO] = None
+        self.__opened_at = 0.0
+        self.__open_stream()
+        self.__writer: Optional[threading.Thread] = self.__write_loop()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only merge what may change after the call returns, formatting is left to the writer thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info is not None:
+            record.exc_text = self.file_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def __open_stream(self):
+        self.__stream = open(self.file_name, 'a', encoding='UTF-8')
+        self.__opened_at = time.time()
+
+    def __should_rotate(self, pending_bytes: int) -> bool:
+        size = self.__stream.tell()
+        if size == 0:
+            return False
+        return 0 < self.max_bytes <= size + pending_bytes or 0 < self.rotate_interval <= time.time() - self.__opened_at
+
+    def __rotate(self):
+        self.__stream.close()
+        if self.backup_count > 0:
+            for index in range(self.backup_count - 1, 0, -1):
+                source = '{}.{}'.format(self.file_name, index)
+                if os.path.isfile(source):
+                    os.replace(source, '{}.{}'.format(self.file_name, index + 1))
+            os.replace(self.file_name, self.file_name + '.1')
+        else:
+            os.remove(self.file_name)
+        self.__open_stream()
+
+    def __write_text(self, text: str):
+        if self.__stream.closed:
+            # A failed rotation left it closed
+            self.__open_stream()
+        if self.__should_rotate(len(text.encode('utf8'))):
+            self.__rotate()
+        self.__stream.write(text)
+
+    def __write(self, records: List[logging.LogRecord]):
+        lines: List[Tuple[logging.LogRecord, str]] = []
+        for record in records:
+            try:
+                lines.append((record, self.file_formatter.format(record) + '\n'))
+            except Exception:
+                self.handleError(record)
+        try:
+            self.__write_text(''.join(line for _, line in lines))
+        except Exception:
+            # Written one by one so that a single bad record, e.g. one that cannot be encoded, only loses itself
+            for record, line in lines:
+                try:
+                    self.__write_text(line)
+                except Exception:
+                    self.handleError(record)
+
+    def __flush(self):
+        try:
+            self.__stream.flush()
+        except Exception:
+            self.handleError(logging.makeLogRecord({'msg': 'Failed to flush log file {}'.format(self.file_name)}))
+
+    @MiscTools.named_thread('LogWriter')
+    def __write_loop(self):
+        last_flush = time.monotonic()
+        stopped = False
+        while not stopped:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = None
+            records = []
+            while item is not None:
+                if item is self.__STOP:
+                    stopped = True
+                    break
+                records.append(item)
+                if len(records) >= self.BATCH_SIZE:
+                    break
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    item = None
+            if len(records) > 0:
+                self.__write(records)
+            if self.queue.empty() or time.monotonic() - last_flush >= self.flush_interval:
+                self.__flush()
+                last_flush = time.monotonic()
+        self.__flush()
+
+    def close(self):
+        writer, self.__writer = self.__writer, None
+        if writer is not None:
+            self.queue.put_nowait(self.__STOP)
+            if writer is not threading.current_thread():
+                writer.join()
+            self.__stream.close()
+        super().close()
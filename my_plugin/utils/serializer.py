@@ -1,77 +1,279 @@
+import copy
+import functools
+import hashlib
 import os
 import shutil
-from typing import List, Optional, Tuple, get_origin, Type, TYPE_CHECKING
+import types
+from typing import List, Optional, Tuple, get_origin, get_args, Type, TYPE_CHECKING, Collection, Callable, NamedTuple, \
+    Any, Union, Literal
 
 from mcdreforged.api.types import CommandSource
 from mcdreforged.api.utils import Serializable, deserialize
 from ruamel import yaml
+from ruamel.yaml.scalarbool import ScalarBoolean
 
 from my_plugin.constants import TRANSLATION_KEY_PREFIX
 from my_plugin.utils.file_util import FileUtils
+from my_plugin.utils.misc import MiscTools
 
 if TYPE_CHECKING:
     from my_plugin.my_plugin import MyPlugin
 
 
-class BlossomSerializable(Serializable):
+def yaml_to_builtin(data: Any) -> Any:
+    """
+    Convert round-trip YAML nodes (CommentedMap, ScalarFloat, LiteralScalarString...) into plain python objects,
+    as deserialize() checks exact types of basic values
+    """
+    if isinstance(data, dict):
+        return {yaml_to_builtin(key): yaml_to_builtin(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [yaml_to_builtin(item) for item in data]
+    if isinstance(data, (bool, ScalarBoolean)):
+        return bool(data)
+    for basic_type in (int, float, str):
+        if isinstance(data, basic_type):
+            return data if type(data) is basic_type else basic_type(data)
+    return data
+
+
+def diff_serialized(old: Any, new: Any, *, father_nodes: Optional[List[str]] = None) -> List[str]:
+    """
+    Compare two serialized trees, returns the dotted paths of the deepest nodes that differ
+    """
+    if father_nodes is None:
+        father_nodes = []
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        return [] if old == new else ['.'.join(father_nodes)]
+    changed = []
+    for key in list(old.keys()) + [k for k in new.keys() if k not in old.keys()]:
+        if key not in old.keys() or key not in new.keys():
+            changed.append('.'.join(father_nodes + [str(key)]))
+        elif old[key] != new[key]:
+            changed += diff_serialized(old[key], new[key], father_nodes=father_nodes + [str(key)])
+    return changed
+
+
+def diff_sections(old: dict, new: dict, keys: Collection[str]) -> List[str]:
+    """
+    Compare two parsed config files, returns the top-level keys whose raw content differs
+    """
+    return [key for key in keys if (key in old.keys()) != (key in new.keys()) or old.get(key) != new.get(key)]
+
+
+class ConfigFileState(NamedTuple):
+    mtime_ns: int
+    size: int
+    digest: Optional[str] = None
+
     @classmethod
-    def _fix_data(cls, data: dict, *, father_nodes: Optional[List[str]] = None) -> Tuple[dict, List[str]]:
-        needs_save = list()
-        annotations = cls.get_field_annotations()
+    def of(cls, file_path: str) -> Optional["ConfigFileState"]:
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        return cls(stat.st_mtime_ns, stat.st_size)
+
+    @staticmethod
+    def get_digest(text: str, encoding: str = 'utf8') -> str:
+        return hashlib.sha256(text.encode(encoding)).hexdigest()
+
+    def same_stat(self, other: Optional["ConfigFileState"]) -> bool:
+        return other is not None and self.mtime_ns == other.mtime_ns and self.size == other.size
+
+    @classmethod
+    def read_changed(
+            cls,
+            file_path: str,
+            last_state: Optional["ConfigFileState"],
+            encoding: str = 'utf8'
+    ) -> Tuple[Optional["ConfigFileState"], Optional[str]]:
+        """
+        Read the file if it changed since last_state. Nothing is read if mtime and size are unchanged,
+        and content with an unchanged digest counts as unchanged. A missing or unreadable file counts as unchanged
+        :return: The state to keep, and the file text or None if unchanged
+        """
+        state = cls.of(file_path)
+        if state is None or state.same_stat(last_state):
+            return last_state, None
+        try:
+            text = FileUtils.lf_read(file_path, encoding=encoding)
+        except OSError:
+            return last_state, None
+        state = state._replace(digest=cls.get_digest(text, encoding))
+        if last_state is not None and state.digest == last_state.digest:
+            return state, None
+        return state, text
+
+
+class ConfigChangeNotifier:
+    """
+    Config change listeners subscribed to node paths, e.g. "permission_requirements" or "command_prefix".
+    A listener is notified when a changed node is the subscribed node, inside it or contains it.
+    Listeners subscribed to no node are notified on any change
+    """
+    def __init__(self):
+        self.__listeners: List[Tuple[Tuple[str, ...], Callable[[List[str]], Any]]] = []
+
+    def add_listener(self, callback: Callable[[List[str]], Any], *nodes: str):
+        self.__listeners.append((nodes, callback))
+
+    @staticmethod
+    def is_affected(node: str, changed_nodes: Collection[str]) -> bool:
+        for changed in changed_nodes:
+            if changed == node or changed.startswith(node + '.') or node.startswith(changed + '.'):
+                return True
+        return False
+
+    def notify(self, changed_nodes: List[str]):
+        if len(changed_nodes) == 0:
+            return
+        for nodes, callback in self.__listeners:
+            if len(nodes) == 0 or any(self.is_affected(node, changed_nodes) for node in nodes):
+                callback(changed_nodes)
+
+
+def _compile_type_checker(target_type: Any) -> Callable[[Any], bool]:
+    """
+    Build a checker telling whether deserialize(value, target_type, error_at_redundancy=True) would succeed,
+    types without a fast path fall back to calling deserialize
+    """
+    origin, args = get_origin(target_type), get_args(target_type)
+    if target_type is Any:
+        return lambda value: True
+    if target_type is None or target_type is type(None):
+        return lambda value: value is None
+    if target_type is float:
+        return lambda value: type(value) is float or isinstance(value, int)
+    if target_type in (bool, int, str, list, dict):
+        return lambda value: type(value) is target_type
+    if origin is Union or origin is types.UnionType:
+        checkers = [_compile_type_checker(arg) for arg in args]
+        return lambda value: any(checker(value) for checker in checkers)
+    if origin is Literal:
+        return lambda value: value in args
+    if origin is list and len(args) == 1:
+        element_checker = _compile_type_checker(args[0])
+        return lambda value: isinstance(value, list) and all(element_checker(e) for e in value)
+    if origin is dict and len(args) == 2:
+        key_checker, value_checker = _compile_type_checker(args[0]), _compile_type_checker(args[1])
+        return lambda value: isinstance(value, dict) and all(
+            key_checker(k) and value_checker(v) for k, v in value.items()
+        )
+
+    def check_by_deserialize(value: Any) -> bool:
+        try:
+            deserialize(value, target_type, error_at_redundancy=True)
+        except (ValueError, TypeError):
+            return False
+        return True
+    return check_by_deserialize
+
+
+class _FieldPlan(NamedTuple):
+    key: str
+    target_type: Any
+    has_default: bool
+    default: Any
+    check: Callable[[Any], bool]
+    sub_plan: Optional["_ValidatorPlan"]
+
+
+class _ValidatorPlan:
+    """
+    Field order, type checkers, serialized defaults and nested plans of a BlossomSerializable class,
+    compiled once per class so fixing data needs no reflection or default instance construction
+    """
+    def __init__(self, cls: Type["BlossomSerializable"]):
         default_data = cls.get_default().serialize()
-        if father_nodes is None:
-            father_nodes = []
-        fixed_dict = {}
-
-        for key, target_type in annotations.items():
-            current_nodes = father_nodes.copy()
-            current_nodes.append(key)
-            node_name = '.'.join(current_nodes)
+        self.fields: List[_FieldPlan] = []
+        for key, target_type in cls.get_field_annotations().items():
+            is_blossom = get_origin(target_type) is None and isinstance(target_type, type) and \
+                issubclass(target_type, BlossomSerializable)
+            self.fields.append(_FieldPlan(
+                key=key,
+                target_type=target_type,
+                has_default=key in default_data.keys(),
+                default=default_data.get(key),
+                check=_compile_type_checker(target_type),
+                sub_plan=target_type._get_validator_plan() if is_blossom else None
+            ))
+
+    def fix(self, data: dict, node_prefix: str, only_keys: Optional[Collection[str]] = None) -> Tuple[dict, List[str]]:
+        needs_save, fixed_dict = [], {}
+        for field in self.fields:
+            key = field.key
+            if only_keys is not None and key not in only_keys:
+                continue
+            node_name = node_prefix + key
             if key not in data.keys():
-                if key in default_data.keys():
+                if field.has_default:
                     needs_save.append(node_name)
-                    fixed_dict[key] = default_data[key]
+                    fixed_dict[key] = copy.deepcopy(field.default)
                 continue
             value = data[key]
 
-            def fix_blossom(single_type: Type[BlossomSerializable], single_data: dict):
-                nonlocal needs_save
-                single_data, save_nodes = single_type._fix_data(single_data, father_nodes=current_nodes)
+            if field.sub_plan is not None and isinstance(value, dict):
+                value, save_nodes = field.sub_plan.fix(value, node_name + '.')
                 needs_save += save_nodes
-                return single_data
-
-            if get_origin(target_type) is None and issubclass(target_type, BlossomSerializable):
-                value = fix_blossom(target_type, value)
-            else:
+            elif field.sub_plan is not None or not field.check(value):
+                needs_save.append(node_name)
+                if not field.has_default:
+                    continue
                 try:
-                    value = deserialize(value, target_type, error_at_redundancy=True)
-                except (ValueError, TypeError):
-                    needs_save.append(node_name)
-                    if key not in default_data.keys():
-                        continue
-                    if isinstance(target_type, Serializable):
-                        value = target_type.get_default().serialize()
-                    else:
-                        try:
-                            value = target_type(value)
-                        except:
-                            value = default_data[key]
+                    if field.sub_plan is not None or not isinstance(field.target_type, type):
+                        raise TypeError('Type {} cannot be constructed from value'.format(field.target_type))
+                    value = field.target_type(value)
+                except:
+                    value = copy.deepcopy(field.default)
             fixed_dict[key] = value
         return fixed_dict, needs_save
 
 
+class BlossomSerializable(Serializable):
+    @classmethod
+    @functools.lru_cache()
+    def _get_validator_plan(cls) -> _ValidatorPlan:
+        return _ValidatorPlan(cls)
+
+    @classmethod
+    def _fix_data(
+            cls,
+            data: dict,
+            *,
+            father_nodes: Optional[List[str]] = None,
+            only_keys: Optional[Collection[str]] = None
+    ) -> Tuple[dict, List[str]]:
+        """
+        Fix data with default values, only the fields in only_keys are validated and returned if specified
+        """
+        node_prefix = '' if not father_nodes else '.'.join(father_nodes) + '.'
+        return cls._get_validator_plan().fix(data, node_prefix, only_keys)
+
+
 class ConfigurationBase(BlossomSerializable):
-    __rt_yaml = yaml.YAML(typ='rt')
-    __safe_yaml = yaml.YAML(typ='safe')
-    for item in (__rt_yaml, __safe_yaml):  # type: yaml.YAML
-        item.width = 1048576
-        item.indent(2, 2, 2)
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def get_yaml(typ: str) -> yaml.YAML:
+        """
+        Built on first use, so that loading the plugin does not construct instances that may never be used
+        """
+        yaml_inst = yaml.YAML(typ=typ)
+        yaml_inst.width = 1048576
+        yaml_inst.indent(2, 2, 2)
+        return yaml_inst
 
     def __init__(self, **kwargs):
         self.__file_path = None
         self.__bundled_template_path = None
         self.__reloader: Optional[CommandSource] = None
         self.__plugin_inst: Optional["MyPlugin"] = None
+        self.__file_state: Optional[ConfigFileState] = None
+        self.__raw_data: Optional[dict] = None
+        self.__serialized: Optional[dict] = None
+        # Round-trip parsed file content, reused by save() to keep comments without re-reading the file
+        self.__formatted_data: Optional[yaml.CommentedMap] = None
+        self.__change_notifier = ConfigChangeNotifier()
         super().__init__(**kwargs)
 
     def set_reloader(self, source: Optional[CommandSource] = None):
@@ -87,10 +289,42 @@ class ConfigurationBase(BlossomSerializable):
     def reloader(self):
         return self.__reloader
 
+    @property
+    def change_notifier(self) -> ConfigChangeNotifier:
+        return self.__change_notifier
+
+    def add_change_listener(self, callback: Callable[[List[str]], Any], *nodes: str):
+        self.__change_notifier.add_listener(callback, *nodes)
+
+    def __record_file_state(
+            self,
+            raw_data: Optional[dict],
+            text: str,
+            formatted_data: Optional[yaml.CommentedMap] = None,
+            encoding: str = 'utf8'
+    ):
+        state = ConfigFileState.of(self.__file_path)
+        if state is not None:
+            state = state._replace(digest=ConfigFileState.get_digest(text, encoding))
+        self.__file_state = state
+        self.__raw_data = raw_data
+        self.__formatted_data = formatted_data
+        self.__serialized = self.serialize()
+
+    @classmethod
+    def __parse(cls, string: str) -> Tuple[dict, yaml.CommentedMap]:
+        """
+        Parse once with the round-trip loader, returns the plain data and the comment-preserving map
+        """
+        formatted_data = cls.get_yaml('rt').load(string)
+        if not isinstance(formatted_data, dict):
+            raise TypeError('Config file root is not a mapping')
+        return yaml_to_builtin(formatted_data), formatted_data
+
     def get_template(self) -> yaml.CommentedMap:
         try:
-            with self.__plugin_inst.server.open_bundled_file(self.__bundled_template_path) as f:
-                return self.__rt_yaml.load(f)
+            with self.__plugin_inst.open_bundled_file(self.__bundled_template_path) as f:
+                return self.get_yaml('rt').load(f)
         except Exception as e:
             self.logger.warning("Template not found, is plugin modified?", exc_info=e)
             return yaml.CommentedMap()
@@ -124,13 +358,14 @@ class ConfigurationBase(BlossomSerializable):
 
         default_config = cls.get_default().serialize()
         needs_save = False
+        read_data, string, formatted_data = None, None, None
         if in_data_folder:
             file_path = os.path.join(plugin_inst.get_data_folder(), file_path)
 
         # Load & Fix data
         try:
             string = FileUtils.lf_read(file_path, encoding=encoding)
-            read_data: dict = cls.__safe_yaml.load(string)
+            read_data, formatted_data = cls.__parse(string)
         except:
             # Reading failed, remove current file
             FileUtils.delete(file_path)
@@ -154,14 +389,84 @@ class ConfigurationBase(BlossomSerializable):
             log("Fail to read config file, using default config")
 
         result_config.set_config_attr(file_path, plugin_inst, bundled_template_path=bundled_template_path)
+        result_config.__formatted_data = formatted_data
         if needs_save:
             # Saving config
             result_config.save(encoding=encoding, print_to_console=print_to_console, source_to_reply=source_to_reply)
+        else:
+            result_config.__record_file_state(read_data, string, formatted_data, encoding=encoding)
 
         result_config.after_load(plugin_inst)
         log('server_interface.load_config_simple', _lb_rtr_prefix='', _lb_tr_default_fallback='Config loaded')
         return result_config
 
+    def reload(
+            self,
+            print_to_console: bool = True,
+            source_to_reply: Optional[CommandSource] = None,
+            encoding: str = 'utf8'
+    ) -> List[str]:
+        """
+        Apply changes of the config file to this instance in place.
+        Nothing is read if file mtime and size are unchanged, nothing is parsed if content digest is unchanged,
+        and only the top-level sections that differ from the last read are validated.
+        Listeners affected by the changed nodes are notified
+        :return: Changed node paths
+        """
+        def log(translation_key, *args, _lb_rtr_prefix=TRANSLATION_KEY_PREFIX + 'config.', **kwargs):
+            text = self.__plugin_inst.ktr(translation_key, *args, _lb_rtr_prefix=_lb_rtr_prefix, **kwargs)
+            if print_to_console:
+                self.logger.info(text)
+            if source_to_reply is not None:
+                source_to_reply.reply(text)
+
+        # Keep current config if the file is gone, it will be rewritten on next save
+        state, string = ConfigFileState.read_changed(self.__file_path, self.__file_state, encoding)
+        self.__file_state = state
+        if string is None:
+            return []
+
+        try:
+            read_data, formatted_data = self.__parse(string)
+        except Exception as e:
+            # Do not wipe a running config for a half-written or broken edit
+            self.logger.warning('Failed to read modified config file, keeping current config', exc_info=e)
+            return []
+
+        old_raw, old_serialized = self.__raw_data or {}, self.__serialized or self.serialize()
+        changed_keys = diff_sections(old_raw, read_data, self.get_field_annotations().keys())
+        self.__raw_data, self.__formatted_data = read_data, formatted_data
+        if len(changed_keys) == 0:
+            return []
+
+        fixed_data, nodes_require_save = self._fix_data(read_data, only_keys=changed_keys)
+        new_data = {key: value for key, value in old_serialized.items() if key not in changed_keys}
+        new_data.update(fixed_data)
+        try:
+            new_config = self.deserialize(new_data)
+        except (TypeError, ValueError) as e:
+            self.logger.warning('Failed to apply modified config file, keeping current config', exc_info=e)
+            return []
+        if len(nodes_require_save) > 0:
+            log("Fixed invalid config keys with default values, please confirm these values: ")
+            log(', '.join(nodes_require_save))
+
+        for key in self.get_field_annotations().keys():
+            if hasattr(new_config, key):
+                setattr(self, key, getattr(new_config, key))
+            elif key in vars(self).keys():
+                delattr(self, key)
+        new_serialized = self.serialize()
+        changed_nodes = diff_serialized(old_serialized, new_serialized)
+        self.__serialized = new_serialized
+        if len(nodes_require_save) > 0:
+            self.save(encoding=encoding, print_to_console=print_to_console, source_to_reply=source_to_reply)
+
+        if len(changed_nodes) > 0:
+            self.after_load(self.__plugin_inst)
+            self.__change_notifier.notify(changed_nodes)
+        return changed_nodes
+
     def save(
             self,
             encoding: str = 'utf8',
@@ -176,36 +481,30 @@ class ConfigurationBase(BlossomSerializable):
                 source_to_reply.reply(text)
 
         file_path = self.__file_path
-        config_temp_path = os.path.join(os.path.dirname(file_path), f"temp_{os.path.basename(file_path)}")
-
         if os.path.isdir(file_path):
             shutil.rmtree(file_path)
 
-        def _save(safe_dump: bool = False):
-            if os.path.exists(config_temp_path):
-                FileUtils.delete(config_temp_path)
-
-            config_content = self.serialize()
-            if safe_dump:
-                with FileUtils.safe_write(file_path, encoding=encoding) as f:
-                    self.__safe_yaml.dump(config_content, f)
-                self.logger.warning("Validation during config file saving failed, saved without original format")
-            else:
-                formatted_config: yaml.CommentedMap
-                if os.path.isfile(file_path):
-                    formatted_config = self.__rt_yaml.load(FileUtils.lf_read(file_path, encoding=encoding))
-                else:
-                    formatted_config = self.get_template()
-                for key, value in config_content.items():
-                    formatted_config[key] = value
-                with FileUtils.safe_write(config_temp_path, encoding=encoding) as f:
-                    self.__rt_yaml.dump(formatted_config, f)
-                try:
-                    self.deserialize(self.__safe_yaml.load(FileUtils.lf_read(config_temp_path, encoding=encoding)))
-                except (TypeError, ValueError):
-                    log("Attempting saving config with original file format due to validation failure while attempting saving config and keep local config file format")
-                    log("There may be mistakes in original config file format, please contact plugin maintainer")
-                    _save(safe_dump=True)
-                else:
-                    os.replace(config_temp_path, file_path)
-        _save()
+        config_content = self.serialize()
+        formatted_config: Optional[yaml.CommentedMap] = self.__formatted_data
+        text = None
+        try:
+            # Validate in memory instead of parsing the dumped file again
+            self.deserialize(config_content)
+            if formatted_config is None:
+                formatted_config = self.get_template()
+            for key, value in config_content.items():
+                formatted_config[key] = value
+            self.deserialize(yaml_to_builtin(formatted_config))
+            text = MiscTools.yaml_dump_to_string(formatted_config, yaml_inst=self.get_yaml('rt'))
+        except Exception as e:
+            self.logger.debug('Round-trip config dump failed: {}'.format(e))
+            log("Attempting saving config with original file format due to validation failure while attempting saving config and keep local config file format")
+            log("There may be mistakes in original config file format, please contact plugin maintainer")
+
+        if text is None:
+            formatted_config = None
+            text = MiscTools.yaml_dump_to_string(config_content, yaml_inst=self.get_yaml('safe'))
+            self.logger.warning("Validation during config file saving failed, saved without original format")
+        with FileUtils.safe_write(file_path, encoding=encoding) as f:
+            f.write(text)
+        self.__record_file_state(config_content, text, formatted_config, encoding=encoding)
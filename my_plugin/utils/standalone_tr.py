@@ -1,9 +1,10 @@
 import contextlib
+import functools
 import json
 import os
-import re
+import string
 from threading import RLock
-from typing import Optional, List, Dict, Union, TYPE_CHECKING
+from typing import Optional, List, Dict, Union, Tuple, Any, TYPE_CHECKING
 
 from mcdreforged.api.rtext import *
 from mcdreforged.api.types import ServerInterface
@@ -12,22 +13,197 @@ from ruamel.yaml import YAML
 from my_plugin.constants import PLUGIN_ID
 from my_plugin.generic import MessageText
 from my_plugin.utils.file_util import FileUtils
+from my_plugin.utils.help_message import HelpMessageRenderer
 
 if TYPE_CHECKING:
     from my_plugin.my_plugin import MyPlugin
 
 _NONE = object()
+_MISSING = object()
+# Arg types that are never RText, checked before the slower abc isinstance check against RTextBase
+_PLAIN_ARG_TYPES = frozenset((str, int, float, bool))
+
+
+def _has_rtext_arg(args: tuple, kwargs: dict) -> bool:
+    for value in args:
+        if type(value) not in _PLAIN_ARG_TYPES and isinstance(value, RTextBase):
+            return True
+    for value in kwargs.values():
+        if type(value) not in _PLAIN_ARG_TYPES and isinstance(value, RTextBase):
+            return True
+    return False
+
+
+class TranslationTemplate:
+    """
+    A translation formatter parsed once into literal segments and placeholder slots.
+    Plain args are rendered by str.format, which is faster than joining the pieces in python,
+    the slots place RText args without the round trip of RTextBase.format.
+    Formatters str.format could not handle by plain slot lookup (attribute / index access, nested format specs,
+    malformed braces, mixed field numbering) are kept as is and rendered with RTextBase.format
+    """
+    __slots__ = ('source', 'literal', 'pieces', 'is_simple', 'has_placeholder')
+    __formatter = string.Formatter()
+
+    def __init__(self, source: str):
+        self.source = source
+        # Literal pieces are str, placeholder pieces are (arg index or kwarg name, conversion, format spec)
+        self.pieces: List[Union[str, Tuple[Union[int, str], Optional[str], str]]] = []
+        self.is_simple = True
+        self.has_placeholder = False
+        try:
+            self.__parse()
+        except ValueError:
+            self.pieces, self.is_simple, self.has_placeholder = [source], False, True
+        # Text with escaped braces resolved, only meaningful without placeholders
+        self.literal = ''.join(self.pieces) if not self.has_placeholder else source
+
+    def __parse(self):
+        auto_index = 0
+        manual_numbering = False
+        for literal, field_name, format_spec, conversion in self.__formatter.parse(self.source):
+            if len(literal) > 0:
+                self.pieces.append(literal)
+            if field_name is None:
+                continue
+            self.has_placeholder = True
+            if field_name == '':
+                field = auto_index
+                auto_index += 1
+            elif field_name.isdigit():
+                field = int(field_name)
+                manual_numbering = True
+            elif field_name.isidentifier():
+                field = field_name
+            else:
+                field = None
+            if field is None or '{' in format_spec:
+                self.is_simple = False
+                continue
+            self.pieces.append((field, conversion, format_spec))
+        if auto_index > 0 and manual_numbering:
+            # Mixed automatic and manual field numbering, leave the error to str.format
+            self.is_simple = False
+
+    @classmethod
+    @functools.lru_cache(maxsize=256)
+    def of(cls, source: str) -> "TranslationTemplate":
+        return cls(source)
+
+    @staticmethod
+    def __convert(value: Any, conversion: Optional[str], format_spec: str) -> str:
+        if conversion == 'r':
+            value = repr(value)
+        elif conversion == 'a':
+            value = ascii(value)
+        elif conversion == 's':
+            value = str(value)
+        return format(value, format_spec)
+
+    def format(self, *args, **kwargs) -> str:
+        if not self.has_placeholder:
+            return self.literal
+        return self.source.format(*args, **kwargs)
+
+    def rtext_format(self, *args, **kwargs) -> MessageText:
+        if not self.has_placeholder:
+            return self.literal
+        if not self.is_simple:
+            return RTextBase.format(self.source, *args, **kwargs)
+        result, buffer = [], []
+        for piece in self.pieces:
+            if isinstance(piece, str):
+                buffer.append(piece)
+                continue
+            field, conversion, format_spec = piece
+            value = args[field] if isinstance(field, int) else kwargs[field]
+            if isinstance(value, RTextBase) and conversion is None and format_spec == '':
+                if len(buffer) > 0:
+                    result.append(''.join(buffer))
+                    buffer = []
+                result.append(value)
+            else:
+                buffer.append(self.__convert(value, conversion, format_spec))
+        if len(buffer) > 0:
+            result.append(''.join(buffer))
+        return RTextList(*result)
+
+
+class _TranslationTable:
+    """
+    Flattened translations, one tuple slot per language, plus the memoized (key, language) resolutions.
+    Instances are never mutated after construction except for the resolution cache,
+    writers build a new table and swap it in so readers need no lock
+    """
+    __slots__ = ('order', 'languages', 'slots', 'entries', 'resolved')
+
+    def __init__(
+            self,
+            order: Tuple[str, ...],
+            languages: Tuple[str, ...],
+            entries: Dict[str, tuple]
+    ):
+        self.order = order
+        self.languages = languages
+        self.slots = {lang: index for index, lang in enumerate(languages)}
+        self.entries = entries
+        self.resolved: Dict[Tuple[str, Optional[str]], Any] = {}
+
+    @classmethod
+    def compile(cls, order: Tuple[str, ...], storage: Dict[str, Dict[str, Optional[str]]]) -> "_TranslationTable":
+        languages = []
+        for translations in storage.values():
+            for lang in translations.keys():
+                if lang not in languages:
+                    languages.append(lang)
+        entries = {
+            key: tuple(
+                _NONE if lang not in translations.keys() else TranslationTemplate.of(translations[lang] or '')
+                for lang in languages
+            )
+            for key, translations in storage.items()
+        }
+        return cls(order, tuple(languages), entries)
+
+    def with_order(self, order: Tuple[str, ...]) -> "_TranslationTable":
+        return _TranslationTable(order, self.languages, self.entries)
+
+    def get_order(self, language: Optional[str] = None) -> Tuple[str, ...]:
+        if language is None or (len(self.order) > 0 and self.order[0] == language):
+            return self.order
+        return (language,) + tuple(lang for lang in self.order if lang != language)
+
+    def resolve(self, translation_key: str, language: Optional[str] = None):
+        """
+        Get the compiled template of the key, an empty one for null values and _NONE if not translated in any language
+        """
+        cache_key = (translation_key, language)
+        result = self.resolved.get(cache_key, _MISSING)
+        if result is not _MISSING:
+            return result
+        result = _NONE
+        entry = self.entries.get(translation_key)
+        if entry is not None:
+            for lang in self.get_order(language):
+                slot = self.slots.get(lang)
+                if slot is not None and entry[slot] is not _NONE:
+                    result = entry[slot]
+                    break
+        self.resolved[cache_key] = result
+        return result
 
 
 class BlossomTranslator:
     PATH = 'resources/lang'
-    yaml = YAML(typ='safe')
+    HELP_CACHE_SIZE = 32
 
     def __init__(self, plugin_inst: "MyPlugin"):
         self.__inst = plugin_inst
         self.__storage = {}
         self.__lock = RLock()
         self.__language_translate_order = ['en_us']
+        self.__table: Optional[_TranslationTable] = None
+        self.__help_renderer = HelpMessageRenderer(self.ntr, self.rtr, self.HELP_CACHE_SIZE)
         self.__initialized = False
         self.__translation_key_prefix = None
         psi = ServerInterface.psi_opt()
@@ -38,11 +214,32 @@ class BlossomTranslator:
     def logger(self):
         return self.__inst.logger
 
+    @property
+    def yaml(self) -> YAML:
+        return self.get_yaml()
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def get_yaml() -> YAML:
+        # Built on first use, json translation files do not need it
+        return YAML(typ='safe')
+
     def set_language(self, language: str):
         with self.__lock:
             if language in self.__language_translate_order:
                 self.__language_translate_order.remove(language)
             self.__language_translate_order = [language] + self.__language_translate_order
+            if self.__table is not None:
+                self.__table = self.__table.with_order(tuple(self.__language_translate_order))
+
+    def __get_table(self) -> _TranslationTable:
+        table = self.__table
+        if table is None:
+            with self.__lock:
+                if self.__table is None:
+                    self.__table = _TranslationTable.compile(tuple(self.__language_translate_order), self.__storage)
+                table = self.__table
+        return table
 
     def register_translation(self, translation_dict: Dict[str, Union[dict, str]], language: str):
         def get_full_key_value_map(
@@ -66,10 +263,14 @@ class BlossomTranslator:
             return result_dict
 
         translation_dict = get_full_key_value_map(translation_dict)
-        for key, value in translation_dict.items():
-            if key not in self.__storage.keys() or not isinstance(self.__storage[key], dict):
-                self.__storage[key] = {}
-            self.__storage[key][language] = value
+        with self.__lock:
+            for key, value in translation_dict.items():
+                if key not in self.__storage.keys() or not isinstance(self.__storage[key], dict):
+                    self.__storage[key] = {}
+                self.__storage[key][language] = value
+            # Recompiled on next lookup
+            self.__table = None
+        self.__help_renderer.invalidate()
 
     def register_translation_file(self, file_path: str, bundled: bool = True, encoding: str = 'utf8') -> bool:
         file_name = os.path.basename(file_path)
@@ -100,6 +301,7 @@ class BlossomTranslator:
             file_path = os.path.join(self.PATH, file_name)
             if not self.register_translation_file(file_path):
                 self.__inst.debug('Skipping unknown translation file {} in {}'.format(file_name, repr(self)))
+        # The lookup table is compiled on the first translation
         self.__initialized = True
 
     @property
@@ -107,18 +309,12 @@ class BlossomTranslator:
         return [PLUGIN_ID]
 
     def has_translation(self, translation_key: str, override_language: Optional[str] = None):
-        trans = self.__storage.get(translation_key)
-        if isinstance(trans, dict):
-            with self.language_context(override_language):
-                for lang in self.__language_translate_order:
-                    if lang in trans.keys():
-                        return True
-        return False
+        return self.__get_table().resolve(translation_key, override_language) is not _NONE
 
     @contextlib.contextmanager
     def language_context(self, language: Optional[str]):
         with self.__lock:
-            language_order = self.__language_translate_order
+            language_order, table = self.__language_translate_order, self.__table
             self.__language_translate_order = self.__language_translate_order.copy()
             try:
                 if language is not None:
@@ -126,6 +322,11 @@ class BlossomTranslator:
                 yield
             finally:
                 self.__language_translate_order = language_order
+                if self.__table is not None:
+                    if table is not None and table.entries is self.__table.entries:
+                        self.__table = table
+                    else:
+                        self.__table = self.__table.with_order(tuple(language_order))
 
     def translate_from_storage(self, translations: Dict[str, str]) -> MessageText:
         translated_formatter, default = None, _NONE
@@ -137,26 +338,31 @@ class BlossomTranslator:
             translated_formatter = default
         return translated_formatter
 
-    def __dtr(self, translation_dict: Dict[str, str], *args, **kwargs):
+    def __resolve_dict(self, translation_dict: Dict[str, str], language: Optional[str] = None):
         translated_formatter = _NONE
-        for lang in self.__language_translate_order:
+        for lang in self.__get_table().get_order(language):
             translated_formatter = translation_dict.get(lang, _NONE)
             if translated_formatter is not _NONE:
                 break
-        # Allow null value in translation files
-        if translated_formatter is None:
-            translated_formatter = ''
         if translated_formatter is _NONE:
+            return _NONE
+        # Allow null value in translation files
+        return TranslationTemplate.of(translated_formatter or '')
+
+    @staticmethod
+    def __dtr(template: Union[TranslationTemplate, Any], *args, **kwargs):
+        if template is _NONE:
             raise KeyError("Translation key does not exist")
 
-        use_rtext = any([isinstance(e, RTextBase) for e in list(args) + list(kwargs.values())])
         try:
-            if use_rtext:
-                return RTextBase.format(translated_formatter, *args, **kwargs)
+            if not template.has_placeholder:
+                return template.literal
+            if _has_rtext_arg(args, kwargs):
+                return template.rtext_format(*args, **kwargs)
             else:
-                return translated_formatter.format(*args, **kwargs)
+                return template.format(*args, **kwargs)
         except Exception as e:
-            raise ValueError(f'Failed to apply args {args} and kwargs {kwargs} to translated_text {translated_formatter}: {str(e)}')
+            raise ValueError(f'Failed to apply args {args} and kwargs {kwargs} to translated_text {template.source}: {str(e)}')
 
     def ntr(
             self, translation_key: str, *args, language: Optional[str] = None, _mcdr_tr_language: Optional[str] = None,
@@ -169,45 +375,30 @@ class BlossomTranslator:
             _mcdr_tr_language = language
         if _default_fallback is None:
             _default_fallback = translation_key
-        translation_dict = self.__storage.get(translation_key, {})
-        with self.language_context(language=_mcdr_tr_language):
-            try:
-                return self.__dtr(translation_dict, *args, **kwargs)
-            except Exception as e:
-                lang_text = ', '.join([f'"{l}"' for l in self.__language_translate_order])
-                error_message = 'Error translate text "{}" to language {}: {}'.format(translation_key, lang_text, str(e))
-                if _mcdr_tr_allow_failure:
-                    if _log_error_message:
-                        self.logger.error(error_message)
-                    return _default_fallback
-                else:
-                    raise e
+        table = self.__get_table()
+        try:
+            return self.__dtr(table.resolve(translation_key, _mcdr_tr_language), *args, **kwargs)
+        except Exception as e:
+            lang_text = ', '.join([f'"{l}"' for l in table.get_order(_mcdr_tr_language)])
+            error_message = 'Error translate text "{}" to language {}: {}'.format(translation_key, lang_text, str(e))
+            if _mcdr_tr_allow_failure:
+                if _log_error_message:
+                    self.logger.error(error_message)
+                return _default_fallback
+            else:
+                raise e
 
-    def htr(self, translation_key: str, *args, _prefixes: Optional[List[str]] = None, **kwargs) -> RTextMCDRTranslation:
-        def __get_regex_result(line: str):
-            pattern = r'(?<=§7){}[\S ]*?(?=§)'
-            for prefix_tuple in _prefixes:
-                for prefix in prefix_tuple:
-                    result = re.search(pattern.format(prefix), line)
-                    if result is not None:
-                        return result
-            return None
-
-        def __htr(key: str, *inner_args, **inner_kwargs) -> MessageText:
-            original, processed = self.ntr(key, *inner_args, **inner_kwargs), []
-            if not isinstance(original, str):
-                return key
-            for line in original.splitlines():
-                result = __get_regex_result(line)
-                if result is not None:
-                    command = result.group() + ' '
-                    processed.append(RText(line).c(RAction.suggest_command, command).h(
-                        self.rtr(f'hover.suggest', command)))
-                else:
-                    processed.append(line)
-            return RTextBase.join('\n', processed)
+    def invalidate_help_cache(self):
+        self.__help_renderer.invalidate()
 
-        return self.rtr(translation_key, *args, **kwargs).set_translator(__htr)
+    def htr(self, translation_key: str, *args, _prefixes: Optional[List[str]] = None, **kwargs) -> RTextMCDRTranslation:
+        """
+        Rendered results are cached by translation key, language, prefixes and translation args
+        until the translations change or invalidate_help_cache() is called.
+        Cached texts are shared between replies, do not modify them
+        """
+        translator = self.__help_renderer.get_translator(tuple(_prefixes or ()))
+        return self.rtr(translation_key, *args, **kwargs).set_translator(translator)
 
     def get_translation_key_prefix(self, *args):
         if self.__translation_key_prefix is None:
@@ -248,9 +439,9 @@ class BlossomTranslator:
             if language is not None and _mcdr_tr_language is None:
                 _mcdr_tr_language = language
             try:
-                return self.__dtr(translation_dict, *inner_args, _mcdr_tr_language=_mcdr_tr_language, **inner_kwargs)
+                return self.__dtr(self.__resolve_dict(translation_dict, _mcdr_tr_language), *inner_args, **inner_kwargs)
             except Exception as e:
-                lang_text = ', '.join([f'"{l}"' for l in self.__language_translate_order])
+                lang_text = ', '.join([f'"{l}"' for l in self.__get_table().get_order(_mcdr_tr_language)])
                 error_message = f'Error translate text from dict to language {lang_text}: {str(e)}'
                 if _mcdr_tr_allow_failure:
                     if _log_error_message:
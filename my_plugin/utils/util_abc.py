@@ -6,7 +6,7 @@ if TYPE_CHECKING:
 
 
 class AbstractUtil:
-    _plugin_inst: Optional[MyPlugin] = None
+    _plugin_inst: Optional["MyPlugin"] = None
 
     @classmethod
     def set_plugin_instance(cls, plugin_inst: "MyPlugin"):
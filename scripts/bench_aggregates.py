@@ -0,0 +1,142 @@
+"""
+Aggregate query time of the storage index, in ms per query
+
+Compares StorageIndex.get_item_totals and get_dimension_totals, reduced over the snapshot tables with numpy and
+with the plain struct loops used without numpy, and with the naive loop over every container's item dict, the
+containers decoded from the snapshot as the index iterated them before.
+The index is a written snapshot with a small overlay of updated containers on top, as between two compactions
+
+Usage: python scripts/bench_aggregates.py [--containers 1000000] [--overlay 5000] [--repeat 3]
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from my_plugin.storage import snapshot
+from my_plugin.storage.container import ContainerPos
+from my_plugin.storage.index import StorageIndex
+from my_plugin.storage.snapshot import StorageSnapshot
+
+DIMENSIONS = ('minecraft:overworld', 'minecraft:the_nether', 'minecraft:the_end')
+ITEM_KINDS = 1200
+ITEMS_PER_CONTAINER = 2
+QUERY_ITEM = 'minecraft:item_1'
+
+
+class StubPlugin:
+    logger = logging.getLogger('bench_aggregates')
+
+    def __init__(self, data_folder: str):
+        self.__data_folder = data_folder
+
+    def get_data_folder(self) -> str:
+        return self.__data_folder
+
+    def debug(self, *args):
+        pass
+
+
+def build_records(count: int, seed: int = 0) -> Dict[ContainerPos, Dict[str, int]]:
+    rnd = random.Random(seed)
+    items = ['minecraft:item_{}'.format(i) for i in range(ITEM_KINDS)]
+    records = {}
+    while len(records) < count:
+        pos = ContainerPos(rnd.choice(DIMENSIONS), rnd.randint(-8000, 8000), rnd.randint(0, 200), rnd.randint(-8000, 8000))
+        records[pos] = {item: rnd.randint(1, 64) for item in rnd.sample(items, ITEMS_PER_CONTAINER)}
+    return records
+
+
+class NaiveIndex:
+    """
+    Containers of the snapshot and of the overlay on top of it, visited one by one
+    """
+    def __init__(self, base: StorageSnapshot, overlay: Dict[ContainerPos, Dict[str, int]]):
+        self.base = base
+        self.overlay = overlay
+
+    def iter_records(self) -> Iterator[Tuple[ContainerPos, Dict[str, int]]]:
+        for pos, items in self.base.iter_containers():
+            if pos not in self.overlay:
+                yield pos, items
+        yield from self.overlay.items()
+
+    def get_item_totals(self, dimension: Optional[str] = None) -> Dict[str, int]:
+        totals = {}
+        for pos, items in self.iter_records():
+            if dimension is not None and pos.dimension != dimension:
+                continue
+            for item, count in items.items():
+                totals[item] = totals.get(item, 0) + count
+        return totals
+
+    def get_dimension_totals(self, item_id: str) -> Dict[str, int]:
+        totals = {}
+        for pos, items in self.iter_records():
+            count = items.get(item_id)
+            if count is not None:
+                totals[pos.dimension] = totals.get(pos.dimension, 0) + count
+        return totals
+
+
+def bench(query: Callable[[], object], repeat: int) -> float:
+    query()
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        query()
+    return (time.perf_counter() - started_at) * 1000 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark aggregate queries of the storage index')
+    parser.add_argument('--containers', type=int, default=1000000, help='Containers in the snapshot')
+    parser.add_argument('--overlay', type=int, default=5000, help='Snapshot containers updated after the snapshot was written')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement')
+    args = parser.parse_args()
+
+    records = build_records(args.containers)
+    with tempfile.TemporaryDirectory() as data_folder:
+        index = StorageIndex(StubPlugin(data_folder))
+        StorageSnapshot.write(index.file_path, records.items())
+        index.load()
+        overlay = {pos: {QUERY_ITEM: 5} for pos in list(records.keys())[:args.overlay]}
+        del records
+        index.apply_changes(overlay)
+        naive = NaiveIndex(StorageSnapshot(index.file_path), overlay)
+
+        queries = {
+            'item totals': (lambda: index.get_item_totals(), lambda: naive.get_item_totals()),
+            'item totals, overworld': (
+                lambda: index.get_item_totals(DIMENSIONS[0]), lambda: naive.get_item_totals(DIMENSIONS[0])
+            ),
+            'one item per dimension': (
+                lambda: index.get_dimension_totals(QUERY_ITEM), lambda: naive.get_dimension_totals(QUERY_ITEM)
+            ),
+        }
+        numpy_module = snapshot.np
+        print('{:,} containers, {:,} in the overlay{}'.format(
+            args.containers, args.overlay, '' if numpy_module is not None else ', numpy is not installed'
+        ))
+        print('{:<24} {:>12} {:>12} {:>12}'.format('query', 'numpy ms', 'fallback ms', 'naive ms'))
+        for name, (query, naive_query) in queries.items():
+            if query() != naive_query():
+                raise AssertionError('{}: index and naive loop disagree'.format(name))
+            numpy_ms = '{:,.1f}'.format(bench(query, args.repeat)) if numpy_module is not None else 'n/a'
+            snapshot.np = None
+            try:
+                fallback_ms = bench(query, args.repeat)
+            finally:
+                snapshot.np = numpy_module
+            print('{:<24} {:>12} {:>12,.1f} {:>12,.1f}'.format(name, numpy_ms, fallback_ms, bench(naive_query, args.repeat)))
+        naive.base.close()
+        index.close()
+
+
+if __name__ == '__main__':
+    main()
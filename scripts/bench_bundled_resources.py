@@ -0,0 +1,131 @@
+"""
+Bundled resource access time of a packed plugin
+
+Builds a test .mcdr archive holding the plugin sources, the language files and hundreds of item name tables,
+then compares BundledResources, which indexes the archive once and keeps one handle open, with the previous
+access pattern, which reopened the archive and scanned all its entries for every listing and every read
+
+Usage: python scripts/bench_bundled_resources.py [--tables 400] [--names 1500] [--repeat 5]
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import timeit
+import zipfile
+from typing import Callable, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from my_plugin.utils.bundled_resources import BundledResources
+
+TABLE_DIRECTORY = 'resources/item_names'
+
+
+def build_package(file_path: str, tables: int, names: int):
+    with zipfile.ZipFile(file_path, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        for directory in ('my_plugin', 'lang'):
+            for root, _, files in os.walk(os.path.join(REPO_ROOT, directory)):
+                for file_name in files:
+                    if file_name.endswith(('.py', '.yml', '.json')):
+                        path = os.path.join(root, file_name)
+                        zip_file.write(path, os.path.relpath(path, REPO_ROOT).replace(os.sep, '/'))
+        table = json.dumps({'item.minecraft.item_{}'.format(i): 'Item {}'.format(i) for i in range(names)})
+        for i in range(tables):
+            zip_file.writestr('{}/lang_{:03d}.json'.format(TABLE_DIRECTORY, i), table)
+        zip_file.writestr('resources/default_cfg.yml', 'command_prefix: "!!template"\n')
+
+
+class ReopeningResources:
+    """
+    The access pattern before BundledResources, the archive is opened again for every call
+    """
+    def __init__(self, package_path: str):
+        self.package_path = package_path
+
+    def list_dir(self, directory_name: str) -> List[str]:
+        with zipfile.ZipFile(self.package_path, 'r') as zip_file:
+            result = []
+            directory_name = directory_name.replace('\\', '/').rstrip('/\\') + '/'
+            for file_info in zip_file.infolist():
+                if file_info.filename.startswith(directory_name):
+                    file_name = file_info.filename.replace(directory_name, '', 1)
+                    if len(file_name) > 0 and '/' not in file_name.rstrip('/'):
+                        result.append(file_name)
+            return result
+
+    def read(self, file_path: str) -> bytes:
+        with zipfile.ZipFile(self.package_path, 'r') as zip_file:
+            return io.BytesIO(zip_file.read(file_path)).read()
+
+
+def bench(action: Callable[[], object], number: int, repeat: int) -> float:
+    """
+    :return: Best ms per call
+    """
+    return min(timeit.repeat(action, number=number, repeat=repeat)) / number * 1000
+
+
+def read_all_tables(resources) -> int:
+    size = 0
+    for file_name in resources.list_dir(TABLE_DIRECTORY):
+        size += len(resources.read('{}/{}'.format(TABLE_DIRECTORY, file_name)))
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark bundled resource listings and reads of a packed plugin')
+    parser.add_argument('--tables', type=int, default=400, help='Item name tables in the archive')
+    parser.add_argument('--names', type=int, default=1500, help='Names per table')
+    parser.add_argument('--repeat', type=int, default=5, help='Repeats per measurement, the best one is shown')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        package_path = os.path.join(temp_dir, 'my_plugin.mcdr')
+        build_package(package_path, args.tables, args.names)
+        with zipfile.ZipFile(package_path, 'r') as zip_file:
+            entries = len(zip_file.infolist())
+        print('{:,} entries, {:.1f} MiB'.format(entries, os.path.getsize(package_path) / 2 ** 20))
+
+        previous, current = ReopeningResources(package_path), BundledResources(package_path)
+        for directory in ('lang', TABLE_DIRECTORY):
+            if sorted(previous.list_dir(directory)) != sorted(current.list_dir(directory)):
+                raise AssertionError('Listings of {} disagree'.format(directory))
+        if read_all_tables(previous) != read_all_tables(current):
+            raise AssertionError('Read contents disagree')
+
+        def read_all_tables_indexed() -> int:
+            resources = BundledResources(package_path)
+            try:
+                return read_all_tables(resources)
+            finally:
+                resources.close()
+
+        print('{:<32} {:>12} {:>12}'.format('operation', 'before ms', 'after ms'))
+        print('{:<32} {:>12} {:>12,.3f}'.format(
+            'build the index', '-', bench(lambda: BundledResources(package_path).close(), 20, args.repeat)
+        ))
+        for directory in ('lang', TABLE_DIRECTORY):
+            print('{:<32} {:>12,.3f} {:>12,.4f}'.format(
+                'list {}'.format(directory),
+                bench(lambda: previous.list_dir(directory), 20, args.repeat),
+                bench(lambda: current.list_dir(directory), 2000, args.repeat)
+            ))
+        print('{:<32} {:>12,.3f} {:>12,.3f}'.format(
+            'read lang/en_us.yml',
+            bench(lambda: previous.read('lang/en_us.yml'), 20, args.repeat),
+            bench(lambda: current.read('lang/en_us.yml'), 200, args.repeat)
+        ))
+        print('{:<32} {:>12,.1f} {:>12,.1f}'.format(
+            'list and read all tables, cold',
+            bench(lambda: read_all_tables(previous), 1, args.repeat),
+            bench(read_all_tables_indexed, 1, args.repeat)
+        ))
+        current.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Config save time of ConfigurationBase, in ms per save
+
+Saves a config holding thousands of dict entries under a header comment, comparing the single pass save with the
+previous one, which parsed the file again with the round-trip loader, dumped into a temp file, parsed that file
+back for validation, renamed it and read the result once more for the change digest.
+Both have to keep the header comment and write the same data
+
+Usage: python scripts/bench_config_save.py [--entries 3000] [--repeat 5]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import timeit
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from my_plugin.utils.file_util import FileUtils
+from my_plugin.utils.serializer import BlossomSerializable, ConfigurationBase, ConfigFileState
+
+HEADER = '# header comment\n'
+
+
+class StubPlugin:
+    logger = logging.getLogger('bench_config_save')
+    logger.disabled = True
+
+    def __init__(self, data_folder: str):
+        self.__data_folder = data_folder
+
+    def get_data_folder(self) -> str:
+        return self.__data_folder
+
+    @staticmethod
+    def ktr(translation_key: str, *args, **kwargs) -> str:
+        return translation_key
+
+    @staticmethod
+    def open_bundled_file(file_path: str):
+        raise FileNotFoundError(file_path)
+
+
+class PermissionRequirements(BlossomSerializable):
+    reload: int = 3
+
+
+class BenchConfiguration(ConfigurationBase):
+    command_prefix: List[str] = ['!!template']
+    permission_requirements: PermissionRequirements = PermissionRequirements.get_default()
+    ratio: float = 0.5
+    items: Dict[str, int] = {}
+    names: Dict[str, str] = {}
+
+
+def previous_save(config: BenchConfiguration, file_path: str, encoding: str = 'utf8'):
+    """
+    The save before the single pass, without its safe dump fallback
+    """
+    rt_yaml, safe_yaml = ConfigurationBase.get_yaml('rt'), ConfigurationBase.get_yaml('safe')
+    config_temp_path = os.path.join(os.path.dirname(file_path), f"temp_{os.path.basename(file_path)}")
+    if os.path.exists(config_temp_path):
+        FileUtils.delete(config_temp_path)
+
+    config_content = config.serialize()
+    formatted_config = rt_yaml.load(FileUtils.lf_read(file_path, encoding=encoding))
+    for key, value in config_content.items():
+        formatted_config[key] = value
+    with FileUtils.safe_write(config_temp_path, encoding=encoding) as f:
+        rt_yaml.dump(formatted_config, f)
+    config.deserialize(safe_yaml.load(FileUtils.lf_read(config_temp_path, encoding=encoding)))
+    os.replace(config_temp_path, file_path)
+
+    # File state recording read the written file back for the digest
+    ConfigFileState.get_digest(FileUtils.lf_read(file_path, encoding=encoding), encoding)
+    config.serialize()
+
+
+def read_saved(file_path: str) -> dict:
+    text = FileUtils.lf_read(file_path)
+    if not text.startswith(HEADER):
+        raise AssertionError('Header comment of {} is lost'.format(file_path))
+    return ConfigurationBase.get_yaml('safe').load(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark saving a large config of ConfigurationBase')
+    parser.add_argument('--entries', type=int, default=3000, help='Entries of each of the two dict fields')
+    parser.add_argument('--repeat', type=int, default=5, help='Repeats per measurement, the best one is shown')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_folder:
+        plugin = StubPlugin(data_folder)
+        config = BenchConfiguration.load(plugin, print_to_console=False)
+        config.items = {'minecraft:item_{}'.format(i): i for i in range(args.entries)}
+        config.names = {'minecraft:item_{}'.format(i): 'Item {}'.format(i) for i in range(args.entries)}
+        config.save(print_to_console=False)
+        file_path = os.path.join(data_folder, 'config.yml')
+        with FileUtils.safe_write(file_path) as f:
+            f.write(HEADER + FileUtils.lf_read(file_path))
+        config = BenchConfiguration.load(plugin, print_to_console=False)
+        config.ratio = 0.75
+
+        expected = config.serialize()
+        previous_save(config, file_path)
+        if read_saved(file_path) != expected:
+            raise AssertionError('Previous save wrote different data')
+        config.save(print_to_console=False)
+        if read_saved(file_path) != expected:
+            raise AssertionError('Single pass save wrote different data')
+
+        print('{:,} dict entries, {:.1f} KiB'.format(2 * args.entries, os.path.getsize(file_path) / 1024))
+        print('{:<12} {:>12}'.format('save', 'ms'))
+        timings = {'previous': float('inf'), 'single pass': float('inf')}
+        # Interleaved, so that drifting machine load affects both alike
+        for _ in range(args.repeat):
+            timings['previous'] = min(timings['previous'], timeit.timeit(lambda: previous_save(config, file_path), number=1))
+            timings['single pass'] = min(timings['single pass'], timeit.timeit(lambda: config.save(print_to_console=False), number=1))
+        for name, seconds in timings.items():
+            print('{:<12} {:>12,.1f}'.format(name, seconds * 1000))
+
+
+if __name__ == '__main__':
+    main()
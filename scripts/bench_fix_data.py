@@ -0,0 +1,174 @@
+"""
+Config validation time of BlossomSerializable._fix_data, in ms per call
+
+Builds deep and wide trees of nested serializable classes, corrupts their default data at random and compares the
+compiled validator plans with the previous implementation, which reflected on the annotations, constructed the
+defaults and ran deserialize() on every field for every call. Both have to report the same node paths and fix
+the data to the same config
+
+Usage: python scripts/bench_fix_data.py [--documents 20] [--calls 20] [--repeat 5]
+"""
+import argparse
+import copy
+import itertools
+import os
+import random
+import sys
+import timeit
+from typing import Collection, Dict, List, Literal, Optional, Tuple, Type, get_origin
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mcdreforged.api.utils import Serializable, deserialize
+
+from my_plugin.utils.serializer import BlossomSerializable
+
+# (depth, width) of the class trees
+SHAPES = ((3, 3), (1, 60), (5, 2))
+FIELDS = {
+    'flag': (bool, True),
+    'count': (int, 1),
+    'ratio': (float, 0.5),
+    'name': (str, 'name'),
+    'tags': (List[str], ['tag']),
+    'limit': (Optional[int], None),
+    'mapping': (Dict[str, int], {'key': 1}),
+    'mode': (Literal['a', 'b'], 'a'),
+}
+_class_ids = itertools.count()
+
+
+class ReflectingSerializable(Serializable):
+    """
+    The _fix_data before the validator plans
+    """
+    @classmethod
+    def _fix_data(
+            cls,
+            data: dict,
+            *,
+            father_nodes: Optional[List[str]] = None,
+            only_keys: Optional[Collection[str]] = None
+    ) -> Tuple[dict, List[str]]:
+        needs_save = list()
+        annotations = cls.get_field_annotations()
+        default_data = cls.get_default().serialize()
+        if father_nodes is None:
+            father_nodes = []
+        fixed_dict = {}
+
+        for key, target_type in annotations.items():
+            if only_keys is not None and key not in only_keys:
+                continue
+            current_nodes = father_nodes.copy()
+            current_nodes.append(key)
+            node_name = '.'.join(current_nodes)
+            if key not in data.keys():
+                if key in default_data.keys():
+                    needs_save.append(node_name)
+                    fixed_dict[key] = default_data[key]
+                continue
+            value = data[key]
+
+            def fix_nested(single_type: Type[ReflectingSerializable], single_data: dict):
+                nonlocal needs_save
+                single_data, save_nodes = single_type._fix_data(single_data, father_nodes=current_nodes)
+                needs_save += save_nodes
+                return single_data
+
+            if get_origin(target_type) is None and issubclass(target_type, ReflectingSerializable):
+                value = fix_nested(target_type, value)
+            else:
+                try:
+                    value = deserialize(value, target_type, error_at_redundancy=True)
+                except (ValueError, TypeError):
+                    needs_save.append(node_name)
+                    if key not in default_data.keys():
+                        continue
+                    if isinstance(target_type, Serializable):
+                        value = target_type.get_default().serialize()
+                    else:
+                        try:
+                            value = target_type(value)
+                        except:
+                            value = default_data[key]
+            fixed_dict[key] = value
+        return fixed_dict, needs_save
+
+
+def make_class(base: type, depth: int, width: int) -> type:
+    """
+    :return: A class with the basic FIELDS and, unless depth is 0, width nested classes one level shallower
+    """
+    annotations = {key: target_type for key, (target_type, _) in FIELDS.items()}
+    attrs = {key: copy.deepcopy(default) for key, (_, default) in FIELDS.items()}
+    if depth > 0:
+        for i in range(width):
+            child = make_class(base, depth - 1, width)
+            annotations['child_{}'.format(i)] = child
+            attrs['child_{}'.format(i)] = child.get_default()
+    attrs['__annotations__'] = annotations
+    return type('Section{}'.format(next(_class_ids)), (base,), attrs)
+
+
+def count_classes(depth: int, width: int) -> int:
+    return sum(width ** level for level in range(depth + 1))
+
+
+def corrupt(data: dict, rnd: random.Random) -> dict:
+    """
+    Drop some fields and give others values of a wrong type, nested sections are kept as mappings
+    """
+    data = copy.deepcopy(data)
+
+    def walk(section: dict):
+        for key in list(section.keys()):
+            if key.startswith('child_'):
+                walk(section[key])
+                continue
+            roll = rnd.random()
+            if roll < 0.05:
+                del section[key]
+            elif roll < 0.1:
+                section[key] = 'bad'
+            elif roll < 0.13:
+                section[key] = 3
+    walk(data)
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark BlossomSerializable._fix_data over nested config classes')
+    parser.add_argument('--documents', type=int, default=20, help='Corrupted documents checked per shape')
+    parser.add_argument('--calls', type=int, default=20, help='Calls per measurement')
+    parser.add_argument('--repeat', type=int, default=5, help='Repeats per measurement, the best one is shown')
+    args = parser.parse_args()
+
+    print('{:>5} {:>5} {:>7} {:>12} {:>12}'.format('depth', 'width', 'classes', 'previous ms', 'plan ms'))
+    for depth, width in SHAPES:
+        previous, current = make_class(ReflectingSerializable, depth, width), make_class(BlossomSerializable, depth, width)
+        default_data = current.get_default().serialize()
+        if previous.get_default().serialize() != default_data:
+            raise AssertionError('Default data of the class trees disagree')
+        for seed in range(args.documents):
+            data = corrupt(default_data, random.Random(seed))
+            previous_data, previous_nodes = previous._fix_data(copy.deepcopy(data))
+            current_data, current_nodes = current._fix_data(copy.deepcopy(data))
+            if previous_nodes != current_nodes:
+                raise AssertionError('Reported nodes of document {} disagree: {} {}'.format(seed, previous_nodes, current_nodes))
+            if previous.deserialize(previous_data).serialize() != current.deserialize(current_data).serialize():
+                raise AssertionError('Fixed data of document {} disagree'.format(seed))
+
+        data = corrupt(default_data, random.Random(args.documents))
+        timings = [float('inf')] * 2
+        # Interleaved, so that drifting machine load affects both alike
+        for _ in range(args.repeat):
+            for i, cls in enumerate((previous, current)):
+                timings[i] = min(timings[i], timeit.timeit(lambda: cls._fix_data(data), number=args.calls) / args.calls)
+        print('{:>5} {:>5} {:>7} {:>12,.2f} {:>12,.2f}'.format(
+            depth, width, count_classes(depth, width), timings[0] * 1000, timings[1] * 1000
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""
+Storage index throughput with millions of container entries
+
+Fills a StorageIndex with containers of a few stacks each, then times item lookups against a naive scan over every
+container, in the overlay and after compaction into the snapshot, as well as the compaction and loading the
+snapshot again. Every lookup is checked against the scan
+
+Usage: python scripts/bench_index.py [--containers 1000000] [--stacks 3] [--items 1000] [--queries 200]
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from my_plugin.storage.container import ContainerPos
+from my_plugin.storage.index import StorageIndex
+from my_plugin.storage.snapshot import StorageSnapshot
+
+DIMENSIONS = ('minecraft:overworld', 'minecraft:the_nether')
+BATCH_SIZE = 10000
+SCAN_QUERIES = 3
+
+
+class StubPlugin:
+    logger = logging.getLogger('bench_index')
+
+    def __init__(self, data_folder: str):
+        self.__data_folder = data_folder
+
+    def get_data_folder(self) -> str:
+        return self.__data_folder
+
+    def debug(self, *args):
+        pass
+
+
+def iter_batches(count: int, stacks: int, items: List[str], seed: int = 0) -> Iterable[Dict[ContainerPos, Dict[str, int]]]:
+    rnd = random.Random(seed)
+    batch = {}
+    for i in range(count):
+        pos = ContainerPos(DIMENSIONS[i & 1], rnd.randrange(-30000, 30000), rnd.randrange(-64, 320), rnd.randrange(-30000, 30000))
+        batch[pos] = {rnd.choice(items): rnd.randrange(1, 64) for _ in range(stacks)}
+        if len(batch) >= BATCH_SIZE:
+            yield batch
+            batch = {}
+    if len(batch) > 0:
+        yield batch
+
+
+def scan(containers: Iterable[Tuple[ContainerPos, Dict[str, int]]], item_id: str) -> List[Tuple[ContainerPos, int]]:
+    return [(pos, items[item_id]) for pos, items in containers if item_id in items]
+
+
+def time_lookups(index: StorageIndex, items: List[str], queries: int) -> Tuple[float, int]:
+    """
+    :return: ms per find_item call and the matches of the last call
+    """
+    started_at = time.perf_counter()
+    for i in range(queries):
+        result = index.find_item(items[i % len(items)])
+    return (time.perf_counter() - started_at) * 1000 / queries, len(result)
+
+
+def time_scan(containers: Dict[ContainerPos, Dict[str, int]], snapshot_path: Optional[str], items: List[str]) -> float:
+    """
+    :return: ms per naive scan, over the container dicts or over the containers decoded from the snapshot file
+    """
+    started_at = time.perf_counter()
+    for i in range(SCAN_QUERIES):
+        if snapshot_path is None:
+            scan(containers.items(), items[i])
+        else:
+            snapshot = StorageSnapshot(snapshot_path)
+            try:
+                scan(snapshot.iter_containers(), items[i])
+            finally:
+                snapshot.close()
+    return (time.perf_counter() - started_at) * 1000 / SCAN_QUERIES
+
+
+def check_lookups(index: StorageIndex, containers: Dict[ContainerPos, Dict[str, int]], items: List[str]):
+    for item_id in items[:SCAN_QUERIES]:
+        found = sorted((location.pos, location.count) for location in index.find_item(item_id))
+        if found != sorted(scan(containers.items(), item_id)):
+            raise AssertionError('find_item({}) and the naive scan disagree'.format(item_id))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the storage index with millions of container entries')
+    parser.add_argument('--containers', type=int, default=1000000, help='Containers to index')
+    parser.add_argument('--stacks', type=int, default=3, help='Item stacks per container')
+    parser.add_argument('--items', type=int, default=1000, help='Distinct item ids')
+    parser.add_argument('--queries', type=int, default=200, help='find_item calls per measurement')
+    args = parser.parse_args()
+
+    items = ['minecraft:item_{}'.format(i) for i in range(args.items)]
+    containers: Dict[ContainerPos, Dict[str, int]] = {}
+    with tempfile.TemporaryDirectory() as data_folder:
+        plugin = StubPlugin(data_folder)
+        index = StorageIndex(plugin)
+        started_at = time.perf_counter()
+        for batch in iter_batches(args.containers, args.stacks, items):
+            index.apply_changes(batch)
+            containers.update(batch)
+        insert_seconds = time.perf_counter() - started_at
+        entries = sum(len(stacks) for stacks in containers.values())
+        print('{:,} containers, {:,} entries, {:,} item ids'.format(len(containers), entries, args.items))
+        print('{:<36} {:>10,.1f} s'.format('insert in batches of {:,}'.format(BATCH_SIZE), insert_seconds))
+
+        check_lookups(index, containers, items)
+        lookup_ms, matches = time_lookups(index, items, args.queries)
+        print('{:<36} {:>10,.3f} ms ({:,} matches)'.format('find_item, overlay', lookup_ms, matches))
+        print('{:<36} {:>10,.1f} ms'.format('naive scan, overlay dicts', time_scan(containers, None, items)))
+
+        started_at = time.perf_counter()
+        index.compact()
+        print('{:<36} {:>10,.1f} s ({:,.0f} MB)'.format(
+            'compaction into the snapshot', time.perf_counter() - started_at, os.path.getsize(index.file_path) / 1e6
+        ))
+        check_lookups(index, containers, items)
+        lookup_ms, matches = time_lookups(index, items, args.queries)
+        print('{:<36} {:>10,.3f} ms ({:,} matches)'.format('find_item, snapshot', lookup_ms, matches))
+        print('{:<36} {:>10,.1f} ms'.format('naive scan, snapshot containers', time_scan(containers, index.file_path, items)))
+        index.close()
+
+        started_at = time.perf_counter()
+        reloaded = StorageIndex(plugin)
+        reloaded.load()
+        print('{:<36} {:>10,.3f} ms'.format('load', (time.perf_counter() - started_at) * 1000))
+        lookup_ms, _ = time_lookups(reloaded, items, 1)
+        print('{:<36} {:>10,.3f} ms'.format('first find_item after load', lookup_ms))
+        reloaded.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Spatial query time of the storage index, in ms per query
+
+Runs StorageIndex.get_containers_in_range, get_containers_in_box and find_nearest over containers spread across
+a square area of one dimension, a written snapshot with a small overlay of added containers on top, and compares
+them with a naive scan over every container. Every result is checked against the scan
+
+Usage: python scripts/bench_spatial.py [--containers 1000000] [--area 16000] [--overlay 2000] [--repeat 50]
+"""
+import argparse
+import heapq
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Callable, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from my_plugin.storage.container import ContainerPos
+from my_plugin.storage.index import StorageIndex
+from my_plugin.storage.snapshot import StorageSnapshot
+
+DIMENSION = 'minecraft:overworld'
+RANGE_RADIUS = 64
+BOX_SIZE = 512
+NEAREST_LIMIT = 10
+NEAREST_MAX_DISTANCE = 512
+
+
+class StubPlugin:
+    logger = logging.getLogger('bench_spatial')
+
+    def __init__(self, data_folder: str):
+        self.__data_folder = data_folder
+
+    def get_data_folder(self) -> str:
+        return self.__data_folder
+
+    def debug(self, *args):
+        pass
+
+
+def build_positions(count: int, area: int, seed: int = 0) -> List[ContainerPos]:
+    rnd = random.Random(seed)
+    half = area // 2
+    positions = set()
+    while len(positions) < count:
+        positions.add(ContainerPos(DIMENSION, rnd.randint(-half, half - 1), rnd.randint(-60, 300), rnd.randint(-half, half - 1)))
+    return list(positions)
+
+
+def bench(query: Callable[[], object], repeat: int) -> float:
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        query()
+    return (time.perf_counter() - started_at) * 1000 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark spatial queries of the storage index')
+    parser.add_argument('--containers', type=int, default=1000000, help='Containers in the snapshot')
+    parser.add_argument('--area', type=int, default=16000, help='Side of the square area holding the containers, in blocks')
+    parser.add_argument('--overlay', type=int, default=2000, help='Containers added after the snapshot was written')
+    parser.add_argument('--repeat', type=int, default=50, help='Runs per index measurement')
+    args = parser.parse_args()
+
+    positions = build_positions(args.containers, args.area)
+    with tempfile.TemporaryDirectory() as data_folder:
+        index = StorageIndex(StubPlugin(data_folder))
+        StorageSnapshot.write(index.file_path, ((pos, {'minecraft:stone': 1}) for pos in positions))
+        index.load()
+        added = [pos._replace(y=pos.y + 1) for pos in positions[:args.overlay]]
+        index.apply_changes({pos: {'minecraft:dirt': 1} for pos in added})
+        existing = set(positions)
+        positions.extend(pos for pos in added if pos not in existing)
+
+        def scan_range(x: int, y: int, z: int) -> List[ContainerPos]:
+            return sorted(pos for pos in positions if pos.distance_to(x, y, z) <= RANGE_RADIUS)
+
+        def scan_box(x1: int, z1: int, x2: int, z2: int) -> List[ContainerPos]:
+            return sorted(pos for pos in positions if x1 <= pos.x <= x2 and z1 <= pos.z <= z2)
+
+        def scan_nearest(x: int, y: int, z: int) -> List[float]:
+            distances = (pos.distance_to(x, y, z) for pos in positions)
+            nearest = heapq.nsmallest(NEAREST_LIMIT, (distance for distance in distances if distance <= NEAREST_MAX_DISTANCE))
+            return [round(distance, 6) for distance in nearest]
+
+        half = args.area // 2
+        queries = [
+            (
+                'range r={} at (100, 64, 100)'.format(RANGE_RADIUS),
+                lambda: index.get_containers_in_range(DIMENSION, 100, 64, 100, RANGE_RADIUS),
+                lambda result: sorted(pos for pos, _ in result),
+                lambda: scan_range(100, 64, 100)
+            ),
+            (
+                'box {0}x{0}'.format(BOX_SIZE),
+                lambda: index.get_containers_in_box(DIMENSION, (0, -64, 0), (BOX_SIZE - 1, 320, BOX_SIZE - 1)),
+                sorted,
+                lambda: scan_box(0, 0, BOX_SIZE - 1, BOX_SIZE - 1)
+            ),
+        ]
+        for x, y, z in ((5, 70, 5), (-half + 1, 0, half - 1), (half // 3, 100, -200)):
+            queries.append((
+                'nearest {} at ({}, {}, {})'.format(NEAREST_LIMIT, x, y, z),
+                lambda x=x, y=y, z=z: index.find_nearest(DIMENSION, x, y, z, limit=NEAREST_LIMIT, max_distance=NEAREST_MAX_DISTANCE),
+                lambda result: [round(distance, 6) for _, distance in result],
+                lambda x=x, y=y, z=z: scan_nearest(x, y, z)
+            ))
+
+        print('{:,} containers in a {:,} x {:,} area, {:,} in the overlay'.format(len(positions), args.area, args.area, len(added)))
+        print('{:<34} {:>9} {:>10} {:>10}'.format('query', 'results', 'index ms', 'scan ms'))
+        for name, query, normalize, scan in queries:
+            scan_started_at = time.perf_counter()
+            expected = scan()
+            scan_ms = (time.perf_counter() - scan_started_at) * 1000
+            result = normalize(query())
+            if result != expected:
+                raise AssertionError('{}: index and scan disagree'.format(name))
+            print('{:<34} {:>9,} {:>10,.2f} {:>10,.1f}'.format(name, len(result), bench(query, args.repeat), scan_ms))
+        index.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+Translation formatting cost of BlossomTranslator.ntr over the keys of the bundled lang files, in us per key
+
+Compares the pre-parsed TranslationTemplate with formatting the raw formatter through str.format or
+RTextBase.format on every call, both on the compiled translation table, with plain str args and with an RText arg
+
+Usage: python scripts/bench_translation_format.py [--rounds 1000] [--repeat 5]
+"""
+import argparse
+import logging
+import os
+import string
+import sys
+import timeit
+from typing import Any, Dict, List, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from mcdreforged.api.rtext import RText, RTextBase
+
+from my_plugin.utils.file_util import FileUtils
+from my_plugin.utils.standalone_tr import BlossomTranslator, TranslationTemplate
+
+# Root key of the bundled lang files
+LANG_ROOT = 'my_plugin'
+LANGUAGES = ('en_us', 'zh_cn')
+# Values of the placeholders, each key gets those its translations use
+KWARGS = {
+    'name': 'My Plugin', 'ver': '1.0.0', 'prefix': '!!template', 'id': 'my_plugin', 'item': 'minecraft:diamond',
+    'dimension': 'minecraft:overworld', 'x': 1, 'y': 64, 'z': -5, 'radius': 64, 'distance': 3.5, 'size': '1.0 MiB',
+    'count': 64, 'containers': 3, 'kinds': 2, 'chunks': 4, 'limit': 10, 'rank': 1, 'page': 1, 'pages': 3,
+    'requested': 10, 'coalesced': 1, 'dropped': 0, 'pending': 2, 'commands': 9, 'batches': 2, 'updated': 7,
+    'removed': 1, 'failed': 1, 'parse': 0.5, 'apply': 0.2, 'due': 4, 'tracked': 100, 'per_record': 54.2,
+}
+
+
+class StubPlugin:
+    logger = logging.getLogger('bench_translation_format')
+    logger.disabled = True
+
+    @staticmethod
+    def open_bundled_file(file_path: str):
+        return FileUtils.open_bundled_file(file_path)
+
+    def debug(self, *args):
+        pass
+
+
+class BundledLangTranslator(BlossomTranslator):
+    """
+    Reads the lang files of this repository, which keep their translations under the template's root key
+    """
+    PATH = 'lang'
+
+    @property
+    def allowed_keys(self):
+        return [LANG_ROOT]
+
+
+class RawFormatTranslator(BundledLangTranslator):
+    """
+    Formats the raw formatter on every call, as before the templates
+    """
+    @staticmethod
+    def _BlossomTranslator__dtr(template: Any, *args, **kwargs):
+        if not isinstance(template, TranslationTemplate):
+            raise KeyError("Translation key does not exist")
+        formatter = template.source
+        use_rtext = any([isinstance(e, RTextBase) for e in list(args) + list(kwargs.values())])
+        if use_rtext:
+            return RTextBase.format(formatter, *args, **kwargs)
+        return formatter.format(*args, **kwargs)
+
+
+def get_calls(language: str) -> Tuple[List[Tuple[str, dict]], List[Tuple[str, dict]]]:
+    """
+    :return: (key, kwargs) of the keys translated in the language, with plain str args and with an RText arg
+    """
+    calls: Dict[str, dict] = {}
+
+    def walk(data: dict, prefix: str):
+        for key, value in data.items():
+            if isinstance(value, dict):
+                walk(value, prefix + key + '.')
+            else:
+                fields = [field for _, field, _, _ in string.Formatter().parse(str(value or '')) if field]
+                calls[prefix + key] = {field: KWARGS[field] for field in fields}
+
+    data = BlossomTranslator.get_yaml().load(FileUtils.lf_read(os.path.join(REPO_ROOT, 'lang', language + '.yml')))
+    walk(data[LANG_ROOT], LANG_ROOT + '.')
+    str_calls = sorted(calls.items())
+    rtext_calls = []
+    for key, kwargs in str_calls:
+        # The first placeholder of each key gets an RText value
+        rtext_kwargs = dict(kwargs)
+        for name, value in kwargs.items():
+            rtext_kwargs[name] = RText(str(value))
+            break
+        rtext_calls.append((key, rtext_kwargs))
+    return str_calls, rtext_calls
+
+
+def to_plain(text: Any) -> str:
+    return text.to_plain_text() if isinstance(text, RTextBase) else text
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark translation formatting of BlossomTranslator')
+    parser.add_argument('--rounds', type=int, default=1000, help='Rounds over the keys per measurement')
+    parser.add_argument('--repeat', type=int, default=5, help='Repeats per measurement, the best one is shown')
+    args = parser.parse_args()
+
+    translators = {'raw format': RawFormatTranslator(StubPlugin()), 'template': BundledLangTranslator(StubPlugin())}
+    for translator in translators.values():
+        translator.register_bundled_translations()
+
+    print('{:<8} {:>5} {:<6} {:>16} {:>16}'.format('language', 'keys', 'args', 'raw format us', 'template us'))
+    for language in LANGUAGES:
+        str_calls, rtext_calls = get_calls(language)
+        for label, calls in (('str', str_calls), ('rtext', rtext_calls)):
+            for key, kwargs in calls:
+                results = [
+                    to_plain(translator.ntr(key, _mcdr_tr_language=language, _mcdr_tr_allow_failure=False, **kwargs))
+                    for translator in translators.values()
+                ]
+                if results[0] != results[1]:
+                    raise AssertionError('Translations of {} disagree: {}'.format(key, results))
+            # Interleaved, so that drifting machine load affects both translators alike
+            timings = [float('inf')] * len(translators)
+            for _ in range(args.repeat):
+                for i, translator in enumerate(translators.values()):
+                    seconds = timeit.timeit(
+                        lambda: [translator.ntr(key, _mcdr_tr_language=language, **kwargs) for key, kwargs in calls],
+                        number=args.rounds
+                    )
+                    timings[i] = min(timings[i], seconds / args.rounds / len(calls) * 1e6)
+            print('{:<8} {:>5} {:<6} {:>16,.3f} {:>16,.3f}'.format(language, len(calls), label, *timings))
+    FileUtils.close_bundled_resources()
+
+
+if __name__ == '__main__':
+    main()
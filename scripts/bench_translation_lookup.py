@@ -0,0 +1,153 @@
+"""
+Translation lookup cost of BlossomTranslator.ntr, in us per call
+
+Compares the compiled per-language translation table with the previous lookup, which took the lock, copied the
+language order for every call and walked the per-key language dicts, using the bundled lang files
+
+Usage: python scripts/bench_translation_lookup.py [--calls 200000]
+"""
+import argparse
+import contextlib
+import logging
+import os
+import sys
+import timeit
+from threading import RLock
+from typing import Dict, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from mcdreforged.api.rtext import RTextBase
+
+from my_plugin.utils.file_util import FileUtils
+from my_plugin.utils.standalone_tr import BlossomTranslator
+
+# Root key of the bundled lang files
+LANG_ROOT = 'my_plugin'
+LANGUAGES = ('en_us', 'zh_cn')
+CALLS = {
+    'no args': ('my_plugin.loading.reloaded', {}),
+    'kwargs': ('my_plugin.help.detailed', {'name': 'My Plugin', 'ver': '1.0.0', 'prefix': '!!template'}),
+}
+_NONE = object()
+
+
+class StubPlugin:
+    logger = logging.getLogger('bench_translation_lookup')
+
+    @staticmethod
+    def open_bundled_file(file_path: str):
+        return FileUtils.open_bundled_file(file_path)
+
+    def debug(self, *args):
+        pass
+
+
+class BundledLangTranslator(BlossomTranslator):
+    """
+    Reads the lang files of this repository, which keep their translations under the template's root key
+    """
+    PATH = 'lang'
+
+    @property
+    def allowed_keys(self):
+        return [LANG_ROOT]
+
+
+class DictTranslator:
+    """
+    The lookup before the translation table was compiled
+    """
+    def __init__(self, storage: Dict[str, Dict[str, str]]):
+        self.__storage = storage
+        self.__lock = RLock()
+        self.__language_translate_order = ['en_us']
+
+    def set_language(self, language: str):
+        with self.__lock:
+            if language in self.__language_translate_order:
+                self.__language_translate_order.remove(language)
+            self.__language_translate_order = [language] + self.__language_translate_order
+
+    @contextlib.contextmanager
+    def language_context(self, language: Optional[str]):
+        with self.__lock:
+            language_order = self.__language_translate_order
+            self.__language_translate_order = self.__language_translate_order.copy()
+            try:
+                if language is not None:
+                    self.set_language(language)
+                yield
+            finally:
+                self.__language_translate_order = language_order
+
+    def __dtr(self, translation_dict: Dict[str, str], *args, **kwargs):
+        translated_formatter = _NONE
+        for lang in self.__language_translate_order:
+            translated_formatter = translation_dict.get(lang, _NONE)
+            if translated_formatter is not _NONE:
+                break
+        if translated_formatter is None:
+            translated_formatter = ''
+        if translated_formatter is _NONE:
+            raise KeyError("Translation key does not exist")
+        use_rtext = any([isinstance(e, RTextBase) for e in list(args) + list(kwargs.values())])
+        if use_rtext:
+            return RTextBase.format(translated_formatter, *args, **kwargs)
+        return translated_formatter.format(*args, **kwargs)
+
+    def ntr(self, translation_key: str, *args, _mcdr_tr_language: Optional[str] = None, **kwargs):
+        translation_dict = self.__storage.get(translation_key, {})
+        with self.language_context(language=_mcdr_tr_language):
+            try:
+                return self.__dtr(translation_dict, *args, **kwargs)
+            except Exception as e:
+                lang_text = ', '.join([f'"{l}"' for l in self.__language_translate_order])
+                str('Error translate text "{}" to language {}: {}'.format(translation_key, lang_text, str(e)))
+                return translation_key
+
+
+def load_storage() -> Dict[str, Dict[str, str]]:
+    storage: Dict[str, Dict[str, str]] = {}
+
+    def walk(data: dict, language: str, prefix: str):
+        for key, value in data.items():
+            if isinstance(value, dict):
+                walk(value, language, prefix + key + '.')
+            else:
+                storage.setdefault(prefix + key, {})[language] = str(value)
+
+    for language in LANGUAGES:
+        data = BlossomTranslator.get_yaml().load(FileUtils.lf_read(os.path.join(REPO_ROOT, 'lang', language + '.yml')))
+        walk(data[LANG_ROOT], language, LANG_ROOT + '.')
+    return storage
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark translation lookups of BlossomTranslator')
+    parser.add_argument('--calls', type=int, default=200000, help='Calls per measurement')
+    args = parser.parse_args()
+
+    translator = BundledLangTranslator(StubPlugin())
+    translator.register_bundled_translations()
+    translators = {'dict walk': DictTranslator(load_storage()), 'table': translator}
+
+    print('{:<8} {:<8} {:>16} {:>16}'.format('call', 'language', 'dict walk us', 'table us'))
+    for label, (key, kwargs) in CALLS.items():
+        for language in LANGUAGES:
+            results = [
+                instance.ntr(key, _mcdr_tr_language=language, **kwargs) for instance in translators.values()
+            ]
+            if results[0] != results[1] or results[0] == key:
+                raise AssertionError('Translations of {} disagree: {}'.format(key, results))
+            timings = [
+                timeit.timeit(lambda: instance.ntr(key, _mcdr_tr_language=language, **kwargs), number=args.calls) / args.calls * 1e6
+                for instance in translators.values()
+            ]
+            print('{:<8} {:<8} {:>16,.3f} {:>16,.3f}'.format(label, language, *timings))
+    FileUtils.close_bundled_resources()
+
+
+if __name__ == '__main__':
+    main()
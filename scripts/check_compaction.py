@@ -0,0 +1,110 @@
+"""
+Consistency check of storage index compaction against mutations made while the snapshot is being written
+
+Compaction writes the new snapshot outside the index lock, every scenario applies a mutation right then
+and compares the index, and the index reopened from disk, with the expected content
+
+Usage: python scripts/check_compaction.py
+"""
+import logging
+import os
+import sys
+import tempfile
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from my_plugin.storage.container import ContainerPos
+from my_plugin.storage.index import StorageIndex
+from my_plugin.storage.snapshot import StorageSnapshot
+
+BASE_POS = ContainerPos('minecraft:overworld', 0, 64, 0)
+OVERLAY_POS = ContainerPos('minecraft:overworld', 16, 64, 0)
+
+
+class StubPlugin:
+    logger = logging.getLogger('check_compaction')
+
+    def __init__(self, data_folder: str):
+        self.__data_folder = data_folder
+
+    def get_data_folder(self) -> str:
+        return self.__data_folder
+
+    def debug(self, *args):
+        pass
+
+
+def open_index(data_folder: str) -> StorageIndex:
+    index = StorageIndex(StubPlugin(data_folder))
+    index.load()
+    index.open_log()
+    return index
+
+
+def compact_with(index: StorageIndex, mutation: Callable[[StorageIndex], None]):
+    """
+    Compact, applying the mutation once the snapshot content has been captured
+    """
+    write = StorageSnapshot.write.__func__
+
+    def write_and_mutate(cls, file_path, records):
+        write(cls, file_path, records)
+        mutation(index)
+
+    StorageSnapshot.write = classmethod(write_and_mutate)
+    try:
+        index.compact()
+    finally:
+        StorageSnapshot.write = classmethod(write)
+
+
+def describe(index: StorageIndex) -> Dict[ContainerPos, Optional[Dict[str, int]]]:
+    return {pos: index.get_container(pos) for pos in (BASE_POS, OVERLAY_POS)}
+
+
+def check(name: str, mutation: Callable[[StorageIndex], None], expected: Dict[ContainerPos, Optional[Dict[str, int]]]) -> List[str]:
+    errors = []
+    with tempfile.TemporaryDirectory() as data_folder:
+        index = open_index(data_folder)
+        index.update_container(BASE_POS, {'minecraft:stone': 1})
+        index.compact()
+        # Lives in the overlay only when the next compaction starts
+        index.update_container(OVERLAY_POS, {'minecraft:stone': 5})
+        compact_with(index, mutation)
+        expected_size = sum(1 for items in expected.values() if items is not None)
+        for stage in ('after compaction', 'after the next compaction', 'after reopening'):
+            if stage == 'after the next compaction':
+                index.compact()
+            elif stage == 'after reopening':
+                index.close()
+                index = open_index(data_folder)
+            actual = describe(index)
+            if actual != expected or len(index) != expected_size:
+                errors.append('{} {}: expected {} ({} containers), got {} ({} containers)'.format(
+                    name, stage, expected, expected_size, actual, len(index)
+                ))
+        index.close()
+    return errors
+
+
+def main() -> int:
+    scenarios = [
+        ('nothing changed', lambda index: None, {BASE_POS: {'minecraft:stone': 1}, OVERLAY_POS: {'minecraft:stone': 5}}),
+        ('overlay-only container removed', lambda index: index.remove_container(OVERLAY_POS), {BASE_POS: {'minecraft:stone': 1}, OVERLAY_POS: None}),
+        ('snapshot container removed', lambda index: index.remove_container(BASE_POS), {BASE_POS: None, OVERLAY_POS: {'minecraft:stone': 5}}),
+        ('overlay-only container updated', lambda index: index.update_container(OVERLAY_POS, {'minecraft:dirt': 2}), {BASE_POS: {'minecraft:stone': 1}, OVERLAY_POS: {'minecraft:dirt': 2}}),
+        ('overlay-only container removed and added again', lambda index: (index.remove_container(OVERLAY_POS), index.update_container(OVERLAY_POS, {'minecraft:dirt': 3})), {BASE_POS: {'minecraft:stone': 1}, OVERLAY_POS: {'minecraft:dirt': 3}}),
+        ('index cleared', lambda index: index.clear(), {BASE_POS: None, OVERLAY_POS: None}),
+    ]
+    errors = []
+    for name, mutation, expected in scenarios:
+        errors.extend(check(name, mutation, expected))
+    print('{} compaction scenarios checked'.format(len(scenarios)))
+    for error in errors:
+        print('FAIL: ' + error)
+    return 1 if len(errors) > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""
+Import-time regression guard of the plugin entrypoint
+
+Imports my_plugin under `python -X importtime` in a fresh interpreter, with MCDR preloaded as it is when the plugin
+gets loaded, and fails when the plugin's own modules take longer than the budget or when the entrypoint pulls in
+modules that are meant to be imported on first use only
+
+Usage: python scripts/check_import_time.py [--max-ms 10] [--verbose]
+"""
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = 'my_plugin'
+# Already loaded by MCDR before any plugin, not charged to the plugin
+PRELOADED_MODULES = ('mcdreforged.api.all', 'ruamel.yaml')
+# Imported on first use only, importing the entrypoint must not load them
+DEFERRED_MODULES = (
+    'numpy',
+    'my_plugin.my_plugin',
+    'my_plugin.commands',
+    'my_plugin.storage',
+    'my_plugin.utils.queued_file_handler',
+    'logging.handlers',
+)
+DEFAULT_MAX_MS = 10.0
+
+
+def measure_imports(module: str) -> Dict[str, Tuple[int, int]]:
+    """
+    :return: Module name -> (self us, cumulative us) of the modules first imported by importing the module
+    """
+    preload_code = 'import {}'.format(', '.join(PRELOADED_MODULES))
+    preloaded = set(run_importtime(preload_code).keys())
+    imports = run_importtime('{}\nimport {}'.format(preload_code, module))
+    return {name: times for name, times in imports.items() if name not in preloaded}
+
+
+def run_importtime(code: str) -> Dict[str, Tuple[int, int]]:
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get('PYTHONPATH')])))
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    return parse_importtime(process.stderr)
+
+
+def parse_importtime(output: str) -> Dict[str, Tuple[int, int]]:
+    result = {}
+    for line in output.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        result[name.strip()] = (int(self_us), int(cumulative_us))
+    return result
+
+
+def is_module_or_child(name: str, module: str) -> bool:
+    return name == module or name.startswith(module + '.')
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Fail when importing the plugin entrypoint gets slow or heavy')
+    parser.add_argument('--max-ms', type=float, default=DEFAULT_MAX_MS, help='Budget of the plugin modules, in ms of self time')
+    parser.add_argument('--verbose', action='store_true', help='List every module imported with the plugin')
+    args = parser.parse_args()
+
+    imports = measure_imports(PACKAGE)
+    own = {name: times for name, times in imports.items() if is_module_or_child(name, PACKAGE)}
+    total_ms = sum(self_us for self_us, _ in own.values()) / 1000
+    if args.verbose:
+        for name, (self_us, cumulative_us) in sorted(imports.items(), key=lambda item: -item[1][0]):
+            print('{:>8.2f} ms {:>8.2f} ms  {}'.format(self_us / 1000, cumulative_us / 1000, name))
+
+    errors: List[str] = []
+    for module in DEFERRED_MODULES:
+        loaded = sorted(name for name in imports.keys() if is_module_or_child(name, module))
+        if len(loaded) > 0:
+            errors.append('{} is imported eagerly: {}'.format(module, ', '.join(loaded)))
+    if total_ms > args.max_ms:
+        errors.append('plugin modules took {:.2f} ms, budget is {:.2f} ms'.format(total_ms, args.max_ms))
+
+    print('import {}: {} plugin modules in {:.2f} ms, {} modules in total'.format(PACKAGE, len(own), total_ms, len(imports)))
+    for error in errors:
+        print('FAIL: ' + error)
+    return 1 if len(errors) > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())